@@ -1,11 +1,228 @@
-from datetime import datetime
-from flask import Flask, jsonify, request, send_from_directory
-
-from personal_finance.analytics import forecast_income, summarize_amounts
-from personal_finance.storage.sqlite_storage import SQLiteStorage
-
-app = Flask(__name__, static_folder="static", static_url_path="")
-storage = SQLiteStorage()
+import argparse
+import calendar
+import gzip
+import hmac
+import json
+import logging
+import os
+import time
+from datetime import date as date_cls, datetime
+from pathlib import Path
+
+from flask import (
+    Blueprint,
+    Flask,
+    Response,
+    current_app,
+    g,
+    jsonify,
+    request,
+    send_from_directory,
+)
+from werkzeug.local import LocalProxy
+
+from personal_finance.analytics import forecast_income, forecast_series, summarize_amounts
+from personal_finance.metrics import Metrics, slow_query_logger
+from personal_finance.profiling import RequestProfiler
+from personal_finance.storage.sqlite_storage import (
+    DEFAULT_DB_PATH,
+    ChangeLogExpiredError,
+    DatabaseBusyError,
+    DuplicateTransactionError,
+    SQLiteStorage,
+)
+from personal_finance.storage.imports import ImportQueue
+from personal_finance.storage.maintenance import (
+    ONLINE_TASKS,
+    TASKS,
+    MaintenanceScheduler,
+    run_task,
+)
+from personal_finance.storage.tenants import TenantStorages
+from prefork import serve
+
+DEFAULT_CONFIG = {
+    "DATABASE": DEFAULT_DB_PATH,
+    # Optional local exchange-rate file (currency,date,rate) loaded at startup.
+    "FX_RATES_PATH": Path(__file__).resolve().parent / "fx_rates.csv",
+    # Delete tombstones in the change feed are kept this long; consumers that
+    # fall further behind get 410 and resync from since=0.
+    "CHANGE_LOG_RETENTION_DAYS": 30,
+    # Request and SQL statistics at GET /metrics; off means no hooks at all.
+    "METRICS_ENABLED": False,
+    # Requests carrying X-Profile-Token equal to PROFILE_TOKEN (or every
+    # request, with PROFILE_ALL_REQUESTS) are profiled into PROFILE_DIR.
+    "PROFILE_DIR": None,
+    "PROFILE_TOKEN": None,
+    "PROFILE_ALL_REQUESTS": False,
+    "PROFILE_KEEP": 20,
+    # Statements slower than this are logged with parameters and query plan,
+    # to SLOW_QUERY_LOG if set (otherwise to the standard logging setup).
+    "SLOW_QUERY_MS": None,
+    "SLOW_QUERY_LOG": None,
+    # Multi-tenant mode: each request names its tenant in TENANT_HEADER and is
+    # served from TENANT_DIR/<tenant>/<tenant>.db instead of DATABASE. Up to
+    # TENANT_CACHE_SIZE tenants stay open; idle ones are dropped.
+    "TENANT_DIR": None,
+    "TENANT_HEADER": "X-Tenant",
+    "TENANT_CACHE_SIZE": 64,
+    "TENANT_IDLE_SECONDS": 300,
+    # POST /imports runs on this many background threads per process, writing
+    # IMPORT_CHUNK_ROWS rows per transaction.
+    "IMPORT_WORKERS": 2,
+    "IMPORT_CHUNK_ROWS": 1000,
+    # Background maintenance: ANALYZE, free-page reclaim and change-log
+    # compaction every MAINTENANCE_INTERVAL seconds (None turns it off, and the
+    # change log is then compacted whenever a database is opened). With
+    # BACKUP_DIR set, an online backup every BACKUP_INTERVAL seconds, keeping
+    # BACKUP_KEEP.
+    "MAINTENANCE_INTERVAL": 6 * 3600,
+    "BACKUP_DIR": None,
+    "BACKUP_INTERVAL": 24 * 3600,
+    "BACKUP_KEEP": 7,
+    # /admin/* answers only requests whose X-Admin-Token equals ADMIN_TOKEN,
+    # and nothing at all while it is unset.
+    "ADMIN_TOKEN": None,
+}
+
+bp = Blueprint("finance", __name__)
+
+# Level 1 shrinks ledger columns ~5x for a fifth of the CPU of level 6, whose
+# output is only ~30% smaller.
+GZIP_LEVEL = 1
+
+
+def _request_storage() -> SQLiteStorage:
+    tenants = current_app.extensions.get("tenants")
+    if tenants is None:
+        return current_app.extensions["storage"]
+    if "storage" not in g:
+        header = current_app.config["TENANT_HEADER"]
+        tenant = request.headers.get(header)
+        if not tenant:
+            raise ValueError(f"{header} header is required")
+        g.storage = tenants.get(tenant)
+    return g.storage
+
+
+# Routes reach the storage of the app (and tenant) serving the request, so
+# every worker process uses storages its own create_app() opened after fork.
+storage: SQLiteStorage = LocalProxy(_request_storage)
+
+
+def create_app(config: dict | None = None) -> Flask:
+    app = Flask(__name__, static_folder="static", static_url_path="")
+    app.config.from_mapping(DEFAULT_CONFIG)
+    app.config.from_mapping(config or {})
+
+    metrics = Metrics() if app.config["METRICS_ENABLED"] else None
+    imports = ImportQueue(app.config["IMPORT_WORKERS"], app.config["IMPORT_CHUNK_ROWS"])
+    maintenance = None
+    if app.config["MAINTENANCE_INTERVAL"]:
+        maintenance = MaintenanceScheduler(
+            app.config["MAINTENANCE_INTERVAL"],
+            backup_dir=app.config["BACKUP_DIR"],
+            backup_interval=app.config["BACKUP_INTERVAL"],
+            backup_keep=app.config["BACKUP_KEEP"],
+            retention_days=app.config["CHANGE_LOG_RETENTION_DAYS"],
+        )
+
+    def open_storage(path: Path | str, reopened: bool = False) -> SQLiteStorage:
+        opened = SQLiteStorage(
+            path, metrics=metrics, slow_query_ms=app.config["SLOW_QUERY_MS"]
+        )
+        # A tenant dropped from the LRU and reopened already had its rates
+        # loaded and imports recovered by this process.
+        if not reopened:
+            fx_rates = app.config["FX_RATES_PATH"]
+            if fx_rates and Path(fx_rates).exists():
+                opened.load_fx_rates(fx_rates)
+            imports.recover(opened)
+        if maintenance is not None:
+            # Compacts the change log when due, once across worker processes.
+            maintenance.add(opened)
+        elif not reopened:
+            opened.compact_changes(
+                max_tombstone_age_days=app.config["CHANGE_LOG_RETENTION_DAYS"]
+            )
+        return opened
+
+    if app.config["SLOW_QUERY_LOG"]:
+        handler = logging.FileHandler(app.config["SLOW_QUERY_LOG"])
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        slow_query_logger.addHandler(handler)
+    if app.config["TENANT_DIR"]:
+        app.extensions["tenants"] = TenantStorages(
+            app.config["TENANT_DIR"],
+            open_storage,
+            capacity=app.config["TENANT_CACHE_SIZE"],
+            idle_seconds=app.config["TENANT_IDLE_SECONDS"],
+        )
+    else:
+        app.extensions["storage"] = open_storage(app.config["DATABASE"])
+    app.extensions["imports"] = imports
+    app.extensions["maintenance"] = maintenance
+    if metrics is not None:
+        _install_metrics(app, metrics)
+    if app.config["PROFILE_DIR"]:
+        profiler = RequestProfiler(app.config["PROFILE_DIR"], app.config["PROFILE_KEEP"])
+        _install_profiling(app, profiler)
+    app.register_blueprint(bp)
+    return app
+
+
+def _install_metrics(app: Flask, metrics: Metrics) -> None:
+    app.extensions["metrics"] = metrics
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response: Response) -> Response:
+        # The rule, not the path, so /accounts/1 and /accounts/2 share a series.
+        route = request.url_rule.rule if request.url_rule else "<unmatched>"
+        metrics.observe_request(
+            request.method,
+            route,
+            response.status_code,
+            time.perf_counter() - g.request_started,
+            response.calculate_content_length() or 0,
+        )
+        return response
+
+
+def _install_profiling(app: Flask, profiler: RequestProfiler) -> None:
+    token = app.config["PROFILE_TOKEN"]
+
+    def trusted() -> bool:
+        offered = request.headers.get("X-Profile-Token")
+        return bool(token and offered) and hmac.compare_digest(
+            offered.encode(), token.encode()
+        )
+
+    @app.before_request
+    def start_profile():
+        if app.config["PROFILE_ALL_REQUESTS"] or trusted():
+            g.profile = profiler.start()
+
+    def finish(profile) -> str:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        return profiler.stop(profile, f"{request.method} {route}").name
+
+    @app.after_request
+    def save_profile(response: Response) -> Response:
+        profile = g.pop("profile", None)
+        if profile is not None:
+            response.headers["X-Profile-File"] = finish(profile)
+        return response
+
+    @app.teardown_request
+    def discard_profile(exc):
+        # Unhandled errors skip after_request; still release the profiler.
+        profile = g.pop("profile", None)
+        if profile is not None:
+            finish(profile)
 
 
 def _parse_date(date_str: str) -> str:
@@ -26,28 +243,105 @@ def _parse_months(param: str | None, default: int = 3) -> int:
     return months if months > 0 else default
 
 
-@app.errorhandler(ValueError)
+def _parse_limit(param: str | None, default: int = 20, maximum: int = 100) -> int:
+    if param is None:
+        return default
+    try:
+        limit = int(param)
+    except ValueError as exc:
+        raise ValueError("limit must be an integer") from exc
+    return min(limit, maximum) if limit > 0 else default
+
+
+def _parse_currency(param: str | None) -> str | None:
+    if param is None or not param.strip():
+        return None
+    currency = param.strip().upper()
+    if not currency.isalpha():
+        raise ValueError("base_currency must be a currency code such as EUR")
+    return currency
+
+
+def _parse_before(param: str | None) -> tuple[str, int] | None:
+    if param is None:
+        return None
+    date, _, row_id = param.partition(",")
+    try:
+        return _parse_date(date), int(row_id)
+    except ValueError as exc:
+        raise ValueError("before must be 'YYYY-MM-DD,id'") from exc
+
+
+def _page_args() -> dict:
+    """Keyset paging parameters shared by the ledger list endpoints."""
+    limit = request.args.get("limit")
+    before = _parse_before(request.args.get("before"))
+    after_id = request.args.get("after_id")
+    return {
+        "limit": _parse_limit(limit) if limit is not None else None,
+        "newest_first": limit is not None,
+        "before": before,
+        "after_id": int(after_id) if after_id is not None else None,
+    }
+
+
+def _parse_format(param: str | None) -> bool:
+    """Whether ``?format=`` asks for column arrays instead of row objects."""
+    fmt = (param or "rows").lower()
+    if fmt not in ("rows", "columns"):
+        raise ValueError("format must be 'rows' or 'columns'")
+    return fmt == "columns"
+
+
+def _list_response(result: list | dict) -> Response:
+    """JSON for a list endpoint; columnar results are gzipped if accepted."""
+    response = jsonify(result)
+    if isinstance(result, dict):
+        response.vary.add("Accept-Encoding")
+        if request.accept_encodings.quality("gzip") > 0:
+            response.set_data(gzip.compress(response.get_data(), GZIP_LEVEL))
+            response.headers["Content-Encoding"] = "gzip"
+    return response
+
+
+@bp.app_errorhandler(ValueError)
 def handle_value_error(err: ValueError):
     return jsonify({"error": str(err)}), 400
 
 
-@app.route("/")
+@bp.app_errorhandler(ChangeLogExpiredError)
+def handle_change_log_expired(err: ChangeLogExpiredError):
+    return jsonify({"error": str(err)}), 410
+
+
+@bp.app_errorhandler(DuplicateTransactionError)
+def handle_duplicate_transaction(err: DuplicateTransactionError):
+    return jsonify({"error": str(err)}), 409
+
+
+@bp.app_errorhandler(DatabaseBusyError)
+def handle_database_busy(err: DatabaseBusyError):
+    # Every write retries with backoff before this; the client may try later.
+    return jsonify({"error": "database is busy, retry shortly"}), 503, {"Retry-After": "1"}
+
+
+@bp.route("/")
 def index():
-    return send_from_directory(app.static_folder, "index.html")
+    return send_from_directory(current_app.static_folder, "index.html")
 
 
-@app.route("/health", methods=["GET"])
+@bp.route("/health", methods=["GET"])
 def health():
     return jsonify({"status": "ok"})
 
 
 # Accounts -----------------------------------------------------------------
-@app.route("/accounts", methods=["GET"])
+@bp.route("/accounts", methods=["GET"])
 def list_accounts():
     return jsonify(storage.list_accounts())
 
 
-@app.route("/accounts", methods=["POST"])
+@bp.route("/accounts", methods=["POST"])
 def create_account():
     data = request.get_json(force=True, silent=True) or {}
     name = data.get("name", "").strip()
@@ -57,21 +351,51 @@ def create_account():
     return jsonify(result), 201
 
 
-@app.route("/accounts/<int:account_id>", methods=["PUT"])
+@bp.route("/accounts/<int:account_id>", methods=["PUT"])
 def update_account(account_id: int):
     data = request.get_json(force=True, silent=True) or {}
     storage.update_account(account_id, name=data.get("name"), currency=data.get("currency"))
     return jsonify({"updated": True})
 
 
-@app.route("/accounts/<int:account_id>", methods=["DELETE"])
+@bp.route("/accounts/<int:account_id>", methods=["DELETE"])
 def delete_account(account_id: int):
     storage.delete_account(account_id)
     return jsonify({"deleted": True})
 
 
+@bp.route("/accounts/<int:account_id>/balance", methods=["GET"])
+def account_balance(account_id: int):
+    at = request.args.get("at")
+    if at:
+        at = _parse_date(at)
+    base = _parse_currency(request.args.get("base_currency"))
+    balance = storage.balance_at(account_id, at=at, base_currency=base)
+    if base:
+        balance["currency"] = base
+    return jsonify(balance)
+
+
+@bp.route("/accounts/<int:account_id>/balance_series", methods=["GET"])
+def account_balance_series(account_id: int):
+    start = request.args.get("from")
+    end = request.args.get("to")
+    step = (request.args.get("step") or "month").lower()
+    if start:
+        start = _parse_date(start)
+    if end:
+        end = _parse_date(end)
+    base = _parse_currency(request.args.get("base_currency"))
+    series = storage.balance_series(
+        account_id, start_date=start, end_date=end, step=step, base_currency=base
+    )
+    if base:
+        series["currency"] = base
+    return jsonify(series)
+
+
 # Transactions -------------------------------------------------------------
-@app.route("/transactions", methods=["GET"])
+@bp.route("/transactions", methods=["GET"])
 def get_transactions():
     start = request.args.get("from")
     end = request.args.get("to")
@@ -81,11 +405,17 @@ def get_transactions():
     if end:
         end = _parse_date(end)
     account_filter = int(account_id) if account_id is not None else None
-    rows = storage.list_transactions(start_date=start, end_date=end, account_id=account_filter)
-    return jsonify(rows)
+    rows = storage.list_transactions(
+        start_date=start,
+        end_date=end,
+        account_id=account_filter,
+        columnar=_parse_format(request.args.get("format")),
+        **_page_args(),
+    )
+    return _list_response(rows)
 
 
-@app.route("/transactions", methods=["POST"])
+@bp.route("/transactions", methods=["POST"])
 def post_transaction():
     data = request.get_json(force=True, silent=True) or {}
     account_id = int(data.get("account_id"))
@@ -101,18 +431,19 @@ def post_transaction():
         t_type=t_type,
         category=category,
         note=note,
+        on_duplicate=data.get("on_duplicate"),
     )
-    return jsonify(created), 201
+    return jsonify(created), 200 if created.get("duplicate") else 201
 
 
-@app.route("/transactions/<int:transaction_id>", methods=["DELETE"])
+@bp.route("/transactions/<int:transaction_id>", methods=["DELETE"])
 def delete_transaction(transaction_id: int):
     storage.delete_transaction(transaction_id)
     return jsonify({"deleted": True})
 
 
 # Income -------------------------------------------------------------------
-@app.route("/income", methods=["GET"])
+@bp.route("/income", methods=["GET"])
 def list_income():
     start = request.args.get("from")
     end = request.args.get("to")
@@ -122,11 +453,17 @@ def list_income():
     if end:
         end = _parse_date(end)
     account_filter = int(account_id) if account_id is not None else None
-    rows = storage.list_income(start_date=start, end_date=end, account_id=account_filter)
-    return jsonify(rows)
+    rows = storage.list_income(
+        start_date=start,
+        end_date=end,
+        account_id=account_filter,
+        columnar=_parse_format(request.args.get("format")),
+        **_page_args(),
+    )
+    return _list_response(rows)
 
 
-@app.route("/income", methods=["POST"])
+@bp.route("/income", methods=["POST"])
 def create_income():
     data = request.get_json(force=True, silent=True) or {}
     account_id = int(data.get("account_id"))
@@ -137,14 +474,162 @@ def create_income():
     return jsonify(created), 201
 
 
-@app.route("/income/<int:income_id>", methods=["DELETE"])
+@bp.route("/income/<int:income_id>", methods=["DELETE"])
 def delete_income(income_id: int):
     storage.delete_income(income_id)
     return jsonify({"deleted": True})
 
 
+# Categories ---------------------------------------------------------------
+@bp.route("/categories", methods=["GET"])
+def list_categories():
+    return jsonify(storage.list_categories())
+
+
+@bp.route("/categories/<int:category_id>", methods=["PUT"])
+def rename_category(category_id: int):
+    data = request.get_json(force=True, silent=True) or {}
+    return jsonify(storage.rename_category(category_id, data.get("name", "")))
+
+
+# Categorization rules -----------------------------------------------------
+@bp.route("/rules", methods=["GET"])
+def list_rules():
+    return jsonify(storage.list_rules())
+
+
+@bp.route("/rules", methods=["POST"])
+def create_rule():
+    data = request.get_json(force=True, silent=True) or {}
+    created = storage.create_rule(
+        kind=(data.get("kind") or "keyword").strip().lower(),
+        pattern=data.get("pattern", ""),
+        category=data.get("category", ""),
+        priority=data.get("priority", 0),
+    )
+    return jsonify(created), 201
+
+
+@bp.route("/rules/<int:rule_id>", methods=["DELETE"])
+def delete_rule(rule_id: int):
+    storage.delete_rule(rule_id)
+    return jsonify({"deleted": True})
+
+
+# Budgets ------------------------------------------------------------------
+def _parse_month(param: str | None) -> str:
+    if not param:
+        return datetime.now().strftime("%Y-%m")
+    try:
+        datetime.strptime(param, "%Y-%m")
+    except ValueError as exc:
+        raise ValueError("month must be in YYYY-MM format") from exc
+    return param
+
+
+@bp.route("/budgets", methods=["GET"])
+def list_budgets():
+    month = request.args.get("month")
+    return jsonify(storage.list_budgets(month=_parse_month(month) if month else None))
+
+
+@bp.route("/budgets", methods=["POST"])
+def create_budget():
+    data = request.get_json(force=True, silent=True) or {}
+    created = storage.create_budget(
+        month=_parse_month(data.get("month", "")),
+        category=data.get("category", ""),
+        limit_amount=float(data.get("limit_amount")),
+    )
+    return jsonify(created), 201
+
+
+@bp.route("/budgets/<int:budget_id>", methods=["PUT"])
+def update_budget(budget_id: int):
+    data = request.get_json(force=True, silent=True) or {}
+    limit_amount = data.get("limit_amount")
+    storage.update_budget(
+        budget_id,
+        month=data.get("month"),
+        category=data.get("category"),
+        limit_amount=float(limit_amount) if limit_amount is not None else None,
+    )
+    return jsonify({"updated": True})
+
+
+@bp.route("/budgets/<int:budget_id>", methods=["DELETE"])
+def delete_budget(budget_id: int):
+    storage.delete_budget(budget_id)
+    return jsonify({"deleted": True})
+
+
+@bp.route("/budgets/status", methods=["GET"])
+def budget_status():
+    return jsonify(storage.budget_status(_parse_month(request.args.get("month"))))
+
+
+# Imports ------------------------------------------------------------------
+@bp.route("/imports", methods=["POST"])
+def create_import():
+    """Queue a CSV of transactions (account_id,date,amount,type[,category,note])."""
+    # The job outlives the request, so it gets the storage itself, not the proxy.
+    job = current_app.extensions["imports"].submit(
+        storage._get_current_object(),
+        request.stream,
+        on_duplicate=request.args.get("on_duplicate"),
+    )
+    return jsonify(job), 202, {"Location": f"/imports/{job['id']}"}
+
+
+@bp.route("/imports/<int:job_id>", methods=["GET"])
+def get_import(job_id: int):
+    return jsonify(storage.get_import_job(job_id))
+
+
+@bp.route("/imports/<int:job_id>", methods=["DELETE"])
+def cancel_import(job_id: int):
+    return jsonify(storage.cancel_import_job(job_id))
+
+
+# Search -------------------------------------------------------------------
+@bp.route("/search", methods=["GET"])
+def search():
+    start = request.args.get("from")
+    end = request.args.get("to")
+    if start:
+        start = _parse_date(start)
+    if end:
+        end = _parse_date(end)
+    limit = _parse_limit(request.args.get("limit"))
+    result = storage.search(
+        request.args.get("q", ""),
+        start_date=start,
+        end_date=end,
+        limit=limit,
+        cursor=request.args.get("cursor"),
+    )
+    return jsonify(result)
+
+
 # Statistics ---------------------------------------------------------------
-@app.route("/stats/summary", methods=["GET"])
+def _summary(kind: str, start: str | None, end: str | None, base: str | None) -> dict:
+    if kind == "income":
+        records = storage.list_income(start_date=start, end_date=end, base_currency=base)
+    else:
+        kind = "transactions"
+        records = storage.list_transactions(
+            start_date=start, end_date=end, base_currency=base
+        )
+    by_category = storage.category_totals(
+        kind, start_date=start, end_date=end, base_currency=base
+    )
+    summary = summarize_amounts(records, by_category=by_category)
+    if base:
+        summary["currency"] = base
+    return summary
+
+
+@bp.route("/stats/summary", methods=["GET"])
 def stats_summary():
     start = request.args.get("from")
     end = request.args.get("to")
@@ -154,21 +639,236 @@ def stats_summary():
     if end:
         end = _parse_date(end)
 
-    if kind == "income":
-        records = storage.list_income(start_date=start, end_date=end)
-    else:
-        records = storage.list_transactions(start_date=start, end_date=end)
-    summary = summarize_amounts(records)
+    base = _parse_currency(request.args.get("base_currency"))
+    # Records and category totals come from one read-only snapshot.
+    with storage.snapshot():
+        summary = _summary(kind, start, end, base)
     return jsonify(summary)
 
 
-@app.route("/stats/income_forecast", methods=["GET"])
+@bp.route("/stats/cashflow", methods=["GET"])
+def stats_cashflow():
+    start = request.args.get("from")
+    end = request.args.get("to")
+    if start:
+        start = _parse_date(start)
+    if end:
+        end = _parse_date(end)
+    group = (request.args.get("group") or "month").lower()
+    account_id = request.args.get("account_id")
+    account_filter = int(account_id) if account_id is not None else None
+    periods = storage.cashflow(
+        start_date=start, end_date=end, group=group, account_id=account_filter
+    )
+    return jsonify({"group": group, "periods": periods})
+
+
+@bp.route("/stats/income_forecast", methods=["GET"])
 def stats_income_forecast():
     months = _parse_months(request.args.get("months"), default=3)
-    history = storage.monthly_income()
-    payload = forecast_income(history, months_ahead=months)
+    kind = (request.args.get("kind") or "income").lower()
+    group_by = request.args.get("group_by")
+    if group_by:
+        group_by = group_by.lower()
+    base = _parse_currency(request.args.get("base_currency"))
+    if group_by is None and kind == "income":
+        history = storage.monthly_income(base_currency=base)
+        payload = forecast_income(history, months_ahead=months)
+    else:
+        rows = storage.monthly_totals(
+            kind=kind, group_by=group_by or None, base_currency=base
+        )
+        payload = forecast_series(rows, months_ahead=months)
+        payload["kind"] = kind
+        payload["group_by"] = group_by
+    if base:
+        payload["currency"] = base
+    return jsonify(payload)
+
+
+# Change feed --------------------------------------------------------------
+@bp.route("/changes", methods=["GET"])
+def list_changes():
+    since = request.args.get("since", "0")
+    try:
+        since_seq = int(since)
+    except ValueError as exc:
+        raise ValueError("since must be an integer") from exc
+    limit = _parse_limit(request.args.get("limit"), default=100, maximum=1000)
+    return jsonify(storage.list_changes(since=max(since_seq, 0), limit=limit))
+
+
+# Metrics ------------------------------------------------------------------
+@bp.route("/metrics", methods=["GET"])
+def get_metrics():
+    registry = current_app.extensions.get("metrics")
+    if registry is None:
+        return jsonify({"error": "metrics are disabled"}), 404
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+
+# Admin --------------------------------------------------------------------
+def _admin_refusal():
+    token = current_app.config["ADMIN_TOKEN"]
+    if not token:
+        return jsonify({"error": "admin endpoints are disabled"}), 404
+    offered = request.headers.get("X-Admin-Token") or ""
+    if not hmac.compare_digest(offered.encode(), token.encode()):
+        return jsonify({"error": "a valid X-Admin-Token header is required"}), 403
+    return None
+
+
+@bp.route("/admin/maintenance", methods=["GET"])
+def maintenance_status():
+    refusal = _admin_refusal()
+    if refusal is not None:
+        return refusal
+    return jsonify(storage.maintenance_status())
+
+
+@bp.route("/admin/maintenance/<task>", methods=["POST"])
+def run_maintenance(task: str):
+    refusal = _admin_refusal()
+    if refusal is not None:
+        return refusal
+    if task not in ONLINE_TASKS:
+        raise ValueError(f"task must be one of: {', '.join(ONLINE_TASKS)}")
+    config = current_app.config
+    return jsonify(
+        run_task(
+            storage,
+            task,
+            config["BACKUP_DIR"],
+            config["BACKUP_KEEP"],
+            config["CHANGE_LOG_RETENTION_DAYS"],
+        )
+    )
+
+
+# Dashboard ----------------------------------------------------------------
+@bp.route("/dashboard", methods=["GET"])
+def dashboard():
+    """Everything the start page shows, read from one consistent snapshot.
+
+    The work is bounded whatever the size of the ledger: one page of rows,
+    the summary of the current month only, and a forecast from monthly totals
+    grouped in SQL. /stats/summary serves other ranges on request.
+    """
+    limit = _parse_limit(request.args.get("limit"), default=10)
+    months = _parse_months(request.args.get("months"), default=3)
+    today = date_cls.today()
+    month_days = calendar.monthrange(today.year, today.month)[1]
+    summary_range = {
+        "from": today.replace(day=1).isoformat(),
+        "to": today.replace(day=month_days).isoformat(),
+    }
+    with storage.snapshot():
+        payload = {
+            "accounts": storage.list_accounts(),
+            "transactions": storage.list_transactions(limit=limit, newest_first=True),
+            "income": storage.list_income(limit=limit, newest_first=True),
+            "summary": _summary(
+                "transactions", summary_range["from"], summary_range["to"], None
+            ),
+            "summary_range": summary_range,
+            "forecast": forecast_income(storage.monthly_income(), months_ahead=months),
+        }
     return jsonify(payload)
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    parser = argparse.ArgumentParser(description="Run the personal finance API.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--db", default=str(DEFAULT_DB_PATH), help="SQLite file")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="serve from N pre-forked worker processes instead of the dev server",
+    )
+    parser.add_argument("--debug", action="store_true", help="Flask debug mode")
+    parser.add_argument("--metrics", action="store_true", help="serve GET /metrics")
+    parser.add_argument("--profile-dir", help="write request profiles here")
+    parser.add_argument("--slow-query-ms", type=float, help="slow-query threshold")
+    parser.add_argument("--slow-query-log", help="file for slow-query entries")
+    parser.add_argument(
+        "--tenant-dir", help="one database per tenant (X-Tenant header) in this directory"
+    )
+    parser.add_argument(
+        "--archive-year",
+        type=int,
+        action="append",
+        metavar="YEAR",
+        help="move a closed year into its own archive file and exit",
+    )
+    parser.add_argument(
+        "--backfill-categories",
+        nargs="?",
+        const="uncategorized",
+        choices=("uncategorized", "all"),
+        help="apply the categorization rules to stored transactions and exit",
+    )
+    parser.add_argument(
+        "--maintenance",
+        choices=("status",) + TASKS,
+        help="run one maintenance task (vacuum needs the app stopped), print it and exit",
+    )
+    parser.add_argument(
+        "--backup-dir", help="backups go here (default: backups/ beside the database)"
+    )
+    args = parser.parse_args()
+
+    if args.archive_year:
+        archive_storage = SQLiteStorage(args.db)
+        for year in sorted(args.archive_year):
+            result = archive_storage.archive_year(year)
+            print(
+                f"archived {year}: {result['transactions']} transactions, "
+                f"{result['income']} income rows -> {result['file']}"
+            )
+        raise SystemExit(0)
+
+    if args.backfill_categories:
+        result = SQLiteStorage(args.db).backfill_categories(
+            overwrite=args.backfill_categories == "all"
+        )
+        print(
+            f"backfilled {result['rows']} rows, {result['updated']} updated "
+            f"in {result['seconds']} s ({result['rows_per_second']} rows/s)"
+        )
+        raise SystemExit(0)
+
+    if args.maintenance:
+        maintenance_storage = SQLiteStorage(args.db)
+        if args.maintenance == "status":
+            result = maintenance_storage.maintenance_status()
+        else:
+            result = run_task(
+                maintenance_storage,
+                args.maintenance,
+                args.backup_dir,
+                retention_days=DEFAULT_CONFIG["CHANGE_LOG_RETENTION_DAYS"],
+            )
+        print(json.dumps(result, indent=2))
+        raise SystemExit(0)
+
+    config = {
+        "DATABASE": args.db,
+        "METRICS_ENABLED": args.metrics,
+        "PROFILE_DIR": args.profile_dir,
+        # Kept out of argv so it doesn't show up in process listings.
+        "PROFILE_TOKEN": os.environ.get("FINANCE_PROFILE_TOKEN"),
+        "SLOW_QUERY_MS": args.slow_query_ms,
+        "SLOW_QUERY_LOG": args.slow_query_log,
+        "TENANT_DIR": args.tenant_dir,
+        "BACKUP_DIR": args.backup_dir,
+        "ADMIN_TOKEN": os.environ.get("FINANCE_ADMIN_TOKEN"),
+    }
+    if args.workers:
+        # Migrate once here so workers don't race on schema changes at startup.
+        # Tenant databases are set up when first used.
+        if not args.tenant_dir:
+            SQLiteStorage(args.db)
+        serve(lambda: create_app(config), args.host, args.port, args.workers)
+    else:
+        create_app(config).run(host=args.host, port=args.port, debug=args.debug)
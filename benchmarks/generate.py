@@ -0,0 +1,199 @@
+"""Seeded synthetic ledgers for the benchmark suite.
+
+    python benchmarks/generate.py --size 10k --out benchmarks/.data
+
+The same size and seed always give the same ledger: a handful of accounts in
+different currencies, ten years of daily expenses with seasonal categories
+(heating in winter, travel in summer, gifts in December), monthly salaries
+with occasional freelance income, and per-category monthly budgets. Income
+makes up about 5% of ``rows``.
+"""
+
+import argparse
+import calendar
+import math
+import random
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Iterator, NamedTuple
+
+ROOT = Path(__file__).resolve().parents[1]
+for path in (ROOT, ROOT / "personal_finance"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+from models.account import Account  # noqa: E402
+from models.budget import Budget  # noqa: E402
+from models.transaction import Transaction  # noqa: E402
+from personal_finance.storage.sqlite_storage import SQLiteStorage  # noqa: E402
+from storage.csv_storage import (  # noqa: E402
+    save_accounts,
+    save_budgets,
+    save_transactions,
+)
+
+SIZES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+
+ACCOUNTS = [
+    ("Checking", "bank", "EUR"),
+    ("Wallet", "cash", "HUF"),
+    ("Savings", "bank", "USD"),
+    ("Card", "bank", "EUR"),
+]
+
+# category -> (typical amount, relative frequency, peak month, seasonal swing)
+EXPENSE_CATEGORIES = {
+    "groceries": (45.0, 30, 12, 0.25),
+    "restaurants": (30.0, 12, 7, 0.2),
+    "transport": (12.0, 20, 9, 0.1),
+    "utilities": (90.0, 3, 1, 0.6),
+    "heating": (120.0, 2, 1, 0.9),
+    "travel": (250.0, 2, 7, 0.9),
+    "gifts": (60.0, 2, 12, 0.9),
+    "health": (40.0, 4, 2, 0.2),
+    "entertainment": (25.0, 8, 6, 0.3),
+    "rent": (900.0, 1, 1, 0.0),
+}
+INCOME_SOURCES = ("salary", "freelance", "interest")
+YEARS = 10
+START = date(2015, 1, 1)
+INCOME_SHARE = 0.05
+
+
+class Ledger(NamedTuple):
+    accounts: list[tuple[int, str, str, str]]
+    transactions: Iterator[tuple[int, str, float, str, str, str]]
+    income: Iterator[tuple[int, str, float, str]]
+    budgets: list[tuple[str, str, float]]
+
+
+def _seasonal(month: int, peak: int, swing: float) -> float:
+    return 1.0 + swing * math.cos(2 * math.pi * (month - peak) / 12)
+
+
+def _months() -> list[tuple[int, int]]:
+    return [(START.year + i // 12, i % 12 + 1) for i in range(YEARS * 12)]
+
+
+def _transactions(rows: int, seed: int) -> Iterator[tuple]:
+    """Expense rows in date order: (account_id, date, amount, type, category, note)."""
+    rng = random.Random(seed)
+    names = list(EXPENSE_CATEGORIES)
+    weights = [EXPENSE_CATEGORIES[name][1] for name in names]
+    days = YEARS * 365
+    per_day, extra = divmod(rows, days)
+    for offset in range(days):
+        day = START + timedelta(days=offset)
+        count = per_day + (1 if offset < extra else 0)
+        for name in rng.choices(names, weights, k=count):
+            typical, _, peak, swing = EXPENSE_CATEGORIES[name]
+            amount = (
+                typical * _seasonal(day.month, peak, swing) * rng.lognormvariate(0, 0.3)
+            )
+            account_id = rng.choice((1, 1, 2, 4))
+            yield (account_id, day.isoformat(), -round(amount, 2), "expense", name, "")
+
+
+def _income(rows: int, seed: int) -> Iterator[tuple]:
+    """Income rows in date order: (account_id, date, amount, source)."""
+    rng = random.Random(seed + 1)
+    months = _months()
+    per_month = max(int(rows * INCOME_SHARE) // len(months), 1)
+    for year, month in months:
+        last_day = calendar.monthrange(year, month)[1]
+        yield (1, f"{year}-{month:02d}-01", 3200.0, "salary")
+        for _ in range(per_month - 1):
+            source = rng.choice(INCOME_SOURCES[1:])
+            day = rng.randint(2, last_day)
+            low, high = (50, 800) if source == "freelance" else (1, 40)
+            amount = round(rng.uniform(low, high), 2)
+            yield (rng.choice((1, 3)), f"{year}-{month:02d}-{day:02d}", amount, source)
+
+
+def generate_ledger(rows: int, seed: int = 0) -> Ledger:
+    accounts = [(i + 1, *account) for i, account in enumerate(ACCOUNTS)]
+    budgets = [
+        (f"{year}-{month:02d}", name, round(typical * freq * 0.4, 2))
+        for year, month in _months()
+        for name, (typical, freq, _, _) in EXPENSE_CATEGORIES.items()
+    ]
+    return Ledger(accounts, _transactions(rows, seed), _income(rows, seed), budgets)
+
+
+def write_sqlite(db_path: Path, rows: int, seed: int = 0) -> None:
+    """Fill a fresh database; rows go in date order, as a real ledger grows."""
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{db_path}{suffix}").unlink(missing_ok=True)
+    ledger = generate_ledger(rows, seed)
+    storage = SQLiteStorage(db_path)
+    with storage._connect() as conn:
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.executemany(
+            "INSERT INTO accounts (id, name, currency) VALUES (?, ?, ?)",
+            [
+                (account_id, name, currency)
+                for account_id, name, _, currency in ledger.accounts
+            ],
+        )
+        conn.executemany(
+            "INSERT INTO categories (name) VALUES (?)",
+            [(name,) for name in (*EXPENSE_CATEGORIES, *INCOME_SOURCES)],
+        )
+        ids = dict(conn.execute("SELECT name, id FROM categories").fetchall())
+        conn.executemany(
+            "INSERT INTO transactions "
+            "(account_id, date, amount, type, category_id, note) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                (a, d, amount, t, ids[c], n)
+                for a, d, amount, t, c, n in ledger.transactions
+            ),
+        )
+        conn.executemany(
+            "INSERT INTO income (account_id, date, amount, source_id) "
+            "VALUES (?, ?, ?, ?)",
+            ((a, d, amount, ids[s]) for a, d, amount, s in ledger.income),
+        )
+        conn.commit()
+    conn.close()
+
+
+def write_csv(directory: Path, rows: int, seed: int = 0) -> None:
+    """The same ledger in the CLI's CSV files (accounts, transactions, budgets)."""
+    ledger = generate_ledger(rows, seed)
+    directory.mkdir(parents=True, exist_ok=True)
+    save_accounts(
+        directory / "accounts.csv",
+        [
+            Account(str(i), name, kind, currency)
+            for i, name, kind, currency in ledger.accounts
+        ],
+    )
+    transactions = [
+        Transaction(str(n), str(a), d, amount, note, category, t)
+        for n, (a, d, amount, t, category, note) in enumerate(ledger.transactions, 1)
+    ]
+    save_transactions(directory / "transactions.csv", transactions)
+    save_budgets(
+        directory / "budgets.csv",
+        [Budget(str(n), *budget) for n, budget in enumerate(ledger.budgets, 1)],
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", choices=SIZES, default="10k")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, default=Path(__file__).parent / ".data")
+    args = parser.parse_args()
+
+    target = args.out / f"{args.size}-seed{args.seed}"
+    target.mkdir(parents=True, exist_ok=True)
+    write_sqlite(target / "finance.db", SIZES[args.size], args.seed)
+    write_csv(target, SIZES[args.size], args.seed)
+    print(f"wrote {target}")
+
+
+if __name__ == "__main__":
+    main()
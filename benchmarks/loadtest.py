@@ -0,0 +1,176 @@
+"""Mixed read/write load against the API: throughput, latency and lock errors.
+
+    python benchmarks/loadtest.py --threads 8 --seconds 10 --write-ratio 0.3
+    python benchmarks/loadtest.py --url http://127.0.0.1:5000 --threads 16
+
+Without ``--url`` the app runs in-process (one Flask test client per thread)
+on a fresh 10k-row benchmark ledger. With ``--url`` requests go over HTTP to
+a running server, e.g. ``app.py --workers 4`` on a copy of that ledger.
+Lock errors are 503 responses (writes that gave up after retrying) and any
+500 or exception mentioning a locked database.
+"""
+
+import argparse
+import http.client
+import json
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Callable
+from urllib.parse import urlsplit
+
+from generate import write_sqlite
+
+from app import create_app
+
+READS = [
+    "/transactions?limit=50",
+    "/stats/cashflow?from=2024-01-01&to=2024-12-31",
+    "/accounts/1/balance",
+    "/dashboard?limit=20",
+]
+CATEGORIES = ["groceries", "transport", "restaurants", "health"]
+
+Request = Callable[[str, str, dict | None], tuple[int, str]]
+
+
+def test_client_factory(db_path: Path) -> Callable[[], Request]:
+    app = create_app({"DATABASE": db_path, "FX_RATES_PATH": None})
+
+    def factory() -> Request:
+        client = app.test_client()
+
+        def request(method: str, path: str, body: dict | None) -> tuple[int, str]:
+            response = client.open(path, method=method, json=body)
+            return response.status_code, response.get_data(as_text=True)
+
+        return request
+
+    return factory
+
+
+def http_factory(url: str) -> Callable[[], Request]:
+    parts = urlsplit(url)
+
+    def factory() -> Request:
+        def request(method: str, path: str, body: dict | None) -> tuple[int, str]:
+            conn = http.client.HTTPConnection(parts.hostname, parts.port or 80)
+            try:
+                payload = json.dumps(body) if body is not None else None
+                headers = {"Content-Type": "application/json"} if body else {}
+                conn.request(method, path, body=payload, headers=headers)
+                response = conn.getresponse()
+                return response.status, response.read().decode()
+            finally:
+                conn.close()
+
+        return request
+
+    return factory
+
+
+def worker(
+    request: Request, deadline: float, write_ratio: float, seed: int, samples: list
+) -> None:
+    rng = random.Random(seed)
+    created: list[int] = []
+    while time.monotonic() < deadline:
+        if rng.random() < write_ratio:
+            kind = "write"
+            if created and rng.random() < 0.3:
+                call = ("DELETE", f"/transactions/{created.pop()}", None)
+            else:
+                day = f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+                body = {
+                    "account_id": rng.choice((1, 2, 4)),
+                    "date": day,
+                    "amount": round(rng.uniform(1, 200), 2),
+                    "type": "expense",
+                    "category": rng.choice(CATEGORIES),
+                }
+                call = ("POST", "/transactions", body)
+        else:
+            kind = "read"
+            call = ("GET", rng.choice(READS), None)
+        start = time.perf_counter()
+        try:
+            status, text = request(*call)
+        except Exception as exc:  # an unhandled error in-process is a 500
+            status, text = 500, repr(exc)
+        elapsed = time.perf_counter() - start
+        if status == 201 and call[0] == "POST":
+            created.append(json.loads(text)["id"])
+        locked = status == 503 or (status >= 500 and "locked" in text)
+        samples.append((kind, status, elapsed, locked))
+
+
+def percentile(values: list[float], q: float) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def report(samples: list, seconds: float, threads: int, write_ratio: float) -> dict:
+    result = {
+        "threads": threads,
+        "write_ratio": write_ratio,
+        "seconds": seconds,
+        "requests": len(samples),
+        "throughput_rps": round(len(samples) / seconds, 1),
+        "lock_errors": sum(1 for s in samples if s[3]),
+        "statuses": dict(Counter(str(s[1]) for s in samples)),
+    }
+    for kind in ("read", "write"):
+        latencies = [s[2] * 1000 for s in samples if s[0] == kind]
+        result[kind] = {
+            "count": len(latencies),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+        }
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--write-ratio", type=float, default=0.3)
+    parser.add_argument("--url", help="drive a running server instead of in-process")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.url:
+            factory = http_factory(args.url)
+        else:
+            db_path = Path(tmp) / "load.db"
+            write_sqlite(db_path, args.rows, args.seed)
+            factory = test_client_factory(db_path)
+
+        samples: list = []
+        deadline = time.monotonic() + args.seconds
+        threads = [
+            threading.Thread(
+                target=worker,
+                args=(factory(), deadline, args.write_ratio, args.seed + i, samples),
+            )
+            for i in range(args.threads)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    result = report(samples, args.seconds, args.threads, args.write_ratio)
+    print(json.dumps(result, indent=2))
+    sys.exit(1 if result["statuses"].get("500") else 0)
+
+
+if __name__ == "__main__":
+    main()
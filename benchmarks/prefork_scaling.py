@@ -0,0 +1,166 @@
+"""Read throughput of the pre-fork server for increasing worker counts.
+
+    python benchmarks/prefork_scaling.py --workers 1 2 4 --seconds 10
+
+Seeds a temporary WAL database, starts ``app.py --workers N`` on it for each
+N and hammers ``GET /transactions?limit=50`` from a fixed pool of client
+processes. Prints requests/second and the speedup over the first N.
+
+On Linux it also reads the CPU time the master and its workers used during
+the run from /proc. CPU per request that stays flat as N grows means the
+workers don't contend with each other, so throughput scales with N until
+cores run out. ``ceiling`` is that bound: N workers / CPU per request, the
+rate with a free core per worker. It is a projection; only a run with at
+least N free cores (plus some for the clients) measures the scaling itself.
+"""
+
+import argparse
+import http.client
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Optional
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from personal_finance.storage.sqlite_storage import SQLiteStorage  # noqa: E402
+
+PATH = "/transactions?limit=50"
+
+
+def seed(db_path: Path, rows: int) -> None:
+    storage = SQLiteStorage(db_path)
+    account = storage.create_account("Bench", "EUR")
+    rng = random.Random(0)
+    with storage._connect() as conn:
+        conn.executemany(
+            "INSERT INTO transactions (account_id, date, amount, type, note) "
+            "VALUES (?, ?, ?, 'expense', '')",
+            (
+                (
+                    account["id"],
+                    f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                    -rng.uniform(1, 200),
+                )
+                for _ in range(rows)
+            ),
+        )
+
+
+def client(port: int, deadline: float, counter) -> None:
+    done = 0
+    while time.monotonic() < deadline:
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        conn.request("GET", PATH)
+        conn.getresponse().read()
+        conn.close()
+        done += 1
+    with counter.get_lock():
+        counter.value += done
+
+
+def server_cpu(pid: int) -> Optional[float]:
+    """CPU seconds used so far by the server and its workers; None off Linux."""
+    try:
+        children = Path(f"/proc/{pid}/task/{pid}/children").read_text().split()
+        ticks = 0
+        for proc in [pid, *map(int, children)]:
+            # Fields after the parenthesised name start at field 3 (state);
+            # utime and stime are fields 14 and 15.
+            fields = Path(f"/proc/{proc}/stat").read_text().rsplit(")", 1)[1].split()
+            ticks += int(fields[11]) + int(fields[12])
+    except (OSError, ValueError):
+        return None
+    return ticks / os.sysconf("SC_CLK_TCK")
+
+
+def wait_ready(port: int, timeout: float = 15.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health")
+            conn.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def run(
+    db_path: Path, workers: int, clients: int, seconds: float, port: int
+) -> tuple[float, Optional[float]]:
+    """Requests/second, and server CPU milliseconds per request if known."""
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "app.py",
+            "--workers",
+            str(workers),
+            "--port",
+            str(port),
+            "--host",
+            "127.0.0.1",
+            "--db",
+            str(db_path),
+        ],
+        cwd=ROOT,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_ready(port)
+        cpu_before = server_cpu(server.pid)
+        counter = multiprocessing.Value("q", 0)
+        deadline = time.monotonic() + seconds
+        procs = [
+            multiprocessing.Process(target=client, args=(port, deadline, counter))
+            for _ in range(clients)
+        ]
+        for proc in procs:
+            proc.start()
+        for proc in procs:
+            proc.join()
+        cpu_after = server_cpu(server.pid)
+        cpu_ms = None
+        if cpu_before is not None and cpu_after is not None and counter.value:
+            cpu_ms = (cpu_after - cpu_before) * 1000 / counter.value
+        return counter.value / seconds, cpu_ms
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--port", type=int, default=5099)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        seed(db_path, args.rows)
+        cores = multiprocessing.cpu_count()
+        print(f"cores={cores} rows={args.rows} clients={args.clients}")
+        print(
+            f"{'workers':>7} {'req/s':>9} {'speedup':>8} "
+            f"{'cpu ms/req':>10} {'ceiling':>9}"
+        )
+        baseline = None
+        for workers in args.workers:
+            rate, cpu_ms = run(db_path, workers, args.clients, args.seconds, args.port)
+            baseline = baseline or rate
+            cpu = f"{cpu_ms:>10.2f} {workers * 1000 / cpu_ms:>9.1f}" if cpu_ms else ""
+            print(f"{workers:>7} {rate:>9.1f} {rate / baseline:>7.2f}x {cpu}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""Time the hot paths on a generated ledger and compare with a stored baseline.
+
+    python benchmarks/run.py --size 10k
+    python benchmarks/run.py --size 10k --update-baseline
+
+Ledgers are generated once per size/seed into ``benchmarks/.data`` and reused.
+Each case is timed like ``timeit``: a call count is picked so one sample
+takes at least 0.2 s, and ``--repeat`` samples are taken. The per-call median is
+compared with ``benchmarks/baseline.json`` and the run exits non-zero when a
+case is more than ``--threshold`` (default 25%) slower. Baselines are only
+meaningful on the machine that recorded them.
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import timeit
+from pathlib import Path
+from typing import Callable
+
+from generate import SIZES, write_csv, write_sqlite
+
+from app import create_app
+from managers.account_manager import AccountManager
+from managers.budget_manager import BudgetManager
+from managers.transaction_manager import TransactionManager
+from personal_finance.analytics import forecast_income, summarize_amounts
+from personal_finance.storage.sqlite_storage import SQLiteStorage
+from storage.csv_storage import (
+    load_accounts,
+    load_budgets,
+    load_transactions,
+    save_transactions,
+)
+
+HERE = Path(__file__).resolve().parent
+BASELINE = HERE / "baseline.json"
+# Managers and CSV files hold every row as a Python object; past this many
+# rows those cases run on a ledger of this size instead.
+OBJECT_ROWS_CAP = 1_000_000
+
+
+def ensure_data(size: str, seed: int) -> Path:
+    target = HERE / ".data" / f"{size}-seed{seed}"
+    rows = SIZES[size]
+    if not (target / "finance.db").exists():
+        print(f"generating {size} ledger in {target} ...", file=sys.stderr)
+        target.mkdir(parents=True, exist_ok=True)
+        write_sqlite(target / "finance.db", rows, seed)
+    if not (target / "transactions.csv").exists():
+        write_csv(target, min(rows, OBJECT_ROWS_CAP), seed)
+    return target
+
+
+def build_cases(data: Path, scratch: Path) -> dict[str, Callable[[], object]]:
+    storage = SQLiteStorage(data / "finance.db")
+    year = storage.list_transactions(start_date="2024-01-01", end_date="2024-12-31")
+    history = storage.monthly_income()
+
+    accounts = AccountManager()
+    accounts.accounts = load_accounts(data / "accounts.csv")
+    transactions = TransactionManager(accounts)
+    transactions.transactions = load_transactions(data / "transactions.csv")
+    budgets = BudgetManager(transactions)
+    budgets.budgets = load_budgets(data / "budgets.csv")
+    sample = transactions.transactions[: min(len(transactions.transactions), 100_000)]
+
+    client = create_app(
+        {"DATABASE": data / "finance.db", "FX_RATES_PATH": None}
+    ).test_client()
+
+    def get(url: str) -> Callable[[], object]:
+        def call():
+            response = client.get(url)
+            assert response.status_code == 200, response.status_code
+            return response.data
+
+        return call
+
+    return {
+        "storage.list_transactions.month": lambda: storage.list_transactions(
+            start_date="2024-06-01", end_date="2024-06-30"
+        ),
+        "storage.list_transactions.account_year": lambda: storage.list_transactions(
+            start_date="2024-01-01", end_date="2024-12-31", account_id=2
+        ),
+        "storage.list_transactions.page": lambda: storage.list_transactions(
+            limit=50, before=("2020-01-01", 0)
+        ),
+        "storage.monthly_income": storage.monthly_income,
+        "analytics.summarize_amounts.year": lambda: summarize_amounts(year),
+        "analytics.forecast_income": lambda: forecast_income(history, months_ahead=6),
+        "managers.get_account": lambda: accounts.get_account("3"),
+        "managers.get_transaction.last": lambda: transactions.get_transaction(
+            sample[-1].id
+        ),
+        "managers.list_between.month": lambda: transactions.list_between(
+            "2024-06-01", "2024-06-30"
+        ),
+        "managers.sum_between.year": lambda: transactions.sum_between(
+            "2024-01-01", "2024-12-31", account_id="1"
+        ),
+        "managers.check_budget_status": lambda: budgets.check_budget_status(
+            "2024-12", "groceries"
+        ),
+        "csv.load_transactions": lambda: load_transactions(data / "transactions.csv"),
+        "csv.save_transactions.100k": lambda: save_transactions(
+            scratch / "transactions.csv", sample
+        ),
+        "http.transactions_page": get("/transactions?limit=50"),
+        "http.stats_summary.year": get("/stats/summary?from=2024-01-01&to=2024-12-31"),
+        "http.stats_cashflow": get("/stats/cashflow?from=2024-01-01&to=2024-12-31"),
+        "http.income_forecast": get("/stats/income_forecast?months=6"),
+        "http.dashboard": get("/dashboard?limit=50"),
+    }
+
+
+def time_case(fn: Callable[[], object], repeat: int) -> dict:
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    samples = [t / number * 1000 for t in timer.repeat(repeat, number)]
+    return {
+        "median_ms": round(statistics.median(samples), 6),
+        "min_ms": round(min(samples), 6),
+        "calls": number,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    failures = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        ratio = result["median_ms"] / before["median_ms"]
+        flag = "REGRESSION" if ratio > 1 + threshold else ""
+        print(
+            f"{name:42} {before['median_ms']:>11.4f} -> {result['median_ms']:>11.4f} ms"
+            f" {ratio:>6.2f}x {flag}"
+        )
+        if flag:
+            failures.append(name)
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", choices=SIZES, default="10k")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--only", help="run cases whose name contains this")
+    parser.add_argument("--output", type=Path, help="write results JSON here")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.25)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    data = ensure_data(args.size, args.seed)
+    with tempfile.TemporaryDirectory() as scratch:
+        cases = build_cases(data, Path(scratch))
+        results = {
+            name: time_case(fn, args.repeat)
+            for name, fn in cases.items()
+            if not args.only or args.only in name
+        }
+    report = {
+        "size": args.size,
+        "seed": args.seed,
+        "rows": SIZES[args.size],
+        "machine": f"{platform.machine()} {platform.processor()}".strip(),
+        "python": platform.python_version(),
+        "results": results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+
+    baselines = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    if args.update_baseline:
+        baselines[args.size] = report
+        args.baseline.write_text(json.dumps(baselines, indent=2) + "\n")
+        print(f"baseline for {args.size} written to {args.baseline}")
+        return 0
+    if args.size not in baselines:
+        print(json.dumps(report, indent=2))
+        print(f"no {args.size} baseline in {args.baseline}; nothing to compare")
+        return 0
+    failures = compare(results, baselines[args.size]["results"], args.threshold)
+    if failures:
+        print(f"{len(failures)} case(s) regressed more than {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
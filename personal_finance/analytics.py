@@ -1,16 +1,26 @@
 import statistics
 from datetime import datetime
-from typing import List
+from typing import List, Optional
 
 import numpy as np
 
 
-def summarize_amounts(records: List[dict]) -> dict:
+def summarize_amounts(
+    records: List[dict], by_category: Optional[dict[str, float]] = None
+) -> dict:
+    """Descriptive statistics of record amounts.
+
+    ``by_category`` takes precomputed per-category totals (e.g. grouped in
+    SQL); otherwise they are summed from the records.
+    """
     amounts = [float(r.get("amount", 0)) for r in records]
-    categories: dict[str, float] = {}
-    for r in records:
-        cat = (r.get("category") or r.get("source") or "uncategorized").strip()
-        categories[cat] = categories.get(cat, 0.0) + float(r.get("amount", 0))
+    if by_category is not None:
+        categories = dict(by_category)
+    else:
+        categories = {}
+        for r in records:
+            cat = (r.get("category") or r.get("source") or "uncategorized").strip()
+            categories[cat] = categories.get(cat, 0.0) + float(r.get("amount", 0))
 
     if not amounts:
         return {
@@ -89,3 +99,77 @@ def forecast_income(history: List[dict], months_ahead: int = 3) -> dict:
         for row in history_sorted
     ]
     return {"history": clean_history, "forecast": forecast_rows}
+
+
+def _month_offset(start_month: str, month: str) -> int:
+    return (
+        (int(month[:4]) - int(start_month[:4])) * 12
+        + int(month[5:7])
+        - int(start_month[5:7])
+    )
+
+
+def forecast_series(rows: List[dict], months_ahead: int = 3) -> dict:
+    """Fit a linear trend to every series at once and extend it N months.
+
+    ``rows`` are ``{"month", "series", "total"}`` aggregates. They are laid out
+    as a dense months x series matrix (missing months count as zero) and all
+    columns are solved with a single least-squares call.
+    """
+    if months_ahead < 1:
+        months_ahead = 1
+
+    if not rows:
+        return {"months": [], "series": []}
+
+    first_month = min(row["month"] for row in rows)
+    last_month = max(row["month"] for row in rows)
+    span = _month_offset(first_month, last_month) + 1
+    keys = sorted({row["series"] for row in rows})
+    key_index = {key: i for i, key in enumerate(keys)}
+
+    month_idx = np.fromiter(
+        (_month_offset(first_month, row["month"]) for row in rows),
+        dtype=np.intp,
+        count=len(rows),
+    )
+    series_idx = np.fromiter(
+        (key_index[row["series"]] for row in rows), dtype=np.intp, count=len(rows)
+    )
+    totals = np.fromiter(
+        (float(row["total"]) for row in rows), dtype=float, count=len(rows)
+    )
+    matrix = np.zeros((span, len(keys)), dtype=float)
+    np.add.at(matrix, (month_idx, series_idx), totals)
+
+    if span == 1:
+        slope = np.zeros(len(keys), dtype=float)
+        intercept = matrix[0]
+    else:
+        design = np.column_stack([np.arange(span, dtype=float), np.ones(span)])
+        coef, *_ = np.linalg.lstsq(design, matrix, rcond=None)
+        slope, intercept = coef
+
+    future_x = np.arange(span, span + months_ahead, dtype=float)
+    predicted = np.outer(future_x, slope) + intercept
+
+    months = [_add_months(first_month, i) for i in range(span)]
+    future_months = [_add_months(last_month, i) for i in range(1, months_ahead + 1)]
+    history_cols = np.round(matrix, 2).T.tolist()
+    forecast_cols = np.round(predicted, 2).T.tolist()
+    series = []
+    for key, history, forecast in zip(keys, history_cols, forecast_cols):
+        series.append(
+            {
+                "key": key,
+                "history": [
+                    {"month": month, "amount": amount}
+                    for month, amount in zip(months, history)
+                ],
+                "forecast": [
+                    {"month": month, "predicted_amount": amount}
+                    for month, amount in zip(future_months, forecast)
+                ],
+            }
+        )
+    return {"months": months, "series": series}
@@ -0,0 +1,152 @@
+import re
+from collections import deque
+from typing import Iterable, Optional
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+RULE_KINDS = ("keyword", "regex")
+
+
+def check_rule(kind: str, pattern: str) -> str:
+    """Validate a rule and return its pattern, stripped."""
+    if kind not in RULE_KINDS:
+        raise ValueError("kind must be 'keyword' or 'regex'")
+    pattern = (pattern or "").strip()
+    if not pattern:
+        raise ValueError("Rule pattern is required")
+    if kind == "regex":
+        try:
+            re.compile(pattern, re.IGNORECASE)
+        except re.error as exc:
+            raise ValueError(f"Invalid regex: {exc}") from exc
+    return pattern
+
+
+def required_literal(pattern: str) -> Optional[str]:
+    """Longest ASCII text every match of ``pattern`` contains, casefolded.
+
+    None when there is no such run of at least two characters (or the pattern
+    can't be analysed), in which case the regex is always tried.
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except Exception:
+        return None
+    runs, current = [], []
+
+    def walk(items) -> None:
+        for op, av in items:
+            if op is sre_parse.LITERAL and av < 128:
+                current.append(chr(av))
+            elif op is sre_parse.SUBPATTERN:
+                walk(av[-1])  # a group is as mandatory as its parent
+            else:
+                runs.append("".join(current))
+                current.clear()
+
+    walk(parsed)
+    runs.append("".join(current))
+    best = max(runs, key=len)
+    return best.casefold() if len(best) >= 2 else None
+
+
+class RuleMatcher:
+    """Finds the first of a list of categorization rules that matches a note.
+
+    ``rules`` are ``(kind, pattern, category_id)`` in precedence order. Keyword
+    rules match whole words, ignoring case. Regex rules are searched anywhere,
+    ignoring case. One pass of an Aho-Corasick automaton over the note finds
+    every keyword, plus the text each regex requires (see
+    :func:`required_literal`). Only regexes whose text is present, and that
+    rank above the best keyword found, are searched. So the cost per note
+    barely grows with the number of rules.
+    """
+
+    def __init__(self, rules: Iterable[tuple[str, str, Optional[int]]]):
+        self._categories: list[Optional[int]] = []
+        # Automaton: per node its edges, failure link and outputs, which are
+        # (rank, length, whole word) of the keywords/literals ending there.
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail = [0]
+        self._out: list[list[tuple[int, int, bool]]] = [[]]
+        # (rank, compiled, whether the automaton prefilters it)
+        self._regexes: list[tuple[int, re.Pattern, bool]] = []
+        for rank, (kind, pattern, category_id) in enumerate(rules):
+            self._categories.append(category_id)
+            if kind == "keyword":
+                self._add(pattern.casefold(), rank, whole_word=True)
+                continue
+            literal = required_literal(pattern)
+            if literal:
+                self._add(literal, rank, whole_word=False)
+            compiled = re.compile(pattern, re.IGNORECASE)
+            self._regexes.append((rank, compiled, bool(literal)))
+        self._link()
+
+    def __len__(self) -> int:
+        return len(self._categories)
+
+    def match(self, note: Optional[str]) -> Optional[int]:
+        """Category id of the first rule matching ``note``, or None."""
+        if not note or not self._categories:
+            return None
+        best, candidates = self._scan(note.casefold())
+        for rank, pattern, prefiltered in self._regexes:
+            if best is not None and rank >= best:
+                break
+            if (not prefiltered or rank in candidates) and pattern.search(note):
+                best = rank
+                break
+        return None if best is None else self._categories[best]
+
+    def _add(self, word: str, rank: int, whole_word: bool) -> None:
+        node = 0
+        for char in word:
+            child = self._goto[node].get(char)
+            if child is None:
+                child = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._goto[node][char] = child
+            node = child
+        self._out[node].append((rank, len(word), whole_word))
+
+    def _link(self) -> None:
+        """Set failure links breadth-first and merge outputs along them."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def _scan(self, text: str) -> tuple[Optional[int], set[int]]:
+        """Best-ranked keyword in ``text`` and the regexes whose text it has."""
+        goto, fail, out = self._goto, self._fail, self._out
+        best = None
+        candidates: set[int] = set()
+        node = 0
+        for end, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for rank, length, whole_word in out[node]:
+                if not whole_word:
+                    candidates.add(rank)
+                    continue
+                if best is not None and rank >= best:
+                    continue
+                start = end - length + 1
+                if (start == 0 or not text[start - 1].isalnum()) and (
+                    end + 1 == len(text) or not text[end + 1].isalnum()
+                ):
+                    best = rank
+        return best, candidates
@@ -1,13 +1,146 @@
-from typing import List
+import re
+from bisect import bisect_left, bisect_right
+from datetime import date as date_cls
+from typing import Iterable, List
 from models.transaction import Transaction, ExpenseTransaction, IncomeTransaction
 from managers.account_manager import AccountManager
 from exceptions import ValidationError, NotFoundError
 
+DATE_FORMAT = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+def _day(date: str) -> int:
+    if DATE_FORMAT.fullmatch(date or ""):
+        try:
+            return date_cls.fromisoformat(date).toordinal()
+        except ValueError:
+            pass
+    raise ValidationError(f"Transaction date must be YYYY-MM-DD, got {date!r}.")
+
+
+class _DateIndex:
+    """Transactions sorted by date, plus a Fenwick tree of amounts per day.
+
+    Ranges are located with bisect, so listing costs O(log n + k). The tree
+    is indexed by day, so a sum costs O(log d) over a span of d days, and so
+    do adds and removals, whatever order they come in. Building from a list
+    sorts it once and fills the tree in one pass.
+    """
+
+    def __init__(self, transactions: Iterable[Transaction] = ()):
+        self._items: List[Transaction] = sorted(transactions, key=lambda t: t.date)
+        self._dates: List[str] = [t.date for t in self._items]
+        self._first_day = 0
+        self._tree: List[float] = [0.0]  # 1-based; covers _first_day onwards
+        if self._items:
+            self._build(_day(self._dates[0]), _day(self._dates[-1]))
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(self, transaction: Transaction) -> None:
+        day = _day(transaction.date)
+        pos = bisect_right(self._dates, transaction.date)
+        self._dates.insert(pos, transaction.date)
+        self._items.insert(pos, transaction)
+        first, last = self._first_day, self._first_day + len(self._tree) - 2
+        if len(self._items) == 1:
+            self._build(day - 366, day + 366)
+        elif not first <= day <= last:
+            # Widen with as much room again, so rebuilds stay rare.
+            span = max(last - first, 366)
+            self._build(min(first, day - span), max(last, day + span))
+        else:
+            self._update(day, transaction.amount)
+
+    def remove(self, transaction: Transaction) -> None:
+        pos = bisect_left(self._dates, transaction.date)
+        while self._items[pos] is not transaction:
+            pos += 1
+        del self._dates[pos]
+        del self._items[pos]
+        self._update(_day(transaction.date), -transaction.amount)
+
+    def _bounds(self, start: str, end: str) -> tuple[int, int]:
+        return bisect_left(self._dates, start), bisect_right(self._dates, end)
+
+    def between(self, start: str, end: str) -> List[Transaction]:
+        lo, hi = self._bounds(start, end)
+        return self._items[lo:hi]
+
+    def sum_between(self, start: str, end: str) -> float:
+        lo, hi = self._bounds(start, end)
+        if hi <= lo:
+            return 0.0
+        # Every transaction on the first and last matched day is in range.
+        first, last = _day(self._dates[lo]), _day(self._dates[hi - 1])
+        return self._prefix(last) - self._prefix(first - 1)
+
+    def _build(self, first: int, last: int) -> None:
+        self._first_day = first
+        size = last - first + 1
+        tree = [0.0] * (size + 1)
+        for t in self._items:
+            tree[_day(t.date) - first + 1] += t.amount
+        for i in range(1, size + 1):
+            parent = i + (i & -i)
+            if parent <= size:
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _update(self, day: int, amount: float) -> None:
+        i, tree = day - self._first_day + 1, self._tree
+        while i < len(tree):
+            tree[i] += amount
+            i += i & -i
+
+    def _prefix(self, day: int) -> float:
+        """Total of every transaction dated on or before ``day``."""
+        i = min(day - self._first_day + 1, len(self._tree) - 1)
+        total = 0.0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
 
 class TransactionManager:
     def __init__(self, account_manager: AccountManager):
-        self.transactions: List[Transaction] = []
         self.account_manager = account_manager
+        self.transactions = []
+
+    @property
+    def transactions(self) -> List[Transaction]:
+        return self._transactions
+
+    @transactions.setter
+    def transactions(self, transactions: List[Transaction]) -> None:
+        # A bad date raises before anything is replaced.
+        by_date = _DateIndex(transactions)
+        per_account: dict[str, List[Transaction]] = {}
+        for t in transactions:
+            per_account.setdefault(t.account_id, []).append(t)
+        by_account = {
+            account_id: _DateIndex(account_transactions)
+            for account_id, account_transactions in per_account.items()
+        }
+        self._transactions = transactions
+        self._by_date = by_date
+        self._by_account = by_account
+
+    def _index(self, transaction: Transaction) -> None:
+        self._by_date.add(transaction)
+        account_index = self._by_account.get(transaction.account_id)
+        if account_index is None:
+            account_index = self._by_account[transaction.account_id] = _DateIndex()
+        account_index.add(transaction)
+
+    def _unindex(self, transaction: Transaction) -> None:
+        self._by_date.remove(transaction)
+        account_index = self._by_account[transaction.account_id]
+        account_index.remove(transaction)
+        if not len(account_index):
+            del self._by_account[transaction.account_id]
 
     def list_transactions(self) -> List[Transaction]:
         return self.transactions
@@ -29,6 +162,7 @@ class TransactionManager:
             raise ValidationError(
                 f"Transaction with ID '{transaction.id}' already exists."
             )
+        self._index(transaction)  # validates the date before anything changes
         self.transactions.append(transaction)
 
     def create_transaction(
@@ -61,6 +195,11 @@ class TransactionManager:
         category: str | None = None,
     ) -> None:
         t = self.get_transaction(transaction_id)
+        reindex = bool(date) or amount is not None
+        if date:
+            _day(date)  # reject a bad date while the transaction is still indexed
+        if reindex:
+            self._unindex(t)
         if date:
             t.date = date
         if amount is not None:
@@ -68,6 +207,8 @@ class TransactionManager:
                 t.amount = abs(float(amount))
             else:
                 t.amount = -abs(float(amount))
+        if reindex:
+            self._index(t)
         if description:
             t.description = description
         if category:
@@ -75,8 +216,24 @@ class TransactionManager:
 
     def delete_transaction(self, transaction_id: str) -> None:
         idx = self._find_index(transaction_id)
+        self._unindex(self.transactions[idx])
         del self.transactions[idx]
 
+    def _range_index(self, account_id: str | None) -> _DateIndex:
+        if account_id is None:
+            return self._by_date
+        return self._by_account.get(account_id, _DateIndex())
+
+    def list_between(
+        self, start: str, end: str, account_id: str | None = None
+    ) -> List[Transaction]:
+        """Transactions dated start..end (inclusive, 'YYYY-MM-DD'), by date."""
+        return self._range_index(account_id).between(start, end)
+
+    def sum_between(self, start: str, end: str, account_id: str | None = None) -> float:
+        """Signed total of transactions dated start..end (expenses negative)."""
+        return self._range_index(account_id).sum_between(start, end)
+
     def get_total_for_month_and_category(self, month: str, category: str) -> float:
         """
         Month format: 'YYYY-MM'. Expenses are negative numbers.
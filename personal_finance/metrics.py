@@ -0,0 +1,254 @@
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Optional
+
+slow_query_logger = logging.getLogger("personal_finance.slow_queries")
+
+# Upper bounds (seconds) of the request latency histogram buckets.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+@lru_cache(maxsize=1024)
+def query_shape(sql: str) -> str:
+    """SQL text with literals and variable-length ``?`` lists collapsed, so
+    statements that differ only in their values share one series."""
+    shape = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    shape = re.sub(r"\b\d+(?:\.\d+)?\b", "?", shape)
+    shape = re.sub(r"\s+", " ", shape).strip()
+    return re.sub(r"\?(?:\s*,\s*\?)+", "?, ...", shape)
+
+
+def _labels(**labels: object) -> str:
+    def escape(value: object) -> str:
+        text = str(value)
+        return text.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    return ",".join(f'{key}="{escape(value)}"' for key, value in labels.items())
+
+
+class Metrics:
+    """In-process request and SQL statistics rendered in Prometheus text format.
+
+    Every process keeps its own registry; behind the pre-fork server each
+    scrape therefore reports the worker that answered it.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # (method, route) -> [bucket counts..., +Inf count, sum of seconds]
+        self._latency: dict[tuple[str, str], list[float]] = {}
+        self._statuses: dict[tuple[str, str, int], int] = {}
+        self._response_bytes: dict[tuple[str, str], int] = {}
+        # query shape -> [count, total seconds, rows returned]
+        self._queries: dict[str, list[float]] = {}
+
+    def observe_request(
+        self, method: str, route: str, status: int, seconds: float, size: int
+    ) -> None:
+        key = (method, route)
+        with self._lock:
+            buckets = self._latency.get(key)
+            if buckets is None:
+                buckets = self._latency[key] = [0.0] * (len(LATENCY_BUCKETS) + 2)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+            buckets[-2] += 1
+            buckets[-1] += seconds
+            status_key = (method, route, status)
+            self._statuses[status_key] = self._statuses.get(status_key, 0) + 1
+            self._response_bytes[key] = self._response_bytes.get(key, 0) + size
+
+    def observe_query(
+        self, sql: str, seconds: float, rows: int = 0, executed: int = 1
+    ) -> None:
+        """Add to a query shape's totals; fetches pass ``executed=0``."""
+        shape = query_shape(sql)
+        with self._lock:
+            stats = self._queries.get(shape)
+            if stats is None:
+                stats = self._queries[shape] = [0, 0.0, 0]
+            stats[0] += executed
+            stats[1] += seconds
+            stats[2] += rows
+
+    def render(self) -> str:
+        lines = [
+            "# HELP http_request_duration_seconds Request latency by route.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        with self._lock:
+            for (method, route), buckets in sorted(self._latency.items()):
+                for bound, count in zip(LATENCY_BUCKETS, buckets):
+                    labels = _labels(method=method, route=route, le=bound)
+                    lines.append(
+                        f"http_request_duration_seconds_bucket{{{labels}}} {count:g}"
+                    )
+                labels = _labels(method=method, route=route, le="+Inf")
+                lines.append(
+                    f"http_request_duration_seconds_bucket{{{labels}}} {buckets[-2]:g}"
+                )
+                labels = _labels(method=method, route=route)
+                lines.append(
+                    f"http_request_duration_seconds_sum{{{labels}}} {buckets[-1]:.6f}"
+                )
+                lines.append(
+                    f"http_request_duration_seconds_count{{{labels}}} {buckets[-2]:g}"
+                )
+
+            lines += [
+                "# HELP http_requests_total Responses by route and status code.",
+                "# TYPE http_requests_total counter",
+            ]
+            for (method, route, status), count in sorted(self._statuses.items()):
+                labels = _labels(method=method, route=route, status=status)
+                lines.append(f"http_requests_total{{{labels}}} {count}")
+
+            lines += [
+                "# HELP http_response_bytes_total Response body bytes by route.",
+                "# TYPE http_response_bytes_total counter",
+            ]
+            for (method, route), size in sorted(self._response_bytes.items()):
+                labels = _labels(method=method, route=route)
+                lines.append(f"http_response_bytes_total{{{labels}}} {size}")
+
+            series = (
+                ("sqlite_queries_total", "Statements executed by query shape.", 0),
+                ("sqlite_query_seconds_total", "Time spent executing and fetching.", 1),
+                ("sqlite_query_rows_total", "Rows returned by query shape.", 2),
+            )
+            for name, help_text, index in series:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                for shape, stats in sorted(self._queries.items()):
+                    value = f"{stats[index]:.6f}" if index == 1 else f"{stats[index]:g}"
+                    lines.append(f"{name}{{{_labels(query=shape)}}} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class SlowQueryLog:
+    """Statements slower than ``threshold_ms`` with parameters and query plan.
+
+    Entries go to the ``personal_finance.slow_queries`` logger as JSON and the
+    most recent ``keep`` stay in ``entries``.
+    """
+
+    def __init__(self, threshold_ms: float, keep: int = 100):
+        self.threshold = threshold_ms / 1000
+        self.entries: deque[dict] = deque(maxlen=keep)
+
+    def record(
+        self, conn: sqlite3.Connection, sql: str, params: object, seconds: float
+    ) -> None:
+        if params is None:
+            plan = None  # executemany: no single parameter set to explain with
+        else:
+            try:
+                # The base-class execute returns a plain, untimed cursor.
+                rows = sqlite3.Connection.execute(
+                    conn, f"EXPLAIN QUERY PLAN {sql}", params
+                ).fetchall()
+                plan = [row[3] for row in rows]
+            except sqlite3.Error as exc:
+                plan = [f"unavailable: {exc}"]
+        entry = {
+            "sql": " ".join(sql.split()),
+            "params": (
+                params if params is None or isinstance(params, dict) else list(params)
+            ),
+            "ms": round(seconds * 1000, 3),
+            "plan": plan,
+        }
+        self.entries.append(entry)
+        slow_query_logger.warning(json.dumps(entry, default=str))
+
+
+def timed_connection_class(
+    metrics: Optional[Metrics] = None, slow_log: Optional[SlowQueryLog] = None
+) -> type:
+    """``sqlite3.Connection`` subclass that times every statement.
+
+    Execute and fetch time both count towards a statement, since SQLite
+    produces rows lazily while they are fetched. A statement is logged as slow
+    once its running total crosses the threshold. ``executescript`` (schema
+    setup) is not timed.
+    """
+
+    class TimedCursor(sqlite3.Cursor):
+        _sql: Optional[str] = None
+        _params: object = None
+        _elapsed = 0.0
+        _logged = False
+
+        def _record(self, seconds: float, rows: int, executed: int) -> None:
+            self._elapsed += seconds
+            if metrics is not None:
+                metrics.observe_query(self._sql, seconds, rows, executed)
+            if (
+                slow_log is not None
+                and not self._logged
+                and self._elapsed >= slow_log.threshold
+            ):
+                self._logged = True
+                slow_log.record(self.connection, self._sql, self._params, self._elapsed)
+
+        def _timed(self, method, sql, args, params):
+            self._sql, self._params = sql, params
+            self._elapsed, self._logged = 0.0, False
+            start = time.perf_counter()
+            try:
+                return method(sql, args)
+            finally:
+                self._record(time.perf_counter() - start, 0, 1)
+
+        def execute(self, sql, parameters=()):
+            return self._timed(super().execute, sql, parameters, parameters)
+
+        def executemany(self, sql, seq_of_parameters):
+            return self._timed(super().executemany, sql, seq_of_parameters, None)
+
+        def _fetched(self, start: float, rows: int) -> None:
+            if self._sql is not None:
+                self._record(time.perf_counter() - start, rows, 0)
+
+        def fetchone(self):
+            start = time.perf_counter()
+            row = super().fetchone()
+            self._fetched(start, 0 if row is None else 1)
+            return row
+
+        def fetchmany(self, size=None):
+            start = time.perf_counter()
+            rows = super().fetchmany(self.arraysize if size is None else size)
+            self._fetched(start, len(rows))
+            return rows
+
+        def fetchall(self):
+            start = time.perf_counter()
+            rows = super().fetchall()
+            self._fetched(start, len(rows))
+            return rows
+
+        def __next__(self):
+            start = time.perf_counter()
+            row = super().__next__()
+            self._fetched(start, 1)
+            return row
+
+    class TimedConnection(sqlite3.Connection):
+        def cursor(self, factory=TimedCursor):
+            return super().cursor(factory)
+
+        # The C implementations of these bypass an overridden cursor().
+        def execute(self, sql, parameters=()):
+            return self.cursor().execute(sql, parameters)
+
+        def executemany(self, sql, seq_of_parameters):
+            return self.cursor().executemany(sql, seq_of_parameters)
+
+    return TimedConnection
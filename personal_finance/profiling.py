@@ -0,0 +1,55 @@
+import cProfile
+import itertools
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+
+class RequestProfiler:
+    """Profiles single requests with cProfile into rotated ``.prof`` files.
+
+    Only one request per process is profiled at a time; ``start`` returns
+    None while another profile is running. The newest ``keep`` files are
+    kept. Read them with ``python -m pstats <file>`` or snakeviz.
+    """
+
+    def __init__(self, directory: Path | str, keep: int = 20):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+
+    def start(self) -> Optional[cProfile.Profile]:
+        if not self._lock.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def stop(self, profile: cProfile.Profile, label: str) -> Path:
+        try:
+            profile.disable()
+            slug = re.sub(r"[^A-Za-z0-9]+", "_", label).strip("_")
+            stamp = time.strftime("%Y%m%dT%H%M%S")
+            name = f"{stamp}-{os.getpid()}-{next(self._counter)}-{slug}.prof"
+            path = self.directory / name
+            profile.dump_stats(path)
+            self._rotate()
+            return path
+        finally:
+            self._lock.release()
+
+    def _rotate(self) -> None:
+        files = []
+        for path in self.directory.glob("*.prof"):
+            try:
+                files.append((path.stat().st_mtime, path))
+            except FileNotFoundError:  # rotated away by another worker
+                continue
+        files.sort()
+        for _, path in files[: max(len(files) - self.keep, 0)]:
+            path.unlink(missing_ok=True)
@@ -0,0 +1,253 @@
+import csv
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+from personal_finance.storage.sqlite_storage import (
+    DatabaseBusyError,
+    SQLiteStorage,
+    check_on_duplicate,
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+# Columns an import CSV must have; ``category`` and ``note`` are optional.
+REQUIRED_COLUMNS = ("account_id", "date", "amount", "type")
+SPOOL_BLOCK = 1 << 16
+# A chunk that can't get the write lock is retried this often, a second apart,
+# before the job fails; interactive writes win the lock in between.
+CHUNK_BUSY_RETRIES = 5
+LEASE_NAME = "import-owner-{}.lock"
+
+# Which process owns a job is told by a random token, not the pid: a pid is
+# reused (a restarted container's worker is PID 1 again). While it has jobs in
+# a directory, a process holds an exclusive lock on the lease file named by
+# its token there; the lock goes away with the process however it ends. The
+# owner writes the file once locked, so an empty one is still being created.
+_token = uuid.uuid4().hex
+_leases: dict[Path, list[int]] = {}  # directory -> [fd, jobs]
+_leases_lock = threading.Lock()
+
+
+def _after_fork() -> None:
+    # A forked worker shares its parent's lock; it takes its own token.
+    global _token, _leases_lock
+    for fd, _ in _leases.values():
+        os.close(fd)
+    _leases.clear()
+    _leases_lock = threading.Lock()
+    _token = uuid.uuid4().hex
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+class ImportQueue:
+    """Runs CSV transaction imports on a pool of background threads.
+
+    ``submit`` spools the upload to a file beside the database and returns
+    the queued job at once. A worker thread then inserts it ``chunk_rows``
+    rows per write transaction through ``SQLiteStorage.import_chunk``, so the
+    write lock is held only briefly and requests keep being served between
+    chunks. Progress lives in the job's ``import_jobs`` row, so any worker
+    process can report it, and cancelling takes effect before the next chunk.
+    """
+
+    def __init__(self, workers: int = 2, chunk_rows: int = 1000):
+        self.chunk_rows = chunk_rows
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="import")
+
+    def submit(
+        self,
+        storage: SQLiteStorage,
+        stream: BinaryIO,
+        on_duplicate: Optional[str] = None,
+    ) -> dict:
+        check_on_duplicate(on_duplicate)
+        fd, name = tempfile.mkstemp(
+            prefix=f"{storage.db_path.stem}-import-",
+            suffix=".csv",
+            dir=storage.db_path.parent,
+        )
+        path = Path(name)
+        size = lines = 0
+        last = b"\n"
+        with os.fdopen(fd, "wb") as f:
+            while block := stream.read(SPOOL_BLOCK):
+                f.write(block)
+                size += len(block)
+                lines += block.count(b"\n")
+                last = block[-1:]
+        if size == 0:
+            path.unlink()
+            raise ValueError("CSV body is required")
+        # Rows after the header; quoted line breaks make this an estimate.
+        total_rows = max(lines + (last != b"\n") - 1, 0)
+        directory = storage.db_path.parent
+        try:
+            owner = _hold_lease(directory)
+            try:
+                job = storage.create_import_job(
+                    path.name, total_rows, os.getpid(), on_duplicate, owner=owner
+                )
+            except BaseException:
+                _release_lease(directory)
+                raise
+        except BaseException:
+            path.unlink()
+            raise
+        self._pool.submit(self._run, storage, job["id"], path)
+        return job
+
+    def recover(self, storage: SQLiteStorage) -> int:
+        """Fail jobs left queued or running by a process that has exited."""
+        failed = 0
+        for job in storage.active_import_jobs():
+            if _owner_alive(storage.db_path.parent, job["owner"]):
+                continue
+            storage.finish_import_job(job["id"], "interrupted: its process exited")
+            storage.db_path.with_name(job["file"]).unlink(missing_ok=True)
+            failed += 1
+        return failed
+
+    def _run(self, storage: SQLiteStorage, job_id: int, path: Path) -> None:
+        error: Optional[str] = None
+        try:
+            if storage.start_import_job(job_id):
+                self._import(storage, job_id, path)
+        except (ValueError, csv.Error, UnicodeDecodeError, DatabaseBusyError) as exc:
+            error = str(exc)
+        except Exception as exc:
+            logger.exception("import job %s failed", job_id)
+            error = f"internal error: {exc}"
+        finally:
+            try:
+                storage.finish_import_job(job_id, error)
+            finally:
+                path.unlink(missing_ok=True)
+                _release_lease(storage.db_path.parent)
+
+    def _import(self, storage: SQLiteStorage, job_id: int, path: Path) -> None:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            reader = csv.DictReader(f)
+            missing = [
+                c for c in REQUIRED_COLUMNS if c not in (reader.fieldnames or ())
+            ]
+            if missing:
+                raise ValueError(f"CSV is missing columns: {', '.join(missing)}")
+            chunk: list[tuple[int, dict]] = []
+            occurrences: Counter = Counter()
+            for row in reader:
+                chunk.append((reader.line_num, row))
+                if len(chunk) == self.chunk_rows:
+                    if not self._insert(storage, job_id, chunk, occurrences):
+                        return
+                    chunk = []
+            if chunk:
+                self._insert(storage, job_id, chunk, occurrences)
+
+    @staticmethod
+    def _insert(
+        storage: SQLiteStorage, job_id: int, chunk: list, occurrences: Counter
+    ) -> bool:
+        for attempt in range(CHUNK_BUSY_RETRIES + 1):
+            try:
+                # Busy is raised taking the lock, before any row is counted.
+                return storage.import_chunk(job_id, chunk, occurrences)
+            except DatabaseBusyError:
+                if attempt == CHUNK_BUSY_RETRIES:
+                    raise
+                time.sleep(1.0)
+        return False
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop taking jobs; with ``wait``, finish every job already queued."""
+        self._pool.shutdown(wait=wait)
+
+
+def _hold_lease(directory: Path) -> str:
+    """Count one more job of this process in ``directory``; return its token."""
+    with _leases_lock:
+        lease = _leases.get(directory)
+        if lease is None:
+            fd = os.open(directory / LEASE_NAME.format(_token), os.O_RDWR | os.O_CREAT)
+            _lock(fd, wait=True)  # a recover() may be looking at it
+            os.write(fd, _token.encode())
+            lease = _leases[directory] = [fd, 0]
+        lease[1] += 1
+        return _token
+
+
+def _release_lease(directory: Path) -> None:
+    """Count a job done; with none left, drop the lease and its file."""
+    with _leases_lock:
+        lease = _leases[directory]
+        lease[1] -= 1
+        if lease[1] == 0:
+            del _leases[directory]
+            _remove(directory / LEASE_NAME.format(_token), lease[0])
+
+
+def _owner_alive(directory: Path, owner: Optional[str]) -> bool:
+    if owner == _token:
+        return True
+    if owner is None:  # queued before jobs had owners
+        return False
+    path = directory / LEASE_NAME.format(owner)
+    try:
+        fd = os.open(path, os.O_RDWR)
+    except FileNotFoundError:
+        return False
+    if not _lock(fd, wait=False) or os.fstat(fd).st_size == 0:
+        os.close(fd)
+        return True
+    try:
+        current = os.path.samestat(os.fstat(fd), os.stat(path))
+    except FileNotFoundError:
+        current = False
+    if current:  # nobody holds it, and a token is never used again
+        _remove(path, fd)
+    else:
+        os.close(fd)
+    return False
+
+
+def _lock(fd: int, wait: bool) -> bool:
+    """Lock ``fd`` exclusively; without ``wait``, False if another holds it."""
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_LOCK if wait else msvcrt.LK_NBLCK, 1)
+    except OSError:
+        if wait:
+            raise
+        return False
+    return True
+
+
+def _remove(path: Path, fd: int) -> None:
+    """Delete a lease file whose lock ``fd`` holds, then let the lock go."""
+    if fcntl is not None:
+        path.unlink(missing_ok=True)
+        os.close(fd)
+    else:  # Windows can't delete a file that is open
+        os.close(fd)
+        try:
+            path.unlink(missing_ok=True)
+        except PermissionError:  # reopened meanwhile; its owner removes it
+            pass
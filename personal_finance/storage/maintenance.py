@@ -0,0 +1,128 @@
+import logging
+import random
+import threading
+import weakref
+from pathlib import Path
+from typing import Optional
+
+from personal_finance.storage.sqlite_storage import DatabaseBusyError, SQLiteStorage
+
+logger = logging.getLogger(__name__)
+
+# Tasks that are safe while the app is serving; ``vacuum`` rewrites the whole
+# file under the write lock and is only run from the command line.
+ONLINE_TASKS = ("analyze", "reclaim", "compact", "backup")
+TASKS = ONLINE_TASKS + ("vacuum",)
+
+
+def run_task(
+    storage: SQLiteStorage,
+    task: str,
+    backup_dir: Optional[Path | str] = None,
+    backup_keep: Optional[int] = None,
+    retention_days: Optional[int] = None,
+) -> dict:
+    """Run one maintenance task on ``storage`` and return its result.
+
+    ``compact`` drops superseded change-log entries, and with
+    ``retention_days`` delete entries older than that.
+    """
+    if task == "analyze":
+        return storage.analyze()
+    if task == "reclaim":
+        return storage.reclaim_pages()
+    if task == "compact":
+        removed = storage.compact_changes(max_tombstone_age_days=retention_days)
+        return {"task": task, "removed": removed}
+    if task == "backup":
+        return storage.backup(backup_dir, keep=backup_keep)
+    if task == "vacuum":
+        return storage.vacuum()
+    raise ValueError(f"task must be one of: {', '.join(TASKS)}")
+
+
+class MaintenanceScheduler:
+    """Keeps registered storages maintained from one background thread.
+
+    About every ``check_seconds`` the thread runs the tasks that are due on each
+    storage: ``analyze``, ``reclaim`` and ``compact`` (keeping delete
+    entries for ``retention_days``) once per ``interval`` seconds and, with
+    a ``backup_dir``, ``backup`` once per ``backup_interval`` seconds.
+    When a task last ran is read from the database's ``maintenance_runs``,
+    so worker processes sharing a file don't each repeat it and restarts
+    don't reset the clock. Storages are held weakly: a tenant dropped from
+    the LRU is no longer maintained.
+    """
+
+    def __init__(
+        self,
+        interval: float = 6 * 3600,
+        backup_dir: Optional[Path | str] = None,
+        backup_interval: float = 24 * 3600,
+        backup_keep: Optional[int] = 7,
+        retention_days: Optional[int] = 30,
+        check_seconds: float = 60.0,
+    ):
+        self.intervals = {"analyze": interval, "reclaim": interval, "compact": interval}
+        if backup_dir:
+            self.intervals["backup"] = backup_interval
+        self.backup_dir = backup_dir
+        self.backup_keep = backup_keep
+        self.retention_days = retention_days
+        self.check_seconds = check_seconds
+        self._storages: weakref.WeakSet[SQLiteStorage] = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, storage: SQLiteStorage) -> None:
+        with self._lock:
+            self._storages.add(storage)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._loop, name="maintenance", daemon=True
+                )
+                self._thread.start()
+
+    def due(self, storage: SQLiteStorage) -> list[str]:
+        runs = storage.maintenance_status()["last_runs"]
+        return [
+            task
+            for task, interval in self.intervals.items()
+            if task not in runs or runs[task]["age_seconds"] >= interval
+        ]
+
+    def run_due(self, storage: SQLiteStorage) -> list[dict]:
+        """Run the due tasks; one that fails is logged and retried next check."""
+        results = []
+        for task in self.due(storage):
+            try:
+                results.append(
+                    run_task(
+                        storage,
+                        task,
+                        self.backup_dir,
+                        self.backup_keep,
+                        self.retention_days,
+                    )
+                )
+            except DatabaseBusyError:
+                logger.info("%s of %s put off: database busy", task, storage.db_path)
+            except Exception:
+                logger.exception("%s of %s failed", task, storage.db_path)
+        return results
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def _loop(self) -> None:
+        # Workers forked together would check in step and all find a task due;
+        # jitter lets the first record its run before the others look.
+        while not self._stopped.wait(self.check_seconds * random.uniform(0.5, 1.5)):
+            with self._lock:
+                storages = list(self._storages)
+            for storage in storages:
+                try:
+                    self.run_due(storage)
+                except Exception:
+                    logger.exception("maintenance check of %s failed", storage.db_path)
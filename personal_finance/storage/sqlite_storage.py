@@ -1,9 +1,99 @@
+import base64
+import calendar
+import csv
+import hashlib
+import json
+import random
+import re
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from collections import Counter
+from datetime import date as date_cls
 from pathlib import Path
-from typing import Iterable, List, Optional
+from typing import Iterable, Iterator, List, Optional
+
+from personal_finance.categorize import RuleMatcher, check_rule
+from personal_finance.metrics import Metrics, SlowQueryLog, timed_connection_class
 
 DEFAULT_DB_PATH = Path(__file__).resolve().parents[2] / "finance.db"
 
+# Lock contention: SQLite's own busy handler waits up to BUSY_TIMEOUT seconds;
+# a write that still can't take the lock is retried after a full-jitter
+# backoff (random sleep up to BUSY_BACKOFF * 2**attempt, capped at
+# BUSY_BACKOFF_MAX) BUSY_RETRIES times before DatabaseBusyError is raised.
+BUSY_TIMEOUT = 1.0
+BUSY_RETRIES = 4
+BUSY_BACKOFF = 0.05
+BUSY_BACKOFF_MAX = 1.0
+
+# Read-only connections (snapshots and aggregate queries) map up to
+# READ_MMAP_SIZE bytes of the database file instead of read()ing pages, and
+# may cache READ_CACHE_KIB of pages while scanning.
+READ_MMAP_SIZE = 256 * 1024 * 1024
+READ_CACHE_KIB = 64 * 1024
+
+# Maintenance. ANALYZE samples this many rows per index, so it takes
+# milliseconds on any size of table. reclaim_pages frees RECLAIM_STEP_PAGES
+# pages per write transaction, and backup copies BACKUP_STEP_PAGES per step.
+ANALYSIS_LIMIT = 1000
+RECLAIM_STEP_PAGES = 1024
+BACKUP_STEP_PAGES = 1024
+AUTO_VACUUM_MODES = ("none", "full", "incremental")
+
+# Seconds a cached id -> name map of categories is trusted before a reload, so
+# renames made through another process show up without a restart.
+CATEGORY_CACHE_TTL = 30.0
+
+# Period bucketing for cash-flow: expression giving a period's first day, the
+# step to the next period, how the period is labelled, the key a ledger row is
+# grouped on (from its generated month/day columns) and the key's first day.
+CASHFLOW_PERIODS = {
+    "month": (
+        "date({col}, 'start of month')",
+        "+1 month",
+        "substr(start, 1, 7)",
+        "month",
+        "key || '-01'",
+    ),
+    "week": (
+        "date({col}, '-6 days', 'weekday 1')",
+        "+7 days",
+        "start",
+        # Day 0 (1970-01-01) was a Thursday; this steps back to the Monday.
+        "day - ((day + 3) % 7 + 7) % 7",
+        "date(key * 86400, 'unixepoch')",
+    ),
+}
+
+# Column used as the series key for each (kind, group_by) pair. Income has no
+# category, so its source doubles as one (same convention as summarize_amounts).
+SERIES_COLUMNS = {
+    "income": {
+        "account": "account_id",
+        "source": "source_id",
+        "category": "source_id",
+    },
+    "expenses": {"account": "account_id", "category": "category_id"},
+}
+
+# Factor converting a ledger row's amount into the base currency (bound twice).
+# Rates are units of a common reference currency per unit of ``currency``; the
+# rate in effect on the row's date is an index probe on fx_rates' primary key.
+FX_FACTOR = """(
+    SELECT CASE WHEN UPPER(a.currency) = ? THEN 1.0 ELSE (
+        SELECT f.rate FROM fx_rates f
+        WHERE f.currency = UPPER(a.currency) AND f.date <= {table}.date
+        ORDER BY f.date DESC LIMIT 1
+    ) / (
+        SELECT f.rate FROM fx_rates f
+        WHERE f.currency = ? AND f.date <= {table}.date
+        ORDER BY f.date DESC LIMIT 1
+    ) END
+    FROM accounts a WHERE a.id = {table}.account_id
+)"""
+
 SCHEMA = """
 PRAGMA foreign_keys = ON;
 
@@ -13,14 +103,20 @@ CREATE TABLE IF NOT EXISTS accounts (
     currency TEXT NOT NULL
 );
 
+-- Shared dictionary for transaction categories and income sources.
+CREATE TABLE IF NOT EXISTS categories (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
 CREATE TABLE IF NOT EXISTS transactions (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     account_id INTEGER NOT NULL,
     date TEXT NOT NULL,
     amount REAL NOT NULL,
     type TEXT NOT NULL CHECK (type IN ('income','expense')),
-    category TEXT,
     note TEXT,
+    category_id INTEGER REFERENCES categories(id),
     FOREIGN KEY (account_id) REFERENCES accounts(id) ON DELETE CASCADE
 );
 
@@ -29,29 +125,756 @@ CREATE TABLE IF NOT EXISTS income (
     account_id INTEGER NOT NULL,
     date TEXT NOT NULL,
     amount REAL NOT NULL,
-    source TEXT,
+    source_id INTEGER REFERENCES categories(id),
+    FOREIGN KEY (account_id) REFERENCES accounts(id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_transactions_account_date
+    ON transactions(account_id, date, amount);
+CREATE INDEX IF NOT EXISTS idx_income_account_date
+    ON income(account_id, date, amount);
+CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions(date, amount);
+CREATE INDEX IF NOT EXISTS idx_income_date ON income(date, amount);
+CREATE INDEX IF NOT EXISTS idx_transactions_category ON transactions(category_id);
+CREATE INDEX IF NOT EXISTS idx_income_source ON income(source_id);
+
+-- Closing balance of every account at the end of each month with activity.
+CREATE TABLE IF NOT EXISTS balance_checkpoints (
+    account_id INTEGER NOT NULL,
+    month TEXT NOT NULL,
+    closing_balance REAL NOT NULL,
+    PRIMARY KEY (account_id, month),
     FOREIGN KEY (account_id) REFERENCES accounts(id) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS fx_rates (
+    currency TEXT NOT NULL,
+    date TEXT NOT NULL,
+    rate REAL NOT NULL CHECK (rate > 0),
+    PRIMARY KEY (currency, date)
+) WITHOUT ROWID;
+
+-- Categorization rules for transactions stored without a category, tried in
+-- (priority, id) order; see personal_finance.categorize.
+CREATE TABLE IF NOT EXISTS category_rules (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL CHECK (kind IN ('keyword', 'regex')),
+    pattern TEXT NOT NULL,
+    category_id INTEGER NOT NULL REFERENCES categories(id),
+    priority INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS budgets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    month TEXT NOT NULL,
+    category_id INTEGER NOT NULL REFERENCES categories(id),
+    limit_amount REAL NOT NULL CHECK (limit_amount >= 0),
+    UNIQUE (month, category_id)
+);
+
+-- Closed years whose ledger rows were moved to their own file by archive_year.
+CREATE TABLE IF NOT EXISTS archives (
+    year INTEGER PRIMARY KEY,
+    file TEXT NOT NULL,
+    transactions INTEGER NOT NULL,
+    income INTEGER NOT NULL,
+    archived_at TEXT NOT NULL DEFAULT (datetime('now'))
+);
+
+-- Background CSV imports (see storage.imports). Counters are updated in the
+-- same transaction as each chunk of rows, so progress matches the ledger.
+CREATE TABLE IF NOT EXISTS import_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    status TEXT NOT NULL DEFAULT 'queued'
+        CHECK (status IN ('queued', 'running', 'done', 'failed', 'cancelled')),
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    file TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    total_rows INTEGER NOT NULL,
+    rows_read INTEGER NOT NULL DEFAULT 0,
+    rows_imported INTEGER NOT NULL DEFAULT 0,
+    rows_failed INTEGER NOT NULL DEFAULT 0,
+    errors TEXT NOT NULL DEFAULT '[]',
+    error TEXT,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+    started_at TEXT,
+    finished_at TEXT
+);
+
+-- Last run of each maintenance task (see storage.maintenance); result is JSON.
+CREATE TABLE IF NOT EXISTS maintenance_runs (
+    task TEXT PRIMARY KEY,
+    result TEXT NOT NULL,
+    finished_at TEXT NOT NULL DEFAULT (datetime('now'))
+);
+"""
+
+# Generated bucket columns of both ledger tables: the month key and the day
+# number (days since 1970-01-01). ALTER TABLE can only add VIRTUAL generated
+# columns; an index on one stores the computed value.
+BUCKET_COLUMNS = {
+    "month": "TEXT GENERATED ALWAYS AS (substr(date, 1, 7)) VIRTUAL",
+    "day": "INTEGER GENERATED ALWAYS AS "
+    "(CAST(julianday(date) - 2440587.5 AS INTEGER)) VIRTUAL",
+}
+# Month-bucketed aggregates read these in (month, key) order without sorting.
+BUCKET_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_transactions_month_category "
+    "ON transactions(month, category_id, amount) WHERE type = 'expense'",
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_income_month_source "
+    "ON income(month, source_id, amount)",
+)
+
+# Columns added to tables after they first shipped; missing ones are added on
+# startup (before the indexes that use them).
+ADDED_COLUMNS = {
+    "transactions": {"dedup_key": "BLOB"},
+    "import_jobs": {
+        "on_duplicate": "TEXT",
+        "rows_skipped": "INTEGER NOT NULL DEFAULT 0",
+        "owner": "TEXT",
+    },
+}
+# Transactions inserted with an on_duplicate policy carry a content hash (see
+# dedup_key); a duplicate is found by probing this index.
+DEDUP_INDEX = """
+CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_dedup
+    ON transactions(dedup_key) WHERE dedup_key IS NOT NULL
+"""
+ON_DUPLICATE = ("skip", "error")
+INSERT_TRANSACTION = """
+INSERT INTO transactions(account_id, date, amount, type, category_id, note, dedup_key)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (dedup_key) WHERE dedup_key IS NOT NULL DO NOTHING
+"""
+
+# Columns selected by list_transactions / list_income, in order; named for
+# their columnar output.
+TRANSACTION_COLUMNS = (
+    "id",
+    "account_id",
+    "date",
+    "amount",
+    "type",
+    "category_id",
+    "note",
+)
+INCOME_COLUMNS = ("id", "account_id", "date", "amount", "source_id")
+
+# Ledger columns copied into archive files, and the tables that hold them there.
+LEDGER_COLUMNS = {
+    "transactions": "id, account_id, date, amount, type, note, category_id",
+    "income": "id, account_id, date, amount, source_id",
+}
+ARCHIVE_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS {schema}.transactions (
+        id INTEGER PRIMARY KEY,
+        account_id INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        amount REAL NOT NULL,
+        type TEXT NOT NULL,
+        note TEXT,
+        category_id INTEGER
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS {schema}.income (
+        id INTEGER PRIMARY KEY,
+        account_id INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        amount REAL NOT NULL,
+        source_id INTEGER
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_transactions_account_date "
+    "ON transactions(account_id, date, amount)",
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_income_account_date "
+    "ON income(account_id, date, amount)",
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_transactions_date "
+    "ON transactions(date, amount)",
+    "CREATE INDEX IF NOT EXISTS {schema}.idx_income_date ON income(date, amount)",
+)
+# Triggers that must not see rows leaving for an archive: the rows still exist,
+# so balances and the change feed stay as they are. Search drops them.
+ARCHIVE_SUSPENDED_TRIGGERS = ("{table}_checkpoint_delete", "{table}_change_delete")
+
+# Keeps balance_checkpoints current for writes to a ledger table. A new month
+# starts from the previous checkpoint; every later checkpoint shifts by the
+# amount, so back-dated inserts and deletes stay correct.
+CHECKPOINT_TRIGGERS = """
+CREATE TRIGGER IF NOT EXISTS {table}_checkpoint_insert AFTER INSERT ON {table}
+BEGIN
+    INSERT OR IGNORE INTO balance_checkpoints(account_id, month, closing_balance)
+    VALUES (
+        new.account_id,
+        substr(new.date, 1, 7),
+        COALESCE((
+            SELECT closing_balance FROM balance_checkpoints
+            WHERE account_id = new.account_id AND month < substr(new.date, 1, 7)
+            ORDER BY month DESC LIMIT 1
+        ), 0)
+    );
+    UPDATE balance_checkpoints SET closing_balance = closing_balance + new.amount
+    WHERE account_id = new.account_id AND month >= substr(new.date, 1, 7);
+END;
+
+CREATE TRIGGER IF NOT EXISTS {table}_checkpoint_delete AFTER DELETE ON {table}
+BEGIN
+    UPDATE balance_checkpoints SET closing_balance = closing_balance - old.amount
+    WHERE account_id = old.account_id AND month >= substr(old.date, 1, 7);
+END;
+
+CREATE TRIGGER IF NOT EXISTS {table}_checkpoint_update
+AFTER UPDATE OF account_id, date, amount ON {table}
+BEGIN
+    UPDATE balance_checkpoints SET closing_balance = closing_balance - old.amount
+    WHERE account_id = old.account_id AND month >= substr(old.date, 1, 7);
+    INSERT OR IGNORE INTO balance_checkpoints(account_id, month, closing_balance)
+    VALUES (
+        new.account_id,
+        substr(new.date, 1, 7),
+        COALESCE((
+            SELECT closing_balance FROM balance_checkpoints
+            WHERE account_id = new.account_id AND month < substr(new.date, 1, 7)
+            ORDER BY month DESC LIMIT 1
+        ), 0)
+    );
+    UPDATE balance_checkpoints SET closing_balance = closing_balance + new.amount
+    WHERE account_id = new.account_id AND month >= substr(new.date, 1, 7);
+END;
+"""
+
+# Full-text indexes; rowid is the ledger row (or category) id. A ledger row's
+# document holds the token c<id> of its category rather than the name, which
+# is indexed once in categories_fts: search() turns the words that match a
+# name into those tokens, so renaming a category rewrites one index row.
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts
+    USING fts5(note, category, prefix='2 3');
+CREATE VIRTUAL TABLE IF NOT EXISTS income_fts USING fts5(source, prefix='2 3');
+CREATE VIRTUAL TABLE IF NOT EXISTS categories_fts USING fts5(name, prefix='2 3');
+
+CREATE TRIGGER IF NOT EXISTS transactions_fts_insert AFTER INSERT ON transactions
+BEGIN
+    INSERT INTO transactions_fts(rowid, note, category)
+    VALUES (new.id, new.note, 'c' || new.category_id);
+END;
+CREATE TRIGGER IF NOT EXISTS transactions_fts_delete AFTER DELETE ON transactions
+BEGIN
+    DELETE FROM transactions_fts WHERE rowid = old.id;
+END;
+CREATE TRIGGER IF NOT EXISTS transactions_fts_update
+AFTER UPDATE OF note, category_id ON transactions
+BEGIN
+    UPDATE transactions_fts
+    SET note = new.note, category = 'c' || new.category_id
+    WHERE rowid = new.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS income_fts_insert AFTER INSERT ON income
+BEGIN
+    INSERT INTO income_fts(rowid, source) VALUES (new.id, 'c' || new.source_id);
+END;
+CREATE TRIGGER IF NOT EXISTS income_fts_delete AFTER DELETE ON income
+BEGIN
+    DELETE FROM income_fts WHERE rowid = old.id;
+END;
+CREATE TRIGGER IF NOT EXISTS income_fts_update AFTER UPDATE OF source_id ON income
+BEGIN
+    UPDATE income_fts SET source = 'c' || new.source_id WHERE rowid = new.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS categories_fts_insert AFTER INSERT ON categories
+BEGIN
+    INSERT INTO categories_fts(rowid, name) VALUES (new.id, new.name);
+END;
+CREATE TRIGGER IF NOT EXISTS categories_fts_delete AFTER DELETE ON categories
+BEGIN
+    DELETE FROM categories_fts WHERE rowid = old.id;
+END;
+CREATE TRIGGER IF NOT EXISTS categories_fts_rename AFTER UPDATE OF name ON categories
+BEGIN
+    UPDATE categories_fts SET name = new.name WHERE rowid = new.id;
+END;
+"""
+
+# Indexes from before categories_fts hold category names in ledger documents;
+# their triggers are replaced and the documents rebuilt.
+DROP_SEARCH_TRIGGERS = """
+DROP TRIGGER IF EXISTS transactions_fts_insert;
+DROP TRIGGER IF EXISTS transactions_fts_update;
+DROP TRIGGER IF EXISTS income_fts_insert;
+DROP TRIGGER IF EXISTS income_fts_update;
+DROP TRIGGER IF EXISTS categories_fts_rename;
+"""
+
+REBUILD_SEARCH = """
+DELETE FROM transactions_fts;
+INSERT INTO transactions_fts(rowid, note, category)
+SELECT id, note, 'c' || category_id FROM transactions;
+DELETE FROM income_fts;
+INSERT INTO income_fts(rowid, source) SELECT id, 'c' || source_id FROM income;
+DELETE FROM categories_fts;
+INSERT INTO categories_fts(rowid, name) SELECT id, name FROM categories;
+"""
+
+# Moves free-text transactions.category / income.source into categories.
+# The search triggers reference the old columns and are recreated afterwards.
+MIGRATE_CATEGORIES = """
+BEGIN;
+CREATE TABLE IF NOT EXISTS categories (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
 );
+DROP TRIGGER IF EXISTS transactions_fts_insert;
+DROP TRIGGER IF EXISTS transactions_fts_update;
+DROP TRIGGER IF EXISTS income_fts_insert;
+DROP TRIGGER IF EXISTS income_fts_update;
+INSERT OR IGNORE INTO categories(name)
+    SELECT TRIM(category) FROM transactions WHERE TRIM(category) <> ''
+    UNION
+    SELECT TRIM(source) FROM income WHERE TRIM(source) <> '';
+ALTER TABLE transactions ADD COLUMN category_id INTEGER REFERENCES categories(id);
+UPDATE transactions SET category_id = (
+    SELECT id FROM categories WHERE name = TRIM(transactions.category)
+);
+ALTER TABLE transactions DROP COLUMN category;
+ALTER TABLE income ADD COLUMN source_id INTEGER REFERENCES categories(id);
+UPDATE income SET source_id = (
+    SELECT id FROM categories WHERE name = TRIM(income.source)
+);
+ALTER TABLE income DROP COLUMN source;
+COMMIT;
+"""
+
+# Months up to :after belong to archived years; their checkpoints are final and
+# each account's last one is carried into the live months.
+REBUILD_CHECKPOINTS = (
+    "DELETE FROM balance_checkpoints WHERE month > :after",
+    """
+    INSERT INTO balance_checkpoints(account_id, month, closing_balance)
+    SELECT account_id, month,
+           COALESCE((
+               SELECT closing_balance FROM balance_checkpoints b
+               WHERE b.account_id = m.account_id AND b.month <= :after
+               ORDER BY b.month DESC LIMIT 1
+           ), 0) + SUM(total) OVER (PARTITION BY account_id ORDER BY month)
+    FROM (
+        SELECT account_id, month, SUM(amount) AS total
+        FROM (
+            SELECT account_id, month, amount FROM transactions
+            UNION ALL
+            SELECT account_id, month, amount FROM income
+        )
+        GROUP BY account_id, month
+    ) AS m
+    """,
+)
+
+# Row images written to change_log; ``{row}`` is new/old in triggers or a table
+# alias in backfills. Category names are resolved when the row is written; a
+# later rename is its own ``categories`` entry, matched on category_id/source_id.
+CHANGE_PAYLOADS = {
+    "accounts": "json_object('id', {row}.id, 'name', {row}.name, "
+    "'currency', {row}.currency)",
+    "categories": "json_object('id', {row}.id, 'name', {row}.name)",
+    "transactions": "json_object('id', {row}.id, 'account_id', {row}.account_id, "
+    "'date', {row}.date, 'amount', {row}.amount, 'type', {row}.type, "
+    "'note', {row}.note, 'category_id', {row}.category_id, 'category', "
+    "ifnull((SELECT name FROM categories WHERE id = {row}.category_id), ''))",
+    "income": "json_object('id', {row}.id, 'account_id', {row}.account_id, "
+    "'date', {row}.date, 'amount', {row}.amount, 'source_id', {row}.source_id, "
+    "'source', "
+    "ifnull((SELECT name FROM categories WHERE id = {row}.source_id), ''))",
+}
+
+# Append-only feed behind GET /changes. AUTOINCREMENT keeps seq monotonic after
+# compaction deletes the newest rows; change_log_horizon records the highest
+# seq ever dropped by retention so stale consumers can be told to resync.
+CHANGE_LOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS change_log (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    table_name TEXT NOT NULL,
+    op TEXT NOT NULL CHECK (op IN ('insert', 'update', 'delete')),
+    row_id INTEGER NOT NULL,
+    payload TEXT,
+    changed_at TEXT NOT NULL DEFAULT (datetime('now'))
+);
+CREATE INDEX IF NOT EXISTS idx_change_log_row
+    ON change_log (table_name, row_id, seq);
+
+CREATE TABLE IF NOT EXISTS change_log_horizon (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    seq INTEGER NOT NULL
+);
+
+-- Older logs rewrote every ledger row of a renamed category.
+DROP TRIGGER IF EXISTS categories_change_rename;
+"""
+
+CHANGE_TRIGGERS = """
+CREATE TRIGGER IF NOT EXISTS {table}_change_insert AFTER INSERT ON {table}
+BEGIN
+    INSERT INTO change_log (table_name, op, row_id, payload)
+    VALUES ('{table}', 'insert', new.id, {new});
+END;
+
+CREATE TRIGGER IF NOT EXISTS {table}_change_update AFTER UPDATE ON {table}
+BEGIN
+    INSERT INTO change_log (table_name, op, row_id, payload)
+    VALUES ('{table}', 'update', new.id, {new});
+END;
+
+CREATE TRIGGER IF NOT EXISTS {table}_change_delete AFTER DELETE ON {table}
+BEGIN
+    INSERT INTO change_log (table_name, op, row_id, payload)
+    VALUES ('{table}', 'delete', old.id, NULL);
+END;
+"""
+
+# Seeds the log with a table's current rows when it starts being logged, so
+# since=0 is a full snapshot.
+BACKFILL_CHANGES = """
+INSERT INTO change_log (table_name, op, row_id, payload)
+SELECT '{table}', 'insert', r.id, {payload} FROM {table} r ORDER BY r.id;
+"""
+
+# Keeps only the newest entry per row; a consumer at any seq still receives
+# the latest image of every row that changed after it.
+COMPACT_CHANGES = """
+DELETE FROM change_log
+WHERE seq < (
+    SELECT MAX(c.seq) FROM change_log c
+    WHERE c.table_name = change_log.table_name AND c.row_id = change_log.row_id
+);
+"""
+
+CHANGE_TABLES = ("accounts", "categories", "transactions", "income")
+
+# Spent and remaining for every budget of a month in one statement: expenses
+# are grouped per category off idx_transactions_month_category and joined to
+# the month's budgets. ``{schema}`` is the ledger part holding that month.
+BUDGET_STATUS = """
+SELECT b.id, b.category_id, b.limit_amount,
+       ROUND(COALESCE(s.spent, 0), 2) AS spent,
+       ROUND(b.limit_amount - COALESCE(s.spent, 0), 2) AS remaining
+FROM budgets b
+LEFT JOIN (
+    SELECT category_id, -SUM(amount) AS spent
+    FROM {schema}.transactions
+    WHERE type = 'expense' AND month = :month
+    GROUP BY category_id
+) s ON s.category_id = b.category_id
+WHERE b.month = :month
+ORDER BY b.id
+"""
+
+MONTH_FORMAT = re.compile(r"\d{4}-(0[1-9]|1[0-2])")
+
+# Per-row errors kept on an import job; later ones are only counted.
+IMPORT_ERRORS_KEPT = 100
+
+IMPORT_JOB = """
+SELECT id, status, on_duplicate, total_rows, rows_read, rows_imported,
+       rows_skipped, rows_failed, errors, error, created_at, started_at,
+       finished_at,
+       (julianday(COALESCE(finished_at, strftime('%Y-%m-%d %H:%M:%f', 'now')))
+        - julianday(started_at)) * 86400 AS seconds
+FROM import_jobs
+WHERE id = ?
 """
 
 
+# The two halves of a search; ``{dates}`` is the date filter on t or i.
+SEARCH_CATEGORIES = "SELECT rowid FROM categories_fts WHERE categories_fts MATCH ?"
+SEARCH_TRANSACTIONS = """
+SELECT bm25(transactions_fts) AS rank, 'transaction' AS kind, t.id, t.account_id,
+       t.date, t.amount, t.type, c.name AS category, t.note, NULL AS source
+FROM transactions_fts
+JOIN transactions t ON t.id = transactions_fts.rowid
+LEFT JOIN categories c ON c.id = t.category_id
+WHERE transactions_fts MATCH ?{dates}
+"""
+SEARCH_INCOME = """
+SELECT bm25(income_fts), 'income', i.id, i.account_id, i.date, i.amount,
+       NULL, NULL, NULL, c.name
+FROM income_fts
+JOIN income i ON i.id = income_fts.rowid
+LEFT JOIN categories c ON c.id = i.source_id
+WHERE income_fts MATCH ?{dates}
+"""
+
+
+class ChangeLogExpiredError(ValueError):
+    """Raised when a consumer's ``since`` predates pruned change-log entries."""
+
+
+class DatabaseBusyError(sqlite3.OperationalError):
+    """The database stayed locked through every retry; try again later."""
+
+
+class DuplicateTransactionError(ValueError):
+    """A transaction inserted with ``on_duplicate='error'`` already exists."""
+
+
+def dedup_key(
+    account_id: int,
+    date: str,
+    amount: float,
+    t_type: str,
+    note: str,
+    occurrence: int = 0,
+) -> bytes:
+    """Content hash identifying a transaction across statement re-imports.
+
+    The note is compared case- and whitespace-insensitively and the category
+    is left out, so recategorised rows still match. ``occurrence`` numbers
+    identical rows within one import, so genuine repeats are all kept.
+    """
+    normalized = " ".join((note or "").split()).casefold()
+    content = f"{account_id}|{date}|{amount:.2f}|{t_type}|{normalized}|{occurrence}"
+    return hashlib.blake2b(content.encode(), digest_size=16).digest()
+
+
+def check_on_duplicate(on_duplicate: Optional[str]) -> Optional[str]:
+    if on_duplicate not in (None, *ON_DUPLICATE):
+        raise ValueError("on_duplicate must be 'skip' or 'error'")
+    return on_duplicate
+
+
+def _is_busy(exc: sqlite3.OperationalError) -> bool:
+    # SQLITE_BUSY (5) / SQLITE_LOCKED (6), including their extended codes.
+    code = getattr(exc, "sqlite_errorcode", None)
+    if code is not None:
+        return (code & 0xFF) in (5, 6)
+    return "database is locked" in str(exc)
+
+
+class _PinnedConnection:
+    """Connection shared by every call inside ``SQLiteStorage.snapshot``.
+
+    Entering/leaving it as a context manager neither commits nor closes, so the
+    enclosing read transaction stays open across storage calls.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def __getattr__(self, name: str):
+        return getattr(self._conn, name)
+
+    def __enter__(self) -> "_PinnedConnection":
+        return self
+
+    def __exit__(self, *exc_info) -> bool:
+        return False
+
+    def commit(self) -> None:
+        pass
+
+
 class SQLiteStorage:
     """Lightweight SQLite helper around finance entities."""
 
-    def __init__(self, db_path: Path | str = DEFAULT_DB_PATH):
+    def __init__(
+        self,
+        db_path: Path | str = DEFAULT_DB_PATH,
+        metrics: Optional[Metrics] = None,
+        slow_query_ms: Optional[float] = None,
+    ):
         self.db_path = Path(db_path)
+        self.slow_queries = (
+            SlowQueryLog(slow_query_ms) if slow_query_ms is not None else None
+        )
+        # Plain connections unless something is watching, so it costs nothing.
+        self._connection_factory = sqlite3.Connection
+        if metrics is not None or self.slow_queries is not None:
+            self._connection_factory = timed_connection_class(
+                metrics, self.slow_queries
+            )
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._category_names: dict[int, str] = {}
+        self._categories_loaded_at = float("-inf")
+        self._matcher = RuleMatcher(())
+        self._rules_loaded_at = float("-inf")
+        # Per-archive results of aggregate queries; archived years never change.
+        self._archive_rows: dict[tuple, List[sqlite3.Row]] = {}
+        self._local = threading.local()
         self._ensure_schema()
 
-    def _connect(self) -> sqlite3.Connection:
-        conn = sqlite3.connect(self.db_path)
+    def _connect(self, readonly: bool = False) -> sqlite3.Connection:
+        """The snapshot's connection if one is open, else a new one.
+
+        ``readonly`` is for queries that only read, aggregates in particular.
+        """
+        pinned = getattr(self._local, "conn", None)
+        if pinned is not None:
+            return pinned
+        return self._open(readonly)
+
+    def _open(self, readonly: bool = False) -> sqlite3.Connection:
+        if readonly:
+            # mode=ro: the connection can never write or take the write lock.
+            conn = sqlite3.connect(
+                f"{self.db_path.resolve().as_uri()}?mode=ro",
+                uri=True,
+                timeout=BUSY_TIMEOUT,
+                factory=self._connection_factory,
+            )
+            conn.execute(f"PRAGMA mmap_size = {READ_MMAP_SIZE}")
+            conn.execute(f"PRAGMA cache_size = -{READ_CACHE_KIB}")
+            conn.execute("PRAGMA query_only = ON")
+        else:
+            conn = sqlite3.connect(
+                self.db_path, timeout=BUSY_TIMEOUT, factory=self._connection_factory
+            )
+            conn.execute("PRAGMA foreign_keys = ON;")
         conn.row_factory = sqlite3.Row
-        conn.execute("PRAGMA foreign_keys = ON;")
         return conn
 
+    @contextmanager
+    def _write(
+        self, attach: Optional[dict[str, Path]] = None
+    ) -> Iterator[sqlite3.Connection]:
+        """Connection in a ``BEGIN IMMEDIATE`` transaction, committed on exit.
+
+        Taking the write lock up front means contention shows up here, before
+        any work is done, where it is safe to back off and retry. ``attach``
+        maps schema names to database files attached beforehand.
+        """
+        conn = self._connect()
+        for schema, path in (attach or {}).items():
+            conn.execute(f"ATTACH DATABASE ? AS {schema}", (str(path),))
+        for attempt in range(BUSY_RETRIES + 1):
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                break
+            except sqlite3.OperationalError as exc:
+                if not _is_busy(exc):
+                    raise
+                if attempt == BUSY_RETRIES:
+                    raise DatabaseBusyError(str(exc)) from exc
+                backoff = min(BUSY_BACKOFF_MAX, BUSY_BACKOFF * 2**attempt)
+                time.sleep(random.uniform(0, backoff))
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
+        finally:
+            conn.close()
+
+    @contextmanager
+    def snapshot(self) -> Iterator["SQLiteStorage"]:
+        """Serve every storage call in the block from one connection and one
+        read transaction, so they all see the same database state.
+
+        The snapshot is read-only; nested snapshots reuse the outer one.
+        """
+        if getattr(self._local, "conn", None) is not None:
+            yield self
+            return
+        conn = self._open(readonly=True)
+        conn.execute("BEGIN")
+        self._local.conn = _PinnedConnection(conn)
+        try:
+            yield self
+        finally:
+            self._local.conn = None
+            conn.rollback()
+            conn.close()
+
     def _ensure_schema(self) -> None:
         with self._connect() as conn:
+            if conn.execute("PRAGMA page_count").fetchone()[0] == 0:
+                # Only settable before the first write; see reclaim_pages.
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            # WAL lets readers (and reader processes) run alongside a writer.
+            conn.execute("PRAGMA journal_mode = WAL")
+            had_checkpoints = self._table_exists(conn, "balance_checkpoints")
+            had_search = self._table_exists(conn, "categories_fts")
+            if "category" in self._columns(conn, "transactions"):
+                conn.executescript(MIGRATE_CATEGORIES)
             conn.executescript(SCHEMA)
+            for table, columns in ADDED_COLUMNS.items():
+                existing = self._columns(conn, table)
+                for name, definition in columns.items():
+                    if name not in existing:
+                        conn.execute(
+                            f"ALTER TABLE {table} ADD COLUMN {name} {definition}"
+                        )
+            conn.execute(DEDUP_INDEX)
+            self._ensure_buckets(conn)
+            conn.commit()  # archives are attached outside a transaction
+            for schema, path in self._ledger_parts(conn)[:-1]:
+                if path.exists():
+                    with self._attached(conn, schema, path) as target:
+                        self._ensure_buckets(target, schema)
+            for table in ("transactions", "income"):
+                conn.executescript(CHECKPOINT_TRIGGERS.format(table=table))
+            if not had_search:
+                conn.executescript(DROP_SEARCH_TRIGGERS)
+            conn.executescript(SEARCH_SCHEMA)
+            conn.executescript(CHANGE_LOG_SCHEMA)
+            backfill = {
+                table
+                for table in CHANGE_TABLES
+                if not self._trigger_exists(conn, f"{table}_change_insert")
+            }
+            if "categories" in backfill:  # ledger images gained category ids
+                backfill.update(LEDGER_COLUMNS)
+            for table in CHANGE_TABLES:
+                if table in backfill:
+                    payload = CHANGE_PAYLOADS[table].format(row="r")
+                    conn.execute(BACKFILL_CHANGES.format(table=table, payload=payload))
+                new = CHANGE_PAYLOADS[table].format(row="new")
+                conn.executescript(CHANGE_TRIGGERS.format(table=table, new=new))
+            if not had_checkpoints:
+                self._rebuild_checkpoints(conn)
+            if not had_search:
+                conn.executescript(REBUILD_SEARCH)
+
+    @staticmethod
+    def _table_exists(conn: sqlite3.Connection, name: str) -> bool:
+        row = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+        ).fetchone()
+        return row is not None
+
+    @staticmethod
+    def _trigger_exists(conn: sqlite3.Connection, name: str) -> bool:
+        row = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?", (name,)
+        ).fetchone()
+        return row is not None
+
+    @staticmethod
+    def _columns(
+        conn: sqlite3.Connection, table: str, schema: str = "main"
+    ) -> set[str]:
+        # table_xinfo, unlike table_info, lists generated columns too.
+        return {row[1] for row in conn.execute(f"PRAGMA {schema}.table_xinfo({table})")}
+
+    def _ensure_buckets(self, conn: sqlite3.Connection, schema: str = "main") -> None:
+        """Add the generated bucket columns and their indexes where missing."""
+        for table in LEDGER_COLUMNS:
+            existing = self._columns(conn, table, schema)
+            for name, definition in BUCKET_COLUMNS.items():
+                if name in existing:
+                    continue
+                if (table, name) == ("transactions", "month"):
+                    # Older databases have this index on substr(date, 1, 7).
+                    conn.execute(
+                        f"DROP INDEX IF EXISTS {schema}.idx_transactions_month_category"
+                    )
+                conn.execute(
+                    f"ALTER TABLE {schema}.{table} ADD COLUMN {name} {definition}"
+                )
+        for statement in BUCKET_INDEXES:
+            conn.execute(statement.format(schema=schema))
 
     # Accounts --------------------------------------------------------------
     def list_accounts(self) -> List[dict]:
@@ -68,7 +891,7 @@ class SQLiteStorage:
             raise ValueError("Account name is required")
         if not currency:
             raise ValueError("Currency is required")
-        with self._connect() as conn:
+        with self._write() as conn:
             if account_id is None:
                 cur = conn.execute(
                     "INSERT INTO accounts(name, currency) VALUES (?, ?)",
@@ -79,7 +902,6 @@ class SQLiteStorage:
                     "INSERT INTO accounts(id, name, currency) VALUES (?, ?, ?)",
                     (account_id, name, currency),
                 )
-            conn.commit()
             new_id = cur.lastrowid if cur.lastrowid is not None else account_id
         return {"id": new_id, "name": name, "currency": currency}
 
@@ -97,20 +919,18 @@ class SQLiteStorage:
             fields.append("currency = ?")
             params.append(currency)
         params.append(account_id)
-        with self._connect() as conn:
+        with self._write() as conn:
             cur = conn.execute(
                 f"UPDATE accounts SET {', '.join(fields)} WHERE id = ?", params
             )
             if cur.rowcount == 0:
                 raise ValueError("Account not found")
-            conn.commit()
 
     def delete_account(self, account_id: int) -> None:
-        with self._connect() as conn:
+        with self._write() as conn:
             cur = conn.execute("DELETE FROM accounts WHERE id = ?", (account_id,))
             if cur.rowcount == 0:
                 raise ValueError("Account not found")
-            conn.commit()
 
     def _ensure_account_exists(self, account_id: int) -> None:
         with self._connect() as conn:
@@ -126,13 +946,26 @@ class SQLiteStorage:
         start_date: Optional[str] = None,
         end_date: Optional[str] = None,
         account_id: Optional[int] = None,
-    ) -> List[dict]:
+        base_currency: Optional[str] = None,
+        limit: Optional[int] = None,
+        newest_first: bool = False,
+        before: Optional[tuple[str, int]] = None,
+        after_id: Optional[int] = None,
+        columnar: bool = False,
+    ) -> List[dict] | dict:
+        """Rows in date order, filtered by date range and account.
+
+        Paging is keyset-based: ``before=(date, id)`` returns rows older than
+        that one, newest first; ``after_id`` returns rows created after that
+        id, in id order (what a client polls for new records). ``columnar``
+        returns the rows as column arrays (see :meth:`_as_columns`).
+        """
+        amount, params = self._amount_column("transactions", base_currency)
         query = [
-            "SELECT id, account_id, date, amount, type, category, note",
-            "FROM transactions",
+            f"SELECT id, account_id, date, {amount}, type, category_id, note",
+            "FROM {schema}.transactions AS transactions",
             "WHERE 1=1",
         ]
-        params: list[object] = []
         if start_date:
             query.append("AND date >= ?")
             params.append(start_date)
@@ -142,11 +975,80 @@ class SQLiteStorage:
         if account_id is not None:
             query.append("AND account_id = ?")
             params.append(account_id)
-        query.append("ORDER BY date")
-        sql = " ".join(query)
+        query.extend(self._page_clauses(params, newest_first, before, after_id))
+        if limit is not None:
+            query.append("LIMIT ?")
+            params.append(limit)
         with self._connect() as conn:
-            rows = conn.execute(sql, params).fetchall()
-        return [dict(row) for row in rows]
+            if base_currency:
+                self._check_fx_coverage(conn, base_currency, start_date)
+            rows = self._page_rows(
+                conn,
+                " ".join(query),
+                params,
+                start_date,
+                end_date,
+                limit,
+                newest_first,
+                before,
+                after_id,
+            )
+        if columnar:
+            return self._as_columns(
+                rows, TRANSACTION_COLUMNS, "category_id", "category"
+            )
+        return self._with_names(rows, "category_id", "category")
+
+    @staticmethod
+    def _page_clauses(
+        params: list[object],
+        newest_first: bool,
+        before: Optional[tuple[str, int]],
+        after_id: Optional[int],
+    ) -> List[str]:
+        clauses = []
+        if before is not None:
+            clauses.append("AND (date, id) < (?, ?)")
+            params.extend(before)
+        if after_id is not None:
+            clauses.append("AND id > ?")
+            params.append(after_id)
+            clauses.append("ORDER BY id")
+        elif newest_first or before is not None:
+            clauses.append("ORDER BY date DESC, id DESC")
+        else:
+            clauses.append("ORDER BY date")
+        return clauses
+
+    def _page_rows(
+        self,
+        conn: sqlite3.Connection,
+        sql: str,
+        params: list[object],
+        start_date: Optional[str],
+        end_date: Optional[str],
+        limit: Optional[int],
+        newest_first: bool,
+        before: Optional[tuple[str, int]],
+        after_id: Optional[int],
+    ) -> List[sqlite3.Row]:
+        """Run a query built with :meth:`_page_clauses` over the ledger parts."""
+        if before is not None and (not end_date or before[0] < end_date):
+            end_date = before[0]
+        if after_id is not None:
+            rows = self._ledger_rows(conn, sql, params, start_date, end_date)
+            rows.sort(key=lambda row: row["id"])
+        else:
+            rows = self._ledger_rows(
+                conn,
+                sql,
+                params,
+                start_date,
+                end_date,
+                newest_first=newest_first or before is not None,
+                limit=limit,
+            )
+        return rows if limit is None else rows[:limit]
 
     def create_transaction(
         self,
@@ -156,26 +1058,49 @@ class SQLiteStorage:
         t_type: str,
         category: str = "",
         note: str = "",
+        on_duplicate: Optional[str] = None,
     ) -> dict:
+        """Insert one transaction.
+
+        With ``on_duplicate`` the row gets a :func:`dedup_key`, and an existing
+        row with the same key is returned as ``duplicate`` ('skip') or raises
+        :class:`DuplicateTransactionError` ('error') instead of being repeated.
+        """
         if t_type not in {"income", "expense"}:
             raise ValueError("type must be 'income' or 'expense'")
+        check_on_duplicate(on_duplicate)
         self._ensure_account_exists(account_id)
         stored_amount = float(amount)
         if t_type == "expense":
             stored_amount = -abs(stored_amount)
         else:
             stored_amount = abs(stored_amount)
-        with self._connect() as conn:
+        category = (category or "").strip()
+        key = None
+        if on_duplicate:
+            key = dedup_key(account_id, date, stored_amount, t_type, note)
+        with self._write() as conn:
+            self._check_not_archived(conn, date)
+            if category:
+                category_id = self._category_id(conn, category)
+            else:
+                category_id = self._rule_matcher().match(note)
             cur = conn.execute(
-                """
-                INSERT INTO transactions(account_id, date, amount, type, category, note)
-                VALUES (?, ?, ?, ?, ?, ?)
-                """,
-                (account_id, date, stored_amount, t_type, category, note),
+                INSERT_TRANSACTION,
+                (account_id, date, stored_amount, t_type, category_id, note, key),
             )
-            conn.commit()
-            new_id = cur.lastrowid
-        return {
+            duplicate = cur.rowcount == 0
+            if duplicate:
+                new_id = self._duplicate_of(conn, key)
+                if on_duplicate == "error":
+                    raise DuplicateTransactionError(
+                        f"Duplicate of transaction {new_id}"
+                    )
+            else:
+                new_id = cur.lastrowid
+        if category_id is not None and not category:
+            category = self._category_map([category_id]).get(category_id, "")
+        created = {
             "id": new_id,
             "account_id": account_id,
             "date": date,
@@ -184,15 +1109,23 @@ class SQLiteStorage:
             "category": category,
             "note": note,
         }
+        if on_duplicate:
+            created["duplicate"] = duplicate
+        return created
+
+    @staticmethod
+    def _duplicate_of(conn: sqlite3.Connection, key: bytes) -> int:
+        return conn.execute(
+            "SELECT id FROM transactions WHERE dedup_key = ?", (key,)
+        ).fetchone()[0]
 
     def delete_transaction(self, transaction_id: int) -> None:
-        with self._connect() as conn:
+        with self._write() as conn:
             cur = conn.execute(
                 "DELETE FROM transactions WHERE id = ?", (transaction_id,)
             )
             if cur.rowcount == 0:
                 raise ValueError("Transaction not found")
-            conn.commit()
 
     # Income ---------------------------------------------------------------
     def list_income(
@@ -200,13 +1133,20 @@ class SQLiteStorage:
         start_date: Optional[str] = None,
         end_date: Optional[str] = None,
         account_id: Optional[int] = None,
-    ) -> List[dict]:
+        base_currency: Optional[str] = None,
+        limit: Optional[int] = None,
+        newest_first: bool = False,
+        before: Optional[tuple[str, int]] = None,
+        after_id: Optional[int] = None,
+        columnar: bool = False,
+    ) -> List[dict] | dict:
+        """Income rows; filters and paging as in :meth:`list_transactions`."""
+        amount, params = self._amount_column("income", base_currency)
         query = [
-            "SELECT id, account_id, date, amount, source",
-            "FROM income",
+            f"SELECT id, account_id, date, {amount}, source_id",
+            "FROM {schema}.income AS income",
             "WHERE 1=1",
         ]
-        params: list[object] = []
         if start_date:
             query.append("AND date >= ?")
             params.append(start_date)
@@ -216,11 +1156,27 @@ class SQLiteStorage:
         if account_id is not None:
             query.append("AND account_id = ?")
             params.append(account_id)
-        query.append("ORDER BY date")
-        sql = " ".join(query)
+        query.extend(self._page_clauses(params, newest_first, before, after_id))
+        if limit is not None:
+            query.append("LIMIT ?")
+            params.append(limit)
         with self._connect() as conn:
-            rows = conn.execute(sql, params).fetchall()
-        return [dict(row) for row in rows]
+            if base_currency:
+                self._check_fx_coverage(conn, base_currency, start_date)
+            rows = self._page_rows(
+                conn,
+                " ".join(query),
+                params,
+                start_date,
+                end_date,
+                limit,
+                newest_first,
+                before,
+                after_id,
+            )
+        if columnar:
+            return self._as_columns(rows, INCOME_COLUMNS, "source_id", "source")
+        return self._with_names(rows, "source_id", "source")
 
     def create_income(
         self,
@@ -231,15 +1187,17 @@ class SQLiteStorage:
     ) -> dict:
         self._ensure_account_exists(account_id)
         stored_amount = abs(float(amount))
-        with self._connect() as conn:
+        source = (source or "").strip()
+        with self._write() as conn:
+            self._check_not_archived(conn, date)
+            source_id = self._category_id(conn, source)
             cur = conn.execute(
                 """
-                INSERT INTO income(account_id, date, amount, source)
+                INSERT INTO income(account_id, date, amount, source_id)
                 VALUES (?, ?, ?, ?)
                 """,
-                (account_id, date, stored_amount, source),
+                (account_id, date, stored_amount, source_id),
             )
-            conn.commit()
             new_id = cur.lastrowid
         return {
             "id": new_id,
@@ -250,34 +1208,1408 @@ class SQLiteStorage:
         }
 
     def delete_income(self, income_id: int) -> None:
-        with self._connect() as conn:
+        with self._write() as conn:
             cur = conn.execute("DELETE FROM income WHERE id = ?", (income_id,))
             if cur.rowcount == 0:
                 raise ValueError("Income record not found")
-            conn.commit()
 
-    def monthly_income(self) -> List[dict]:
+    def monthly_income(self, base_currency: Optional[str] = None) -> List[dict]:
         """Aggregate income by YYYY-MM."""
+        amount, params = self._amount_column("income", base_currency)
+        sql = f"""
+            SELECT month, SUM(amount) AS income
+            FROM (
+                SELECT month, {amount} FROM {{schema}}.income AS income
+            )
+            GROUP BY month
+            ORDER BY month
+        """
+        with self._connect(readonly=True) as conn:
+            if base_currency:
+                self._check_fx_coverage(conn, base_currency)
+            rows = self._ledger_rows(conn, sql, params, cache=not base_currency)
+        return [dict(row) for row in rows]
+
+    def monthly_totals(
+        self,
+        kind: str = "income",
+        group_by: Optional[str] = None,
+        base_currency: Optional[str] = None,
+    ) -> List[dict]:
+        """Aggregate amounts by YYYY-MM and series key in one grouped query.
+
+        Expenses are returned as positive totals. Without ``group_by`` every
+        row falls into a single ``"all"`` series.
+        """
+        if kind not in SERIES_COLUMNS:
+            raise ValueError("kind must be 'income' or 'expenses'")
+        if group_by is None:
+            series = "'all'"
+        else:
+            column = SERIES_COLUMNS[kind].get(group_by)
+            if column is None:
+                allowed = ", ".join(SERIES_COLUMNS[kind])
+                raise ValueError(f"group_by for {kind} must be one of: {allowed}")
+            series = column
+        if kind == "income":
+            table, where, sign = "income", "", ""
+        else:
+            table, where, sign = "transactions", "WHERE type = 'expense'", "-"
+        amount, params = self._amount_column(table, base_currency)
+        sql = f"""
+            SELECT month, series, {sign}SUM(amount) AS total
+            FROM (
+                SELECT month, {series} AS series, {amount}
+                FROM {{schema}}.{table} AS {table} {where}
+            )
+            GROUP BY month, series
+            ORDER BY month, series
+        """
+        with self._connect(readonly=True) as conn:
+            if base_currency:
+                self._check_fx_coverage(conn, base_currency)
+            rows = self._ledger_rows(conn, sql, params, cache=not base_currency)
+        if group_by is None or series == "account_id":
+            return [dict(row) for row in rows]
+        return self._with_names(rows, "series", "series", missing="uncategorized")
+
+    def category_totals(
+        self,
+        kind: str = "transactions",
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        base_currency: Optional[str] = None,
+    ) -> dict[str, float]:
+        """Sum amounts per category (income: per source), grouped on the ids."""
+        if kind == "income":
+            table, column = "income", "source_id"
+        else:
+            table, column = "transactions", "category_id"
+        amount, params = self._amount_column(table, base_currency)
+        query = [
+            f"SELECT {column}, {amount} FROM {{schema}}.{table} AS {table} WHERE 1=1"
+        ]
+        if start_date:
+            query.append("AND date >= ?")
+            params.append(start_date)
+        if end_date:
+            query.append("AND date <= ?")
+            params.append(end_date)
+        sql = f"""
+            SELECT {column} AS category_id, SUM(amount) AS total
+            FROM ({" ".join(query)})
+            GROUP BY {column}
+        """
+        with self._connect(readonly=True) as conn:
+            if base_currency:
+                self._check_fx_coverage(conn, base_currency, start_date)
+            rows = self._ledger_rows(conn, sql, params, start_date, end_date)
+        names = self._category_map([row["category_id"] for row in rows])
+        totals: dict[str, float] = {}
+        for row in rows:  # a category recurs once per archive part
+            name = names.get(row["category_id"], "uncategorized")
+            totals[name] = totals.get(name, 0) + row["total"]
+        return totals
+
+    # Categories -----------------------------------------------------------
+    def list_categories(self) -> List[dict]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, name FROM categories ORDER BY name"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def rename_category(self, category_id: int, name: str) -> dict:
+        """Rename a category; ledger rows and their search documents hold only
+        its id, so this rewrites the category's row and its one index entry.
+        """
+        name = (name or "").strip()
+        if not name:
+            raise ValueError("Category name is required")
+        with self._write() as conn:
+            try:
+                cur = conn.execute(
+                    "UPDATE categories SET name = ? WHERE id = ?", (name, category_id)
+                )
+            except sqlite3.IntegrityError as exc:
+                raise ValueError(f"Category '{name}' already exists") from exc
+            if cur.rowcount == 0:
+                raise ValueError("Category not found")
+        self._categories_loaded_at = float("-inf")
+        return {"id": category_id, "name": name}
+
+    # Budgets --------------------------------------------------------------
+    def list_budgets(self, month: Optional[str] = None) -> List[dict]:
+        query = "SELECT id, month, category_id, limit_amount FROM budgets"
+        params: list[object] = []
+        if month:
+            query += " WHERE month = ?"
+            params.append(month)
+        with self._connect() as conn:
+            rows = conn.execute(f"{query} ORDER BY month, id", params).fetchall()
+        return self._with_names(rows, "category_id", "category")
+
+    def create_budget(self, month: str, category: str, limit_amount: float) -> dict:
+        month, category, limit_amount = self._budget_fields(
+            month, category, limit_amount
+        )
+        with self._write() as conn:
+            category_id = self._category_id(conn, category)
+            try:
+                cur = conn.execute(
+                    "INSERT INTO budgets(month, category_id, limit_amount) "
+                    "VALUES (?, ?, ?)",
+                    (month, category_id, limit_amount),
+                )
+            except sqlite3.IntegrityError as exc:
+                raise ValueError(
+                    f"A budget for '{category}' in {month} already exists"
+                ) from exc
+        return {
+            "id": cur.lastrowid,
+            "month": month,
+            "category": category,
+            "limit_amount": limit_amount,
+        }
+
+    def update_budget(
+        self,
+        budget_id: int,
+        month: Optional[str] = None,
+        category: Optional[str] = None,
+        limit_amount: Optional[float] = None,
+    ) -> None:
+        with self._write() as conn:
+            row = conn.execute(
+                "SELECT month, category_id, limit_amount FROM budgets WHERE id = ?",
+                (budget_id,),
+            ).fetchone()
+            if row is None:
+                raise ValueError("Budget not found")
+            names = self._category_map([row["category_id"]])
+            month, category, limit_amount = self._budget_fields(
+                row["month"] if month is None else month,
+                names.get(row["category_id"], "") if category is None else category,
+                row["limit_amount"] if limit_amount is None else limit_amount,
+            )
+            try:
+                conn.execute(
+                    "UPDATE budgets SET month = ?, category_id = ?, limit_amount = ? "
+                    "WHERE id = ?",
+                    (month, self._category_id(conn, category), limit_amount, budget_id),
+                )
+            except sqlite3.IntegrityError as exc:
+                raise ValueError(
+                    f"A budget for '{category}' in {month} already exists"
+                ) from exc
+
+    def delete_budget(self, budget_id: int) -> None:
+        with self._write() as conn:
+            cur = conn.execute("DELETE FROM budgets WHERE id = ?", (budget_id,))
+            if cur.rowcount == 0:
+                raise ValueError("Budget not found")
+
+    def budget_status(self, month: str) -> dict:
+        """Spent and remaining for every budget of ``month`` (YYYY-MM).
+
+        Spent is the month's expenses in the budget's category, as a positive
+        amount; all budgets come from one grouped query.
+        """
+        if not MONTH_FORMAT.fullmatch(month or ""):
+            raise ValueError("month must be in YYYY-MM format")
+        with self._connect(readonly=True) as conn:
+            # A month lies within one year, so within one ledger part.
+            schema, path = self._ledger_parts(conn, f"{month}-01", f"{month}-31")[0]
+            with self._attached(conn, schema, path) as part_conn:
+                rows = part_conn.execute(
+                    BUDGET_STATUS.format(schema=schema), {"month": month}
+                ).fetchall()
+        budgets = self._with_names(rows, "category_id", "category")
+        totals = {
+            key: round(sum(b[key] for b in budgets), 2)
+            for key in ("limit_amount", "spent", "remaining")
+        }
+        return {"month": month, "budgets": budgets, "totals": totals}
+
+    @staticmethod
+    def _budget_fields(
+        month: str, category: str, limit_amount: float
+    ) -> tuple[str, str, float]:
+        if not MONTH_FORMAT.fullmatch(month or ""):
+            raise ValueError("month must be in YYYY-MM format")
+        category = (category or "").strip()
+        if not category:
+            raise ValueError("Budget category is required")
+        limit_amount = float(limit_amount)
+        if limit_amount < 0:
+            raise ValueError("limit_amount must not be negative")
+        return month, category, limit_amount
+
+    # Categorization rules ---------------------------------------------------
+    def list_rules(self) -> List[dict]:
         with self._connect() as conn:
             rows = conn.execute(
+                "SELECT id, kind, pattern, category_id, priority "
+                "FROM category_rules ORDER BY priority, id"
+            ).fetchall()
+        return self._with_names(rows, "category_id", "category")
+
+    def create_rule(
+        self, kind: str, pattern: str, category: str, priority: int = 0
+    ) -> dict:
+        """Add a rule giving ``category`` to uncategorized matching notes."""
+        pattern = check_rule(kind, pattern)
+        category = (category or "").strip()
+        if not category:
+            raise ValueError("Rule category is required")
+        priority = int(priority)
+        with self._write() as conn:
+            cur = conn.execute(
+                "INSERT INTO category_rules(kind, pattern, category_id, priority) "
+                "VALUES (?, ?, ?, ?)",
+                (kind, pattern, self._category_id(conn, category), priority),
+            )
+        self._rules_loaded_at = float("-inf")
+        return {
+            "id": cur.lastrowid,
+            "kind": kind,
+            "pattern": pattern,
+            "category": category,
+            "priority": priority,
+        }
+
+    def delete_rule(self, rule_id: int) -> None:
+        with self._write() as conn:
+            cur = conn.execute("DELETE FROM category_rules WHERE id = ?", (rule_id,))
+            if cur.rowcount == 0:
+                raise ValueError("Rule not found")
+        self._rules_loaded_at = float("-inf")
+
+    def _rule_matcher(self) -> RuleMatcher:
+        """Compiled rules, rebuilt after a change here or when stale."""
+        if time.monotonic() - self._rules_loaded_at > CATEGORY_CACHE_TTL:
+            with self._connect() as conn:
+                rows = conn.execute(
+                    "SELECT kind, pattern, category_id FROM category_rules "
+                    "ORDER BY priority, id"
+                ).fetchall()
+            self._matcher = RuleMatcher(tuple(row) for row in rows)
+            self._rules_loaded_at = time.monotonic()
+        return self._matcher
+
+    def backfill_categories(
+        self, batch_size: int = 5000, overwrite: bool = False
+    ) -> dict:
+        """Apply the rules to stored transactions, one write per batch of rows.
+
+        Only uncategorized rows are considered unless ``overwrite``, which
+        re-matches every row; rows no rule matches keep their category.
+        Archived years are read-only and left alone.
+        """
+        self._rules_loaded_at = float("-inf")
+        matcher = self._rule_matcher()
+        only_blank = "" if overwrite else "AND category_id IS NULL"
+        last_id = scanned = updated = 0
+        started = time.perf_counter()
+        while matcher:
+            with self._write() as conn:
+                rows = conn.execute(
+                    f"SELECT id, note, category_id FROM transactions "
+                    f"WHERE id > ? {only_blank} ORDER BY id LIMIT ?",
+                    (last_id, batch_size),
+                ).fetchall()
+                changes = []
+                for row in rows:
+                    category_id = matcher.match(row["note"])
+                    if category_id is not None and category_id != row["category_id"]:
+                        changes.append((category_id, row["id"]))
+                conn.executemany(
+                    "UPDATE transactions SET category_id = ? WHERE id = ?", changes
+                )
+            if not rows:
+                break
+            scanned += len(rows)
+            updated += len(changes)
+            last_id = rows[-1]["id"]
+        seconds = time.perf_counter() - started
+        return {
+            "rows": scanned,
+            "updated": updated,
+            "seconds": round(seconds, 3),
+            "rows_per_second": round(scanned / seconds, 1) if seconds else 0.0,
+        }
+
+    def _category_id(self, conn: sqlite3.Connection, name: str) -> Optional[int]:
+        """Id of a (stripped, non-empty) category name, created on first use.
+
+        Resolved in the caller's transaction, never from the cached map: a
+        rename by another process must not redirect the row to a new name.
+        """
+        if not name:
+            return None
+        conn.execute("INSERT OR IGNORE INTO categories(name) VALUES (?)", (name,))
+        return conn.execute(
+            "SELECT id FROM categories WHERE name = ?", (name,)
+        ).fetchone()[0]
+
+    def _category_map(self, ids: Iterable[Optional[int]] = ()) -> dict[int, str]:
+        """Cached id -> name map, reloaded when stale or missing any of ``ids``."""
+        names = self._category_names
+        stale = time.monotonic() - self._categories_loaded_at > CATEGORY_CACHE_TTL
+        if stale or any(i is not None and i not in names for i in ids):
+            with self._connect() as conn:
+                rows = conn.execute("SELECT id, name FROM categories").fetchall()
+            names = {row[0]: row[1] for row in rows}
+            self._category_names = names
+            self._categories_loaded_at = time.monotonic()
+        return names
+
+    def _with_names(
+        self,
+        rows: List[sqlite3.Row],
+        id_column: str,
+        name_key: str,
+        missing: str = "",
+    ) -> List[dict]:
+        names = self._category_map({row[id_column] for row in rows})
+        result = []
+        for row in rows:
+            item = dict(row)
+            item[name_key] = names.get(item.pop(id_column), missing)
+            result.append(item)
+        return result
+
+    def _as_columns(
+        self,
+        rows: List[sqlite3.Row],
+        columns: tuple[str, ...],
+        id_column: str,
+        name_key: str,
+    ) -> dict:
+        """Rows as ``{"columns": [...], "data": {column: [values]}}``.
+
+        The row tuples are transposed in one step instead of becoming one dict
+        each; columns are ordered like the keys of :meth:`_with_names` rows.
+        """
+        data = dict(zip(columns, zip(*rows))) if rows else {c: () for c in columns}
+        ids = data.pop(id_column)
+        names = self._category_map(set(ids))
+        data[name_key] = [names.get(i, "") for i in ids]
+        return {"columns": list(data), "data": data}
+
+    def cashflow(
+        self,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        group: str = "month",
+        account_id: Optional[int] = None,
+    ) -> List[dict]:
+        """Income, expenses, net and running net per month or week.
+
+        Both ledgers (signed transactions and the income table) are merged with
+        UNION ALL and bucketed in a single statement; periods without activity
+        are filled with zeros. ``cumulative`` is the running net over the range.
+        """
+        if group not in CASHFLOW_PERIODS:
+            raise ValueError("group must be 'month' or 'week'")
+        period_start, step, label, key, key_start = CASHFLOW_PERIODS[group]
+        filters = ""
+        if start_date:
+            filters += " AND date >= :start"
+        if end_date:
+            filters += " AND date <= :end"
+        if account_id is not None:
+            filters += " AND account_id = :account_id"
+        sql = f"""
+            WITH RECURSIVE
+            flows AS (
+                SELECT date, {key} AS key, amount FROM transactions WHERE 1=1{filters}
+                UNION ALL
+                SELECT date, {key} AS key, amount FROM income WHERE 1=1{filters}
+            ),
+            bounds AS (
+                SELECT COALESCE(:start, MIN(date)) AS lo,
+                       COALESCE(:end, MAX(date)) AS hi
+                FROM flows
+            ),
+            periods(start) AS (
+                SELECT {period_start.format(col="lo")} FROM bounds WHERE lo IS NOT NULL
+                UNION ALL
+                SELECT date(start, '{step}') FROM periods, bounds
+                WHERE date(start, '{step}') <= hi
+            ),
+            totals AS (
+                SELECT {key_start} AS start,
+                       SUM(CASE WHEN amount > 0 THEN amount ELSE 0 END) AS income,
+                       SUM(CASE WHEN amount < 0 THEN -amount ELSE 0 END) AS expenses
+                FROM flows
+                GROUP BY key
+            )
+            SELECT {label} AS period,
+                   ROUND(COALESCE(t.income, 0), 2) AS income,
+                   ROUND(COALESCE(t.expenses, 0), 2) AS expenses,
+                   ROUND(COALESCE(t.income, 0) - COALESCE(t.expenses, 0), 2) AS net,
+                   ROUND(SUM(COALESCE(t.income, 0) - COALESCE(t.expenses, 0))
+                         OVER (ORDER BY start), 2) AS cumulative
+            FROM periods LEFT JOIN totals t USING (start)
+            ORDER BY start
+        """
+        params = {"start": start_date, "end": end_date, "account_id": account_id}
+        with self._connect(readonly=True) as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [dict(row) for row in rows]
+
+    # Balances -------------------------------------------------------------
+    def balance_at(
+        self,
+        account_id: int,
+        at: Optional[str] = None,
+        base_currency: Optional[str] = None,
+    ) -> dict:
+        """Balance of an account at the end of day ``at`` (default: today).
+
+        Starts from the nearest checkpoint before that month and only sums the
+        rows of the partial month. With ``base_currency`` the balance is
+        converted at the rate in effect on ``at``.
+        """
+        self._ensure_account_exists(account_id)
+        at = at or date_cls.today().isoformat()
+        with self._connect() as conn:
+            balance = self._balance_at(conn, account_id, at)
+            if base_currency:
+                balance *= self._account_fx_factor(conn, account_id, base_currency, at)
+        return {"account_id": account_id, "date": at, "balance": round(balance, 2)}
+
+    def _balance_at(self, conn: sqlite3.Connection, account_id: int, at: str) -> float:
+        month = at[:7]
+        month_start = f"{month}-01"
+        partial = (account_id, month_start, at)
+        # The partial month lies within one year, so within one ledger part.
+        schema, path = self._ledger_parts(conn, month_start, at)[0]
+        with self._attached(conn, schema, path) as part_conn:
+            row = part_conn.execute(
+                f"""
+                SELECT
+                    COALESCE((
+                        SELECT closing_balance FROM balance_checkpoints
+                        WHERE account_id = ? AND month < ?
+                        ORDER BY month DESC LIMIT 1
+                    ), 0)
+                    + COALESCE((
+                        SELECT SUM(amount) FROM {schema}.transactions
+                        WHERE account_id = ? AND date >= ? AND date <= ?
+                    ), 0)
+                    + COALESCE((
+                        SELECT SUM(amount) FROM {schema}.income
+                        WHERE account_id = ? AND date >= ? AND date <= ?
+                    ), 0)
+                """,
+                (account_id, month) + partial + partial,
+            ).fetchone()
+        return float(row[0])
+
+    def balance_series(
+        self,
+        account_id: int,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        step: str = "month",
+        base_currency: Optional[str] = None,
+    ) -> dict:
+        """Month-end balances between two dates, read from the checkpoints.
+
+        The last point is the balance on ``end_date`` when it falls mid-month.
+        """
+        if step != "month":
+            raise ValueError("step must be 'month'")
+        self._ensure_account_exists(account_id)
+        end_date = end_date or date_cls.today().isoformat()
+        with self._connect(readonly=True) as conn:
+            checkpoints = conn.execute(
                 """
-                SELECT substr(date, 1, 7) AS month, SUM(amount) AS income
-                FROM income
-                GROUP BY month
+                SELECT month, closing_balance FROM balance_checkpoints
+                WHERE account_id = ? AND month <= ?
                 ORDER BY month
+                """,
+                (account_id, end_date[:7]),
+            ).fetchall()
+            if start_date is None:
+                start_date = f"{checkpoints[0][0]}-01" if checkpoints else end_date
+            if start_date > end_date:
+                raise ValueError("from must not be after to")
+
+            points = []
+            closing = 0.0
+            pos = 0
+            year, month = int(start_date[:4]), int(start_date[5:7])
+            while True:
+                key = f"{year:04d}-{month:02d}"
+                if key > end_date[:7]:
+                    break
+                while pos < len(checkpoints) and checkpoints[pos][0] <= key:
+                    closing = checkpoints[pos][1]
+                    pos += 1
+                month_end = f"{key}-{calendar.monthrange(year, month)[1]:02d}"
+                if month_end > end_date:
+                    point_date = end_date
+                    balance = self._balance_at(conn, account_id, end_date)
+                else:
+                    point_date = month_end
+                    balance = closing
+                if base_currency:
+                    balance *= self._account_fx_factor(
+                        conn, account_id, base_currency, point_date
+                    )
+                points.append({"date": point_date, "balance": round(balance, 2)})
+                year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        return {"account_id": account_id, "step": step, "points": points}
+
+    def rebuild_balance_checkpoints(self) -> None:
+        """Recompute the checkpoints of every live month from the ledger tables."""
+        with self._write() as conn:
+            self._rebuild_checkpoints(conn)
+
+    def _rebuild_checkpoints(self, conn: sqlite3.Connection) -> None:
+        last = self._archived_through(conn)
+        after = f"{last:04d}-12" if last is not None else ""
+        for statement in REBUILD_CHECKPOINTS:
+            conn.execute(statement, {"after": after})
+
+    # Search ---------------------------------------------------------------
+    def search(
+        self,
+        text: str,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+    ) -> dict:
+        """Ranked full-text search over transaction notes/categories and income
+        sources. Every word is prefix-matched; pages are keyset-paginated on
+        (rank, kind, id) through an opaque ``cursor``.
+        """
+        words = re.findall(r"\w+", text or "")
+        if not words:
+            raise ValueError("q must contain at least one word")
+
+        date_filter = ""
+        date_params: list[object] = []
+        if start_date:
+            date_filter += " AND {alias}.date >= ?"
+            date_params.append(start_date)
+        if end_date:
+            date_filter += " AND {alias}.date <= ?"
+            date_params.append(end_date)
+
+        page_filter = ""
+        page_params: list[object] = []
+        if cursor:
+            try:
+                rank, kind, row_id = json.loads(base64.urlsafe_b64decode(cursor))
+            except (TypeError, ValueError) as exc:
+                raise ValueError("Invalid cursor") from exc
+            page_filter = "WHERE (rank, kind, id) > (?, ?, ?)"
+            page_params = [rank, kind, row_id]
+
+        with self._connect() as conn:
+            # Every word matches a note, or a category through its c<id> token.
+            categories = [
+                " OR ".join(
+                    f"c{row[0]}"
+                    for row in conn.execute(SEARCH_CATEGORIES, (f'"{word}"*',))
+                )
+                for word in words
+            ]
+            match = " AND ".join(
+                (
+                    f'(note : "{word}"* OR category : ({tokens}))'
+                    if tokens
+                    else f'note : "{word}"*'
+                )
+                for word, tokens in zip(words, categories)
+            )
+            parts = [SEARCH_TRANSACTIONS.format(dates=date_filter.format(alias="t"))]
+            params: list[object] = [match, *date_params]
+            if all(categories):  # an income row's only text is its source
+                parts.append(SEARCH_INCOME.format(dates=date_filter.format(alias="i")))
+                params += [" AND ".join(f"({t})" for t in categories), *date_params]
+            sql = f"""
+                SELECT * FROM ({" UNION ALL ".join(parts)})
+                {page_filter}
+                ORDER BY rank, kind, id
+                LIMIT ?
+            """
+            rows = conn.execute(sql, [*params, *page_params, limit + 1]).fetchall()
+
+        results = []
+        for row in rows[:limit]:
+            item = {
+                "kind": row["kind"],
+                "id": row["id"],
+                "account_id": row["account_id"],
+                "date": row["date"],
+                "amount": row["amount"],
+                "rank": row["rank"],
+            }
+            if row["kind"] == "transaction":
+                item["type"] = row["type"]
+                item["category"] = row["category"]
+                item["note"] = row["note"]
+            else:
+                item["source"] = row["source"]
+            results.append(item)
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            token = json.dumps([last["rank"], last["kind"], last["id"]])
+            next_cursor = base64.urlsafe_b64encode(token.encode()).decode()
+        return {"results": results, "next_cursor": next_cursor}
+
+    # Imports ---------------------------------------------------------------
+    def create_import_job(
+        self,
+        file: str,
+        total_rows: int,
+        pid: int,
+        on_duplicate: Optional[str] = None,
+        owner: Optional[str] = None,
+    ) -> dict:
+        """Queue an import of the spooled CSV ``file`` (a name beside the DB).
+
+        ``owner`` is the token of the process that will run it, which
+        ``storage.imports`` checks to tell an abandoned job from a live one.
+        """
+        check_on_duplicate(on_duplicate)
+        with self._write() as conn:
+            cur = conn.execute(
+                "INSERT INTO import_jobs(file, total_rows, pid, on_duplicate, owner) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (file, total_rows, pid, on_duplicate, owner),
+            )
+        return self.get_import_job(cur.lastrowid)
+
+    def get_import_job(self, job_id: int) -> dict:
+        with self._connect() as conn:
+            row = conn.execute(IMPORT_JOB, (job_id,)).fetchone()
+        if row is None:
+            raise ValueError("Import job not found")
+        job = dict(row)
+        seconds = job.pop("seconds")
+        job["errors"] = json.loads(job["errors"])
+        job["progress"] = (
+            1.0
+            if job["status"] == "done"
+            else round(min(job["rows_read"] / max(job["total_rows"], 1), 1.0), 4)
+        )
+        job["rows_per_second"] = (
+            round(job["rows_read"] / seconds, 1) if seconds else 0.0
+        )
+        return job
+
+    def active_import_jobs(self) -> List[dict]:
+        """Queued or running jobs, with the process that accepted each."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, pid, owner, file FROM import_jobs "
+                "WHERE status IN ('queued', 'running') ORDER BY id"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def cancel_import_job(self, job_id: int) -> dict:
+        """Stop a job before its next chunk; chunks already imported stay."""
+        with self._write() as conn:
+            cur = conn.execute(
+                """
+                UPDATE import_jobs
+                SET cancel_requested = 1,
+                    status = CASE status WHEN 'queued' THEN 'cancelled'
+                                         ELSE status END,
+                    finished_at = CASE status
+                        WHEN 'queued' THEN strftime('%Y-%m-%d %H:%M:%f', 'now')
+                        ELSE finished_at END
+                WHERE id = ?
+                """,
+                (job_id,),
+            )
+            if cur.rowcount == 0:
+                raise ValueError("Import job not found")
+        return self.get_import_job(job_id)
+
+    def start_import_job(self, job_id: int) -> bool:
+        """Mark a queued job running; False if it was cancelled meanwhile."""
+        with self._write() as conn:
+            cur = conn.execute(
+                "UPDATE import_jobs SET status = 'running', "
+                "started_at = strftime('%Y-%m-%d %H:%M:%f', 'now') "
+                "WHERE id = ? AND status = 'queued'",
+                (job_id,),
+            )
+        return cur.rowcount == 1
+
+    def import_chunk(
+        self,
+        job_id: int,
+        rows: List[tuple[int, dict]],
+        occurrences: Optional[Counter] = None,
+    ) -> bool:
+        """Insert one chunk of ``(line, csv row)`` transactions in one transaction.
+
+        Invalid rows are counted and reported per line instead of failing the
+        chunk. Returns False, inserting nothing, once the job is cancelled.
+        With the job's ``on_duplicate`` set, rows already in the ledger are
+        skipped or reported; ``occurrences`` counts identical rows across the
+        chunks of one import (see :func:`dedup_key`).
+        """
+        occurrences = Counter() if occurrences is None else occurrences
+        with self._write() as conn:
+            job = conn.execute(
+                "SELECT cancel_requested, on_duplicate, errors "
+                "FROM import_jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+            if job is None or job["cancel_requested"]:
+                return False
+            accounts = {row[0] for row in conn.execute("SELECT id FROM accounts")}
+            archived = self._archived_through(conn)
+            category_ids: dict[str, Optional[int]] = {}
+            matcher = self._rule_matcher()
+            imported, skipped, errors = 0, 0, []
+            for line, row in rows:
+                try:
+                    account_id, day, amount, t_type, category, note = (
+                        self._import_fields(row)
+                    )
+                    if account_id not in accounts:
+                        raise ValueError(f"Account {account_id} does not exist")
+                    if archived is not None and day[:4] <= f"{archived:04d}":
+                        raise ValueError(f"Ledger years up to {archived} are archived")
+                except ValueError as exc:
+                    errors.append({"line": line, "error": str(exc)})
+                    continue
+                if not category:
+                    category_id = matcher.match(note)
+                else:
+                    if category not in category_ids:
+                        category_ids[category] = self._category_id(conn, category)
+                    category_id = category_ids[category]
+                key = None
+                if job["on_duplicate"]:
+                    first = dedup_key(account_id, day, amount, t_type, note)
+                    key = dedup_key(
+                        account_id, day, amount, t_type, note, occurrences[first]
+                    )
+                    occurrences[first] += 1
+                cur = conn.execute(
+                    INSERT_TRANSACTION,
+                    (account_id, day, amount, t_type, category_id, note, key),
+                )
+                if cur.rowcount:
+                    imported += 1
+                elif job["on_duplicate"] == "skip":
+                    skipped += 1
+                else:
+                    existing = self._duplicate_of(conn, key)
+                    errors.append(
+                        {"line": line, "error": f"Duplicate of transaction {existing}"}
+                    )
+            kept = json.loads(job["errors"])
+            kept.extend(errors[: IMPORT_ERRORS_KEPT - len(kept)])
+            conn.execute(
                 """
+                UPDATE import_jobs
+                SET rows_read = rows_read + ?, rows_imported = rows_imported + ?,
+                    rows_skipped = rows_skipped + ?, rows_failed = rows_failed + ?,
+                    errors = ?
+                WHERE id = ?
+                """,
+                (len(rows), imported, skipped, len(errors), json.dumps(kept), job_id),
+            )
+        return True
+
+    @staticmethod
+    def _import_fields(row: dict) -> tuple[int, str, float, str, str, str]:
+        try:
+            account_id = int(row.get("account_id") or "")
+        except ValueError as exc:
+            raise ValueError("account_id must be an integer") from exc
+        try:
+            day = date_cls.fromisoformat((row.get("date") or "").strip()).isoformat()
+        except ValueError as exc:
+            raise ValueError("date must be in YYYY-MM-DD format") from exc
+        try:
+            amount = abs(float(row.get("amount") or ""))
+        except ValueError as exc:
+            raise ValueError("amount must be a number") from exc
+        t_type = (row.get("type") or "").strip().lower()
+        if t_type not in {"income", "expense"}:
+            raise ValueError("type must be 'income' or 'expense'")
+        if t_type == "expense":
+            amount = -amount
+        category = (row.get("category") or "").strip()
+        return account_id, day, amount, t_type, category, row.get("note") or ""
+
+    def finish_import_job(self, job_id: int, error: Optional[str] = None) -> None:
+        """Close a job: failed with ``error``, else cancelled or done."""
+        with self._write() as conn:
+            conn.execute(
+                """
+                UPDATE import_jobs
+                SET status = CASE
+                        WHEN ? IS NOT NULL THEN 'failed'
+                        WHEN cancel_requested THEN 'cancelled'
+                        ELSE 'done' END,
+                    error = ?,
+                    finished_at = strftime('%Y-%m-%d %H:%M:%f', 'now')
+                WHERE id = ? AND status IN ('queued', 'running')
+                """,
+                (error, error, job_id),
+            )
+        # Reload names so the categories the import created are cached.
+        self._categories_loaded_at = float("-inf")
+
+    # Exchange rates -------------------------------------------------------
+    def load_fx_rates(self, path: Path | str) -> int:
+        """Upsert ``currency,date,rate`` rows from a CSV file; returns the count."""
+        with open(path, "r", newline="", encoding="utf-8") as f:
+            rows = []
+            for line_no, row in enumerate(csv.DictReader(f), start=2):
+                try:
+                    currency = row["currency"].strip().upper()
+                    day = date_cls.fromisoformat(row["date"].strip()).isoformat()
+                    rate = float(row["rate"])
+                except (KeyError, AttributeError, ValueError) as exc:
+                    raise ValueError(f"{path}:{line_no}: invalid FX rate row") from exc
+                if not currency or rate <= 0:
+                    raise ValueError(f"{path}:{line_no}: invalid FX rate row")
+                rows.append((currency, day, rate))
+        with self._write() as conn:
+            conn.executemany(
+                """
+                INSERT OR REPLACE INTO fx_rates(currency, date, rate)
+                VALUES (?, ?, ?)
+                """,
+                rows,
+            )
+        return len(rows)
+
+    @staticmethod
+    def _amount_column(
+        table: str, base_currency: Optional[str]
+    ) -> tuple[str, list[object]]:
+        if not base_currency:
+            return "amount", []
+        base = base_currency.upper()
+        return f"amount * {FX_FACTOR.format(table=table)} AS amount", [base, base]
+
+    def _check_fx_coverage(
+        self,
+        conn: sqlite3.Connection,
+        base_currency: str,
+        start_date: Optional[str] = None,
+    ) -> None:
+        """Fail early if some ledger date has no rate to convert it with.
+
+        Uses the (account_id, date) indexes for each account's first row, so
+        the check never scans the ledger.
+        """
+        base = base_currency.upper()
+        first_dates = self._ledger_rows(
+            conn,
+            """
+            SELECT UPPER(a.currency) AS currency, MIN(
+                COALESCE(
+                    (
+                        SELECT MIN(date) FROM {schema}.transactions
+                        WHERE account_id = a.id
+                    ),
+                    '9999-12-31'
+                ),
+                COALESCE(
+                    (SELECT MIN(date) FROM {schema}.income WHERE account_id = a.id),
+                    '9999-12-31'
+                )
+            ) AS first_date
+            FROM accounts a
+            """,
+            [],
+            start_date,
+        )
+        first_rates = dict(
+            conn.execute(
+                "SELECT currency, MIN(date) FROM fx_rates GROUP BY currency"
+            ).fetchall()
+        )
+        needed: dict[str, str] = {}
+        for currency, first_date in first_dates:
+            if currency == base or first_date == "9999-12-31":
+                continue
+            if start_date and start_date > first_date:
+                first_date = start_date
+            needed[currency] = min(first_date, needed.get(currency, first_date))
+        if needed:
+            needed[base] = min(needed.values())
+        for currency, first_date in needed.items():
+            first_rate = first_rates.get(currency)
+            if first_rate is None or first_rate > first_date:
+                raise ValueError(
+                    f"No {currency} exchange rate on or before {first_date}"
+                )
+
+    @staticmethod
+    def _account_fx_factor(
+        conn: sqlite3.Connection, account_id: int, base_currency: str, at: str
+    ) -> float:
+        base = base_currency.upper()
+        row = conn.execute(
+            f"""
+            SELECT {FX_FACTOR.format(table="ledger")}
+            FROM (SELECT ? AS account_id, ? AS date) AS ledger
+            """,
+            (base, base, account_id, at),
+        ).fetchone()
+        if row[0] is None:
+            raise ValueError(f"No exchange rate to {base} on or before {at}")
+        return float(row[0])
+
+    # Archives -------------------------------------------------------------
+    def archive_year(self, year: int) -> dict:
+        """Move a closed year's transactions and income into its own file.
+
+        The file sits next to the database and is attached only by reads
+        whose date range reaches into that year. Years go oldest first and
+        become read-only. Balances and the change feed are unaffected; search
+        and cash-flow cover the live tables only.
+        """
+        year = int(year)
+        if year >= date_cls.today().year:
+            raise ValueError("Only closed years can be archived")
+        path = self.db_path.with_name(f"{self.db_path.stem}-archive-{year}.db")
+        span = (f"{year:04d}-01-01", f"{year:04d}-12-31")
+        # A WAL database commits each attached file on its own, so the copy is
+        # committed first and the live rows only go once it matches them.
+        for _ in range(3):
+            with self._write({"archive": path}) as conn:
+                self._check_archivable(conn, year)
+                for statement in ARCHIVE_SCHEMA:
+                    conn.execute(statement.format(schema="archive"))
+                self._ensure_buckets(conn, "archive")
+                for table, columns in LEDGER_COLUMNS.items():
+                    conn.execute(f"DELETE FROM archive.{table}")
+                    conn.execute(
+                        f"INSERT INTO archive.{table} ({columns}) SELECT {columns} "
+                        f"FROM main.{table} WHERE date BETWEEN ? AND ?",
+                        span,
+                    )
+            with self._write({"archive": path}) as conn:
+                self._check_archivable(conn, year)
+                counts = self._move_to_archive(conn, span)
+                if counts is not None:
+                    conn.execute(
+                        "INSERT INTO archives (year, file, transactions, income) "
+                        "VALUES (?, ?, ?, ?)",
+                        (year, path.name, counts["transactions"], counts["income"]),
+                    )
+                    return {"year": year, "file": path.name, **counts}
+        raise DatabaseBusyError(f"{year} kept changing while being archived")
+
+    def list_archives(self) -> List[dict]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT year, file, transactions, income, archived_at "
+                "FROM archives ORDER BY year"
             ).fetchall()
         return [dict(row) for row in rows]
 
+    def _check_archivable(self, conn: sqlite3.Connection, year: int) -> None:
+        if conn.execute("SELECT 1 FROM archives WHERE year = ?", (year,)).fetchone():
+            raise ValueError(f"{year} is already archived")
+        oldest = conn.execute(
+            "SELECT MIN(first) FROM ("
+            "SELECT MIN(date) AS first FROM main.transactions "
+            "UNION ALL SELECT MIN(date) FROM main.income)"
+        ).fetchone()[0]
+        if oldest is not None and oldest < f"{year:04d}-01-01":
+            raise ValueError(f"Archive {oldest[:4]} first; years go oldest first")
+
+    @staticmethod
+    def _move_to_archive(
+        conn: sqlite3.Connection, span: tuple[str, str]
+    ) -> Optional[dict[str, int]]:
+        """Delete the archived rows from the live tables; None if the copy in
+        ``archive`` no longer matches them."""
+        counts = {}
+        for table, columns in LEDGER_COLUMNS.items():
+            live = f"SELECT {columns} FROM main.{table} WHERE date BETWEEN ? AND ?"
+            copy = f"SELECT {columns} FROM archive.{table}"
+            stale = conn.execute(
+                f"SELECT EXISTS ({live} EXCEPT {copy}) "
+                f"OR EXISTS ({copy} EXCEPT {live})",
+                span + span,
+            ).fetchone()[0]
+            if stale:
+                return None
+        names = [
+            name.format(table=table)
+            for table in LEDGER_COLUMNS
+            for name in ARCHIVE_SUSPENDED_TRIGGERS
+        ]
+        triggers = conn.execute(
+            "SELECT name, sql FROM main.sqlite_master WHERE type = 'trigger' "
+            f"AND name IN ({', '.join('?' * len(names))})",
+            names,
+        ).fetchall()
+        for name, _ in triggers:
+            conn.execute(f"DROP TRIGGER main.{name}")
+        for table in LEDGER_COLUMNS:
+            counts[table] = conn.execute(
+                f"DELETE FROM main.{table} WHERE date BETWEEN ? AND ?", span
+            ).rowcount
+        for _, sql in triggers:
+            conn.execute(sql)
+        return counts
+
+    @staticmethod
+    def _archived_through(conn: sqlite3.Connection) -> Optional[int]:
+        return conn.execute("SELECT MAX(year) FROM archives").fetchone()[0]
+
+    def _check_not_archived(self, conn: sqlite3.Connection, day: str) -> None:
+        last = self._archived_through(conn)
+        if last is not None and day[:4] <= f"{last:04d}":
+            raise ValueError(f"Ledger years up to {last} are archived and read-only")
+
+    def _ledger_parts(
+        self,
+        conn: sqlite3.Connection,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+    ) -> List[tuple[str, Optional[Path]]]:
+        """Where ledger rows in the date range live, oldest first: every
+        overlapping archive as (schema, file), then ("main", None)."""
+        rows = conn.execute(
+            "SELECT year, file FROM archives "
+            "WHERE (:start IS NULL OR printf('%04d-12-31', year) >= :start) "
+            "AND (:end IS NULL OR printf('%04d-01-01', year) <= :end) "
+            "ORDER BY year",
+            {"start": start_date or None, "end": end_date or None},
+        ).fetchall()
+        parts = [
+            (f"archive_{year}", self.db_path.with_name(file)) for year, file in rows
+        ]
+        return parts + [("main", None)]
+
+    @contextmanager
+    def _attached(
+        self, conn: sqlite3.Connection, schema: str, path: Optional[Path]
+    ) -> Iterator[sqlite3.Connection]:
+        """A connection with archive ``path`` attached as ``schema``.
+
+        ATTACH is not allowed inside a transaction, so a snapshot reads the
+        archive through a connection of its own; archives never change, so
+        it sees the same rows.
+        """
+        if path is None:
+            yield conn
+            return
+        if not path.exists():
+            raise FileNotFoundError(f"Archive file {path} is missing")
+        side = self._open(readonly=True) if conn.in_transaction else None
+        target = side or conn
+        target.execute(f"ATTACH DATABASE ? AS {schema}", (str(path),))
+        try:
+            yield target
+        finally:
+            if side is not None:
+                side.close()
+            else:
+                conn.execute(f"DETACH DATABASE {schema}")
+
+    def _ledger_rows(
+        self,
+        conn: sqlite3.Connection,
+        sql: str,
+        params: list[object],
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        newest_first: bool = False,
+        limit: Optional[int] = None,
+        cache: bool = False,
+    ) -> List[sqlite3.Row]:
+        """Run ``sql`` on every ledger part overlapping the date range.
+
+        ``{schema}`` in ``sql`` names the part's schema. Parts hold disjoint
+        years, so rows are simply concatenated: per-part date order and
+        per-month groups carry over. With ``limit`` the remaining parts are
+        skipped once enough rows are in; ``cache`` keeps archive results.
+        """
+        parts = self._ledger_parts(conn, start_date, end_date)
+        if newest_first:
+            parts.reverse()
+        rows: List[sqlite3.Row] = []
+        for schema, path in parts:
+            key = (sql, tuple(params), schema)
+            if cache and key in self._archive_rows:
+                part_rows = self._archive_rows[key]
+            else:
+                with self._attached(conn, schema, path) as part_conn:
+                    part_rows = part_conn.execute(
+                        sql.format(schema=schema), params
+                    ).fetchall()
+                if cache and path is not None:
+                    self._archive_rows[key] = part_rows
+            rows.extend(part_rows)
+            if limit is not None and len(rows) >= limit:
+                break
+        return rows
+
+    # Change feed ------------------------------------------------------------
+    def list_changes(self, since: int = 0, limit: int = 100) -> dict:
+        """Change-log entries after ``since`` in seq order.
+
+        ``since=0`` always works and yields the current state of every row;
+        any other ``since`` below the retention horizon raises
+        ``ChangeLogExpiredError`` because deletes may have been dropped.
+        """
+        with self._connect() as conn:
+            horizon = conn.execute(
+                "SELECT seq FROM change_log_horizon WHERE id = 1"
+            ).fetchone()
+            if since and horizon is not None and since < horizon["seq"]:
+                raise ChangeLogExpiredError(
+                    f"since={since} is older than the retained change log; "
+                    "resync from since=0"
+                )
+            rows = conn.execute(
+                "SELECT seq, table_name, op, row_id, payload, changed_at "
+                "FROM change_log WHERE seq > ? ORDER BY seq LIMIT ?",
+                (since, limit + 1),
+            ).fetchall()
+        changes = [
+            {
+                "seq": row["seq"],
+                "table": row["table_name"],
+                "op": row["op"],
+                "row_id": row["row_id"],
+                "data": json.loads(row["payload"]) if row["payload"] else None,
+                "changed_at": row["changed_at"],
+            }
+            for row in rows[:limit]
+        ]
+        return {
+            "changes": changes,
+            "next_since": changes[-1]["seq"] if changes else since,
+            "has_more": len(rows) > limit,
+        }
+
+    def compact_changes(self, max_tombstone_age_days: Optional[int] = None) -> int:
+        """Drop superseded change-log entries; return how many were removed.
+
+        With ``max_tombstone_age_days`` delete entries older than that are
+        dropped as well and the retention horizon moves past them.
+        """
+        started = time.perf_counter()
+        with self._write() as conn:
+            removed = conn.execute(COMPACT_CHANGES).rowcount
+            if max_tombstone_age_days is not None:
+                cutoff = f"-{int(max_tombstone_age_days)} days"
+                stale = "op = 'delete' AND changed_at < datetime('now', ?)"
+                newest = conn.execute(
+                    f"SELECT MAX(seq) FROM change_log WHERE {stale}", (cutoff,)
+                ).fetchone()[0]
+                if newest is not None:
+                    removed += conn.execute(
+                        f"DELETE FROM change_log WHERE {stale}", (cutoff,)
+                    ).rowcount
+                    conn.execute(
+                        "INSERT INTO change_log_horizon (id, seq) VALUES (1, ?) "
+                        "ON CONFLICT (id) DO UPDATE SET seq = MAX(seq, excluded.seq)",
+                        (newest,),
+                    )
+        self._record_run("compact", started, {"removed": removed})
+        return removed
+
+    # Maintenance ------------------------------------------------------------
+    def analyze(self) -> dict:
+        """Refresh the query planner's statistics in ``sqlite_stat1``."""
+        started = time.perf_counter()
+        with self._write() as conn:
+            conn.execute(f"PRAGMA analysis_limit = {ANALYSIS_LIMIT}")
+            conn.execute("ANALYZE")
+            indexes = conn.execute("SELECT COUNT(*) FROM sqlite_stat1").fetchone()[0]
+        return self._record_run("analyze", started, {"indexes": indexes})
+
+    def reclaim_pages(self, max_pages: Optional[int] = None) -> dict:
+        """Give free pages back to the file system, up to ``max_pages``.
+
+        Works in write transactions of RECLAIM_STEP_PAGES pages, so other
+        writers get the lock in between. Only databases created with
+        incremental auto-vacuum, or converted by :meth:`vacuum`, can do this;
+        others just report their free pages.
+        """
+        started = time.perf_counter()
+        freed = 0
+        mode = self._auto_vacuum()
+        while mode == "incremental" and (max_pages is None or freed < max_pages):
+            step = RECLAIM_STEP_PAGES
+            if max_pages is not None:
+                step = min(step, max_pages - freed)
+            with self._write() as conn:
+                free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                if not free:
+                    break
+                # The pragma frees a page per step, but returns no columns, so
+                # sqlite3 steps it only once: run it once per page.
+                for _ in range(min(step, free)):
+                    conn.execute("PRAGMA incremental_vacuum(1)")
+                freed += free - conn.execute("PRAGMA freelist_count").fetchone()[0]
+        with self._connect() as conn:
+            if freed:
+                # The file is truncated once the WAL is copied back into it.
+                conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+            free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return self._record_run(
+            "reclaim",
+            started,
+            {"auto_vacuum": mode, "pages_freed": freed, "free_pages": free},
+        )
+
+    def vacuum(self) -> dict:
+        """Rewrite the database file compactly, with incremental auto-vacuum.
+
+        VACUUM holds the write lock until the whole file is rewritten, so this
+        is meant for the command line while the app is stopped.
+        """
+        started = time.perf_counter()
+        conn = self._open()
+        try:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        except sqlite3.OperationalError as exc:
+            if _is_busy(exc):
+                raise DatabaseBusyError(str(exc)) from exc
+            raise
+        finally:
+            conn.close()
+        return self._record_run(
+            "vacuum",
+            started,
+            {"auto_vacuum": self._auto_vacuum(), "bytes": self.db_path.stat().st_size},
+        )
+
+    def backup(
+        self, directory: Optional[Path | str] = None, keep: Optional[int] = None
+    ) -> dict:
+        """Copy the database into ``directory`` while it stays in use.
+
+        The default directory is ``backups/`` beside the database. The copy
+        runs BACKUP_STEP_PAGES pages at a time inside one read transaction.
+        Under WAL that never blocks writers, and the copy is of that one
+        snapshot; without it every commit made meanwhile would restart the
+        copy. The file is renamed into place only when complete. With
+        ``keep`` only the newest ``keep`` backups remain. Archive files don't
+        change once written and are not copied.
+        """
+        started = time.perf_counter()
+        directory = Path(directory) if directory else self.db_path.parent / "backups"
+        directory.mkdir(parents=True, exist_ok=True)
+        now = time.time()
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.gmtime(now))
+        stamp += f"-{int(now * 1000) % 1000:03d}"  # sorts by time, UTC
+        target = directory / f"{self.db_path.stem}-{stamp}.db"
+        partial = target.with_name(f".{target.name}.partial")
+        source = self._open(readonly=True)
+        try:
+            source.execute("BEGIN")
+            source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            copy = sqlite3.connect(partial)
+            try:
+                source.backup(copy, pages=BACKUP_STEP_PAGES)
+                pages = copy.execute("PRAGMA page_count").fetchone()[0]
+            finally:
+                copy.close()
+            partial.replace(target)
+        except BaseException:
+            partial.unlink(missing_ok=True)
+            raise
+        finally:
+            source.close()
+        if keep is not None:
+            # Only this database's backups: another's stem may extend this one.
+            ours = re.compile(
+                rf"{re.escape(self.db_path.stem)}-\d{{8}}-\d{{6}}-\d{{3}}\.db"
+            )
+            older = sorted(p for p in directory.iterdir() if ours.fullmatch(p.name))
+            for stale in older[: max(len(older) - keep, 0)]:
+                stale.unlink()
+        return self._record_run(
+            "backup",
+            started,
+            {"file": str(target), "pages": pages, "bytes": target.stat().st_size},
+        )
+
+    def maintenance_status(self) -> dict:
+        """File and page counts, and the last run of each maintenance task."""
+        with self._connect() as conn:
+            page_size, pages, free = (
+                conn.execute(f"PRAGMA {name}").fetchone()[0]
+                for name in ("page_size", "page_count", "freelist_count")
+            )
+            has_statistics = self._table_exists(conn, "sqlite_stat1")
+            runs = conn.execute("""
+                SELECT task, result, finished_at,
+                       (julianday('now') - julianday(finished_at)) * 86400 AS age
+                FROM maintenance_runs ORDER BY task
+                """).fetchall()
+        wal = self.db_path.with_name(f"{self.db_path.name}-wal")
+        return {
+            "auto_vacuum": self._auto_vacuum(),
+            "page_size": page_size,
+            "pages": pages,
+            "free_pages": free,
+            "file_bytes": self.db_path.stat().st_size,
+            "wal_bytes": wal.stat().st_size if wal.exists() else 0,
+            "has_statistics": has_statistics,
+            "last_runs": {
+                row["task"]: {
+                    **json.loads(row["result"]),
+                    "finished_at": row["finished_at"],
+                    "age_seconds": round(row["age"], 1),
+                }
+                for row in runs
+            },
+        }
+
+    def _auto_vacuum(self) -> str:
+        with self._connect() as conn:
+            mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+        return AUTO_VACUUM_MODES[mode]
+
+    def _record_run(self, task: str, started: float, result: dict) -> dict:
+        result = {**result, "seconds": round(time.perf_counter() - started, 3)}
+        with self._write() as conn:
+            conn.execute(
+                "INSERT INTO maintenance_runs (task, result) VALUES (?, ?) "
+                "ON CONFLICT (task) DO UPDATE SET result = excluded.result, "
+                "finished_at = excluded.finished_at",
+                (task, json.dumps(result)),
+            )
+        return {"task": task, **result}
+
     # Utility --------------------------------------------------------------
     def clear_all(self) -> None:
         """Helper used in demos/tests to wipe tables."""
         with self._connect() as conn:
-            conn.executescript(
-                """
+            conn.executescript("""
                 DELETE FROM transactions;
                 DELETE FROM income;
                 DELETE FROM accounts;
-                """
-            )
+                DELETE FROM balance_checkpoints;
+                DELETE FROM budgets;
+                DELETE FROM category_rules;
+                DELETE FROM categories;
+                DELETE FROM archives;
+                DELETE FROM import_jobs;
+                """)
             conn.commit()
+        self._category_names = {}
+        self._rules_loaded_at = float("-inf")
+        self._archive_rows = {}
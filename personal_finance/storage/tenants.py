@@ -0,0 +1,113 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Callable
+
+from personal_finance.storage.sqlite_storage import SQLiteStorage
+
+# Tenant ids become file names, so nothing that could escape the directory,
+# and nothing ending like the name of another tenant's year archive.
+TENANT_ID = re.compile(r"(?!.*-archive-\d+$)[A-Za-z0-9][A-Za-z0-9_-]{0,63}")
+
+
+def open_tenant(path: Path, reopened: bool = False) -> SQLiteStorage:
+    """Default factory: a plain storage, so a reopen has nothing to skip."""
+    return SQLiteStorage(path)
+
+
+class TenantStorages:
+    """One ``SQLiteStorage`` per tenant, each in its own directory.
+
+    A tenant's database, year archives, import spools and import leases all
+    live in ``directory/<tenant>/``, so no tenant id can name another
+    tenant's files. A tenant created before that keeps ``<tenant>.db``
+    directly in ``directory``.
+
+    A tenant's storage is opened on first use, which creates or migrates its
+    schema, and then kept in an LRU of at most ``capacity`` entries. Entries
+    idle for longer than ``idle_seconds`` are dropped on the next lookup.
+    Storages open a connection per call, so dropping one frees its caches
+    without cutting off a request still using it.
+
+    Opening happens outside the LRU's lock, so a slow open holds up only the
+    requests for that tenant, which wait for the one open in progress. A
+    tenant dropped earlier is reopened with ``factory(path, reopened=True)``,
+    so once-per-process setup can be skipped.
+    """
+
+    def __init__(
+        self,
+        directory: Path | str,
+        factory: Callable[..., SQLiteStorage] = open_tenant,
+        capacity: int = 64,
+        idle_seconds: float = 300.0,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.factory = factory
+        self.capacity = capacity
+        self.idle_seconds = idle_seconds
+        self._lock = threading.Lock()
+        # tenant -> (storage, last used); least recently used first.
+        self._open: OrderedDict[str, tuple[SQLiteStorage, float]] = OrderedDict()
+        self._opening: dict[str, Future] = {}
+        self._seen: set[str] = set()  # tenants this process has opened before
+
+    def get(self, tenant: str) -> SQLiteStorage:
+        if not TENANT_ID.fullmatch(tenant or ""):
+            raise ValueError(
+                "Tenant id must be 1-64 letters, digits, '-' or '_', "
+                "starting with a letter or digit and not ending in -archive-<year>"
+            )
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._open.pop(tenant, None)
+            if entry is not None:
+                self._open[tenant] = (entry[0], now)
+                return entry[0]
+            opening = self._opening.get(tenant)
+            if opening is None:
+                opening = self._opening[tenant] = Future()
+                reopened = tenant in self._seen
+            else:
+                reopened = None  # someone else is opening it
+        if reopened is None:
+            return opening.result()
+        try:
+            if reopened:
+                storage = self.factory(self.path(tenant), reopened=True)
+            else:
+                storage = self.factory(self.path(tenant))
+        except BaseException as exc:
+            with self._lock:
+                del self._opening[tenant]
+            opening.set_exception(exc)
+            raise
+        with self._lock:
+            del self._opening[tenant]
+            self._seen.add(tenant)
+            self._open[tenant] = (storage, time.monotonic())
+            while len(self._open) > self.capacity:
+                self._open.popitem(last=False)
+        opening.set_result(storage)
+        return storage
+
+    def path(self, tenant: str) -> Path:
+        flat = self.directory / f"{tenant}.db"
+        if flat.exists():
+            return flat
+        return self.directory / tenant / f"{tenant}.db"
+
+    def _evict_idle(self, now: float) -> None:
+        while self._open:
+            _, last_used = next(iter(self._open.values()))
+            if now - last_used <= self.idle_seconds:
+                break
+            self._open.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._open)
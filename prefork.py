@@ -0,0 +1,98 @@
+"""Stdlib-only pre-fork WSGI server.
+
+The master binds one listening socket and forks worker processes that all
+accept() on it. Each worker builds its own WSGI app (and so its own database
+handles) after the fork, and a worker that dies is replaced.
+"""
+
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+from typing import Callable
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+# A worker that dies sooner than this after starting is restarted only after
+# the same delay, so a crash at startup does not turn into a fork loop.
+RESTART_BACKOFF = 1.0
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def _run_worker(sock: socket.socket, app_factory: Callable) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    app = app_factory()
+    host, port = sock.getsockname()[:2]
+    httpd = WSGIServer((host, port), _QuietHandler, bind_and_activate=False)
+    httpd.socket.close()
+    httpd.socket = sock
+    httpd.server_name = host
+    httpd.server_port = port
+    httpd.setup_environ()
+    httpd.set_app(app)
+    httpd.serve_forever()
+
+
+def serve(
+    app_factory: Callable,
+    host: str = "127.0.0.1",
+    port: int = 5000,
+    workers: int | None = None,
+) -> None:
+    """Serve ``app_factory()`` from ``workers`` processes until SIGINT/SIGTERM."""
+    workers = workers or os.cpu_count() or 1
+    sock = socket.create_server((host, port), backlog=1024)
+    # Idle workers all wake on a new connection; non-blocking accept lets the
+    # losers go back to waiting instead of blocking in accept().
+    sock.setblocking(False)
+    children: dict[int, float] = {}
+    stopping = False
+
+    def spawn() -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                _run_worker(sock, app_factory)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = time.monotonic()
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    for _ in range(workers):
+        spawn()
+    print(f"Serving on http://{host}:{port} with {workers} workers", file=sys.stderr)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+        code = os.waitstatus_to_exitcode(status)
+        print(f"worker {pid} exited with {code}; restarting", file=sys.stderr)
+        if time.monotonic() - started < RESTART_BACKOFF:
+            time.sleep(RESTART_BACKOFF)
+        spawn()
+    sock.close()
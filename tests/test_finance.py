@@ -1,3 +1,5 @@
+import sqlite3
+
 import pytest
 
 from personal_finance.managers.account_manager import AccountManager
@@ -9,8 +11,13 @@ from personal_finance.models.transaction import ExpenseTransaction
 from personal_finance.models.budget import Budget
 
 from personal_finance.storage.csv_storage import save_accounts, load_accounts
+from personal_finance.storage.sqlite_storage import ChangeLogExpiredError, SQLiteStorage
+from personal_finance.storage.tenants import TenantStorages
+from personal_finance.analytics import forecast_series
 from personal_finance.exceptions import ValidationError, NotFoundError
 
+from app import create_app
+
 
 def test_add_account_unit():
     """Unit test: adding a single account."""
@@ -62,3 +69,1055 @@ def test_budget_status_with_expense():
     spent, remaining = bud_mgr.check_budget_status("2025-11", "food")
     assert spent == 50.0
     assert remaining == 150.0
+
+
+def test_forecast_series_fills_gaps_and_fits_all_series(tmp_path):
+    storage = SQLiteStorage(tmp_path / "finance.db")
+    acc = storage.create_account("Wallet", "HUF")
+    storage.create_transaction(acc["id"], "2025-01-10", 100, "expense", "food")
+    storage.create_transaction(acc["id"], "2025-03-10", 300, "expense", "food")
+    storage.create_transaction(acc["id"], "2025-02-03", 50, "expense", "rent")
+
+    rows = storage.monthly_totals(kind="expenses", group_by="category")
+    result = forecast_series(rows, months_ahead=1)
+
+    assert result["months"] == ["2025-01", "2025-02", "2025-03"]
+    food, rent = result["series"]
+    assert food["key"] == "food"
+    assert [h["amount"] for h in food["history"]] == [100.0, 0.0, 300.0]
+    assert food["forecast"] == [{"month": "2025-04", "predicted_amount": 333.33}]
+    assert [h["amount"] for h in rent["history"]] == [0.0, 50.0, 0.0]
+
+
+def test_balance_checkpoints_follow_backdated_writes(tmp_path):
+    storage = SQLiteStorage(tmp_path / "finance.db")
+    acc = storage.create_account("Wallet", "HUF")
+    storage.create_income(acc["id"], "2025-01-05", 1000, "salary")
+    storage.create_transaction(acc["id"], "2025-03-10", 200, "expense", "food")
+    late = storage.create_transaction(acc["id"], "2025-02-15", 50, "expense", "fuel")
+
+    assert storage.balance_at(acc["id"], "2025-02-14")["balance"] == 1000.0
+    assert storage.balance_at(acc["id"], "2025-03-31")["balance"] == 750.0
+
+    storage.delete_transaction(late["id"])
+    series = storage.balance_series(acc["id"], "2025-01-01", "2025-04-10")
+    assert series["points"] == [
+        {"date": "2025-01-31", "balance": 1000.0},
+        {"date": "2025-02-28", "balance": 1000.0},
+        {"date": "2025-03-31", "balance": 800.0},
+        {"date": "2025-04-10", "balance": 800.0},
+    ]
+
+
+def test_transaction_manager_date_range_index():
+    acc_mgr = AccountManager()
+    acc_mgr.add_account(Account("A1", "Wallet", "cash", "HUF"))
+    acc_mgr.add_account(Account("A2", "Bank", "bank", "HUF"))
+    tr_mgr = TransactionManager(acc_mgr)
+    tr_mgr.create_transaction(
+        "T1", "A1", "2025-11-10", 50.0, "Lunch", "food", "expense"
+    )
+    tr_mgr.create_transaction(
+        "T2", "A2", "2025-11-01", 900.0, "Pay", "salary", "income"
+    )
+    tr_mgr.create_transaction(
+        "T3", "A1", "2025-11-03", 20.0, "Bus", "travel", "expense"
+    )
+
+    early = tr_mgr.list_between("2025-11-01", "2025-11-05")
+    assert [t.id for t in early] == ["T2", "T3"]
+    assert tr_mgr.sum_between("2025-11-01", "2025-11-30") == 830.0
+    assert tr_mgr.sum_between("2025-11-01", "2025-11-30", account_id="A1") == -70.0
+
+    tr_mgr.update_transaction("T1", date="2025-12-01", amount=10.0)
+    tr_mgr.delete_transaction("T3")
+    assert tr_mgr.sum_between("2025-11-01", "2025-11-30", account_id="A1") == 0.0
+    moved = tr_mgr.list_between("2025-11-01", "2025-12-31")
+    assert [t.id for t in moved] == ["T2", "T1"]
+
+
+def test_fx_conversion_uses_rate_in_effect_on_each_date(tmp_path):
+    rates = tmp_path / "fx_rates.csv"
+    rates.write_text(
+        "currency,date,rate\n"
+        "EUR,2025-01-01,1.0\n"
+        "USD,2025-01-01,0.5\n"
+        "USD,2025-02-01,0.8\n"
+    )
+    storage = SQLiteStorage(tmp_path / "finance.db")
+    assert storage.load_fx_rates(rates) == 3
+    eur = storage.create_account("Euro", "EUR")
+    usd = storage.create_account("Dollar", "USD")
+    storage.create_income(eur["id"], "2025-01-10", 100, "salary")
+    storage.create_income(usd["id"], "2025-01-20", 100, "salary")
+    storage.create_income(usd["id"], "2025-02-05", 100, "salary")
+
+    monthly = storage.monthly_income(base_currency="EUR")
+    assert monthly == [
+        {"month": "2025-01", "income": 150.0},
+        {"month": "2025-02", "income": 80.0},
+    ]
+    balance = storage.balance_at(usd["id"], "2025-02-10", base_currency="eur")
+    assert balance["balance"] == 160.0
+
+    with pytest.raises(ValueError):
+        storage.monthly_income(base_currency="GBP")
+
+
+def test_full_text_search_prefix_ranking_and_pagination(tmp_path):
+    storage = SQLiteStorage(tmp_path / "finance.db")
+    acc = storage.create_account("Wallet", "HUF")
+    storage.create_transaction(acc["id"], "2025-01-02", 9, "expense", "food", "Tesco")
+    storage.create_transaction(acc["id"], "2025-01-09", 4, "expense", "food", "Tesco")
+    storage.create_transaction(acc["id"], "2025-02-01", 7, "expense", "fuel", "Shell")
+    storage.create_income(acc["id"], "2025-01-31", 900, "Tesco payroll")
+
+    first = storage.search("tes", limit=2)
+    assert len(first["results"]) == 2
+    second = storage.search("tes", limit=2, cursor=first["next_cursor"])
+    assert second["next_cursor"] is None
+    hits = first["results"] + second["results"]
+    assert sorted((h["kind"], h["id"]) for h in hits) == [
+        ("income", 1),
+        ("transaction", 1),
+        ("transaction", 2),
+    ]
+
+    # Words may match the note and the category name of the same row.
+    mixed = storage.search("tesco fo")["results"]
+    assert [(h["kind"], h["id"]) for h in mixed] == [
+        ("transaction", 1),
+        ("transaction", 2),
+    ]
+    assert storage.search("shell food")["results"] == []
+
+    storage.delete_transaction(2)
+    ranged = storage.search("tesco", start_date="2025-01-05", end_date="2025-01-31")
+    assert [(h["kind"], h["id"]) for h in ranged["results"]] == [("income", 1)]
+
+
+def test_categories_are_normalized_and_renamed_in_one_place(tmp_path):
+    storage = SQLiteStorage(tmp_path / "finance.db")
+    acc = storage.create_account("Wallet", "HUF")
+    storage.create_transaction(acc["id"], "2025-01-02", 10, "expense", " food ")
+    storage.create_transaction(acc["id"], "2025-01-03", 5, "expense", "food")
+    storage.create_transaction(acc["id"], "2025-01-04", 7, "expense", "")
+
+    categories = storage.list_categories()
+    assert [c["name"] for c in categories] == ["food"]
+    assert storage.category_totals("transactions") == {
+        "food": -15.0,
+        "uncategorized": -7.0,
+    }
+
+    other_process = SQLiteStorage(tmp_path / "finance.db")
+    other_process.list_transactions()  # caches "food" under its old id
+    with sqlite3.connect(tmp_path / "finance.db") as conn:
+        documents = conn.execute("SELECT * FROM transactions_fts").fetchall()
+    storage.rename_category(categories[0]["id"], "groceries")
+    with sqlite3.connect(tmp_path / "finance.db") as conn:
+        # Ledger documents hold the category's id: a rename leaves them alone.
+        assert conn.execute("SELECT * FROM transactions_fts").fetchall() == documents
+    listed = storage.list_transactions()
+    assert [t["category"] for t in listed] == ["groceries", "groceries", ""]
+    assert storage.search("groc")["results"][0]["category"] == "groceries"
+    assert storage.search("food")["results"] == []
+
+    other_process.create_transaction(acc["id"], "2025-01-05", 3, "expense", "food")
+    assert storage.category_totals("transactions") == {
+        "groceries": -15.0,
+        "food": -3.0,
+        "uncategorized": -7.0,
+    }
+
+
+def test_cashflow_merges_ledgers_and_zero_fills_periods(tmp_path):
+    storage = SQLiteStorage(tmp_path / "finance.db")
+    acc = storage.create_account("Wallet", "HUF")
+    storage.create_income(acc["id"], "2025-01-05", 1000, "salary")
+    storage.create_transaction(acc["id"], "2025-01-20", 200, "expense", "food")
+    storage.create_transaction(acc["id"], "2025-03-02", 50, "income", "refund")
+
+    periods = storage.cashflow("2025-01-01", "2025-03-31")
+    assert periods == [
+        {
+            "period": "2025-01",
+            "income": 1000.0,
+            "expenses": 200.0,
+            "net": 800.0,
+            "cumulative": 800.0,
+        },
+        {
+            "period": "2025-02",
+            "income": 0.0,
+            "expenses": 0.0,
+            "net": 0.0,
+            "cumulative": 800.0,
+        },
+        {
+            "period": "2025-03",
+            "income": 50.0,
+            "expenses": 0.0,
+            "net": 50.0,
+            "cumulative": 850.0,
+        },
+    ]
+    weeks = storage.cashflow("2025-01-01", "2025-01-20", group="week")
+    assert [w["period"] for w in weeks] == [
+        "2024-12-30",
+        "2025-01-06",
+        "2025-01-13",
+        "2025-01-20",
+    ]
+    assert weeks[0]["income"] == 1000.0 and weeks[-1]["expenses"] == 200.0
+
+
+def test_snapshot_reads_share_one_read_only_connection(tmp_path):
+    storage = SQLiteStorage(tmp_path / "finance.db")
+    acc = storage.create_account("Wallet", "HUF")
+    for day in ("01", "02", "03"):
+        storage.create_income(acc["id"], f"2025-01-{day}", 10, "salary")
+
+    with storage.snapshot():
+        recent = storage.list_income(limit=2, newest_first=True)
+        assert storage._connect() is storage._connect()
+        with pytest.raises(sqlite3.OperationalError):
+            storage.create_account("Other", "EUR")
+    assert [row["date"] for row in recent] == ["2025-01-03", "2025-01-02"]
+    assert len(storage.list_accounts()) == 1
+
+
+def test_keyset_paging_walks_history_and_polls_new_rows(tmp_path):
+    storage = SQLiteStorage(tmp_path / "finance.db")
+    acc = storage.create_account("Wallet", "HUF")
+    for day in ("03", "01", "03", "02"):
+        storage.create_transaction(acc["id"], f"2025-01-{day}", 5, "expense", "", "")
+
+    first = storage.list_transactions(limit=2, newest_first=True)
+    assert [(r["date"], r["id"]) for r in first] == [
+        ("2025-01-03", 3),
+        ("2025-01-03", 1),
+    ]
+    rest = storage.list_transactions(limit=2, before=("2025-01-03", 1))
+    assert [r["id"] for r in rest] == [4, 2]
+
+    storage.create_transaction(acc["id"], "2024-12-31", 5, "expense", "", "")
+    assert [r["id"] for r in storage.list_transactions(after_id=4)] == [5]
+
+
+def test_change_feed_compacts_and_expires_stale_consumers(tmp_path):
+    storage = SQLiteStorage(tmp_path / "finance.db")
+    acc = storage.create_account("Wallet", "HUF")
+    tx = storage.create_transaction(acc["id"], "2025-01-02", 9, "expense", "food", "")
+    storage.rename_category(storage.list_categories()[0]["id"], "groceries")
+    storage.delete_transaction(tx["id"])
+
+    feed = storage.list_changes(since=0, limit=2)
+    assert feed["has_more"] and feed["next_since"] == 2
+    changes = storage.list_changes(since=1)["changes"]
+    assert [(c["table"], c["op"]) for c in changes] == [
+        ("categories", "insert"),
+        ("transactions", "insert"),
+        ("categories", "update"),  # one entry for the rename, not one per row
+        ("transactions", "delete"),
+    ]
+    assert changes[1]["data"]["category_id"] == changes[2]["row_id"]
+    assert changes[2]["data"]["name"] == "groceries"
+
+    assert storage.compact_changes() == 2
+    with sqlite3.connect(tmp_path / "finance.db") as conn:
+        conn.execute("UPDATE change_log SET changed_at = '2000-01-01'")
+    storage.compact_changes(max_tombstone_age_days=30)
+    tables = [c["table"] for c in storage.list_changes()["changes"]]
+    assert tables == ["accounts", "categories"]
+    with pytest.raises(ChangeLogExpiredError):
+        storage.list_changes(since=1)
+
+
+def test_create_app_gives_each_app_its_own_storage(tmp_path):
+    first = create_app({"DATABASE": tmp_path / "a.db", "FX_RATES_PATH": None})
+    second = create_app({"DATABASE": tmp_path / "b.db", "FX_RATES_PATH": None})
+    assert not first.debug
+
+    created = first.test_client().post(
+        "/accounts", json={"name": "Wallet", "currency": "EUR"}
+    )
+    assert created.status_code == 201
+    assert len(first.test_client().get("/accounts").json) == 1
+    assert second.test_client().get("/accounts").json == []
+    assert first.extensions["storage"].db_path == tmp_path / "a.db"
+
+
+def test_metrics_endpoint_reports_routes_and_query_shapes(tmp_path):
+    config = {"DATABASE": tmp_path / "a.db", "FX_RATES_PATH": None}
+    assert create_app(config).test_client().get("/metrics").status_code == 404
+
+    client = create_app({**config, "METRICS_ENABLED": True}).test_client()
+    client.post("/accounts", json={"name": "Wallet", "currency": "EUR"})
+    client.get("/accounts/1/balance")
+    client.get("/accounts/2/balance")
+    text = client.get("/metrics").get_data(as_text=True)
+
+    route = 'method="GET",route="/accounts/<int:account_id>/balance"'
+    assert f"http_request_duration_seconds_count{{{route}}} 2" in text
+    assert f'http_requests_total{{{route},status="400"}} 1' in text
+    lookup = 'query="SELECT id FROM accounts WHERE id = ?"'
+    assert f"sqlite_queries_total{{{lookup}}} 2" in text
+    assert f"sqlite_query_rows_total{{{lookup}}} 1" in text
+
+
+def test_profiling_needs_token_and_rotates_files(tmp_path):
+    app = create_app(
+        {
+            "DATABASE": tmp_path / "a.db",
+            "FX_RATES_PATH": None,
+            "PROFILE_DIR": tmp_path / "profiles",
+            "PROFILE_TOKEN": "s3cret",
+            "PROFILE_KEEP": 1,
+        }
+    )
+    client = app.test_client()
+    assert "X-Profile-File" not in client.get("/health").headers
+    assert "X-Profile-File" not in client.get(
+        "/health", headers={"X-Profile-Token": "wrong"}
+    ).headers
+
+    names = [
+        client.get("/stats/summary", headers={"X-Profile-Token": "s3cret"}).headers[
+            "X-Profile-File"
+        ]
+        for _ in range(2)
+    ]
+    assert "stats_summary" in names[0]
+    assert [p.name for p in (tmp_path / "profiles").iterdir()] == [names[1]]
+
+
+def test_slow_query_log_captures_params_and_plan(tmp_path):
+    storage = SQLiteStorage(tmp_path / "finance.db", slow_query_ms=0)
+    acc = storage.create_account("Wallet", "HUF")
+    storage.list_transactions(start_date="2025-01-01", account_id=acc["id"])
+
+    entry = next(
+        e
+        for e in storage.slow_queries.entries
+        if e["sql"].startswith("SELECT id, account_id, date")
+    )
+    assert entry["params"] == ["2025-01-01", acc["id"]]
+    assert entry["ms"] >= 0
+    assert any("idx_transactions_account_date" in step for step in entry["plan"])
+
+
+def test_benchmark_ledger_generator_is_seeded_and_seasonal():
+    from benchmarks.generate import generate_ledger
+
+    first = generate_ledger(20_000, seed=7)
+    transactions = list(first.transactions)
+    assert transactions == list(generate_ledger(20_000, seed=7).transactions)
+    assert list(first.income) == list(generate_ledger(20_000, seed=7).income)
+    assert len(transactions) == 20_000
+
+    heating = {"01": [], "07": []}
+    for _, day, amount, _, category, _ in transactions:
+        if category == "heating" and day[5:7] in heating:
+            heating[day[5:7]].append(-amount)
+    winter, summer = (sum(v) / len(v) for v in heating.values())
+    assert winter > 3 * summer
+
+
+def test_write_lock_contention_retries_then_returns_503(tmp_path, monkeypatch):
+    import personal_finance.storage.sqlite_storage as sqlite_storage
+
+    monkeypatch.setattr(sqlite_storage, "BUSY_TIMEOUT", 0.01)
+    monkeypatch.setattr(sqlite_storage, "BUSY_BACKOFF", 0.001)
+    app = create_app({"DATABASE": tmp_path / "finance.db", "FX_RATES_PATH": None})
+    client = app.test_client()
+    holder = sqlite3.connect(tmp_path / "finance.db", isolation_level=None)
+    holder.execute("BEGIN IMMEDIATE")
+
+    response = client.post("/accounts", json={"name": "Wallet", "currency": "HUF"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert client.get("/accounts").status_code == 200  # WAL readers still get in
+
+    holder.rollback()
+    response = client.post("/accounts", json={"name": "Wallet", "currency": "HUF"})
+    assert response.status_code == 201
+
+
+def test_archived_year_is_attached_only_for_its_dates(tmp_path):
+    storage = SQLiteStorage(tmp_path / "finance.db")
+    acc = storage.create_account("Wallet", "HUF")["id"]
+    for day in ("2019-03-10", "2019-11-02", "2020-01-15", "2024-06-01"):
+        storage.create_transaction(acc, day, 10, "expense", "food")
+        storage.create_income(acc, day, 100, "salary")
+    everything = storage.list_transactions()
+    incomes = storage.monthly_income()
+    balance = storage.balance_at(acc, "2019-11-30")
+    seq = storage.list_changes(limit=1000)["next_since"]
+
+    with pytest.raises(ValueError):
+        storage.archive_year(2020)  # 2019 is still live
+    assert storage.archive_year(2019) == {
+        "year": 2019,
+        "file": "finance-archive-2019.db",
+        "transactions": 2,
+        "income": 2,
+    }
+    assert (tmp_path / "finance-archive-2019.db").exists()
+    assert storage.list_transactions() == everything
+    assert storage.monthly_income() == incomes
+    assert storage.balance_at(acc, "2019-11-30") == balance
+    assert storage.list_transactions(limit=2, before=("2020-01-15", 0)) == [
+        everything[1],
+        everything[0],
+    ]
+    assert storage.list_changes(since=seq)["changes"] == []
+    with pytest.raises(ValueError):
+        storage.create_transaction(acc, "2019-12-31", 5, "expense")
+
+    (tmp_path / "finance-archive-2019.db").rename(tmp_path / "moved.db")
+    assert len(storage.list_transactions(start_date="2020-01-01")) == 2
+    with pytest.raises(FileNotFoundError):
+        storage.list_transactions(start_date="2019-06-01")
+
+
+def test_tenants_get_separate_databases_from_a_bounded_lru(tmp_path):
+    app = create_app(
+        {"TENANT_DIR": tmp_path, "TENANT_CACHE_SIZE": 1, "FX_RATES_PATH": None}
+    )
+    client = app.test_client()
+    for tenant, name in (("alice", "Wallet"), ("bob", "Card")):
+        response = client.post(
+            "/accounts",
+            json={"name": name, "currency": "EUR"},
+            headers={"X-Tenant": tenant},
+        )
+        assert response.status_code == 201
+    alice = client.get("/accounts", headers={"X-Tenant": "alice"}).get_json()
+    assert [a["name"] for a in alice] == ["Wallet"]
+    assert sorted(p.name for p in tmp_path.glob("*/*.db")) == ["alice.db", "bob.db"]
+    assert len(app.extensions["tenants"]) == 1
+
+    assert client.get("/accounts").status_code == 400
+    assert client.get("/accounts", headers={"X-Tenant": "../x"}).status_code == 400
+    assert client.get("/health").status_code == 200
+
+    tenants = TenantStorages(tmp_path, idle_seconds=0)
+    first = tenants.get("alice")
+    tenants.get("bob")
+    assert len(tenants) == 1 and tenants.get("alice") is not first
+
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    opened, release = [], threading.Event()
+
+    def slow_open(path, reopened=False):
+        opened.append((path.stem, reopened))
+        if path.stem == "slow":
+            release.wait(5)
+        return SQLiteStorage(path)
+
+    tenants = TenantStorages(tmp_path, slow_open, capacity=2)
+    tenants.get("alice")
+    with ThreadPoolExecutor(2) as pool:
+        waiting = [pool.submit(tenants.get, "slow") for _ in range(2)]
+        while ("slow", False) not in opened:
+            time.sleep(0.01)
+        started = time.monotonic()
+        tenants.get("alice")  # not held up by the open in progress
+        assert time.monotonic() - started < 1
+        release.set()
+        assert waiting[0].result() is waiting[1].result()
+    tenants.get("bob")  # evicts alice
+    tenants.get("alice")
+    assert opened == [
+        ("alice", False),
+        ("slow", False),
+        ("bob", False),
+        ("alice", True),
+    ]
+
+
+def test_tenant_ids_cannot_open_another_tenants_files(tmp_path):
+    # alice predates tenant directories: her files sit in the shared directory.
+    legacy = SQLiteStorage(tmp_path / "alice.db")
+    acc = legacy.create_account("Wallet", "EUR")["id"]
+    for day in ("2019-03-10", "2020-01-15"):
+        legacy.create_transaction(acc, day, 10, "expense", "food")
+    legacy.archive_year(2019)
+    archive = tmp_path / "alice-archive-2019.db"
+    before = archive.read_bytes()
+
+    app = create_app({"TENANT_DIR": tmp_path, "FX_RATES_PATH": None})
+    client = app.test_client()
+    for _ in range(2):  # the first would migrate it, the second read from it
+        response = client.get(
+            "/transactions", headers={"X-Tenant": "alice-archive-2019"}
+        )
+        assert response.status_code == 400
+    assert archive.read_bytes() == before
+    rows = client.get("/transactions", headers={"X-Tenant": "alice"}).get_json()
+    assert [r["date"] for r in rows] == ["2019-03-10", "2020-01-15"]
+
+    # A new tenant's archives stay in its own directory.
+    tenants = app.extensions["tenants"]
+    bob = tenants.get("bob")
+    acc = bob.create_account("Card", "EUR")["id"]
+    bob.create_transaction(acc, "2019-05-01", 5, "expense")
+    bob.create_transaction(acc, "2020-05-01", 5, "expense")
+    assert bob.archive_year(2019)["file"] == "bob-archive-2019.db"
+    assert (tmp_path / "bob" / "bob-archive-2019.db").exists()
+    assert not list(tmp_path.glob("bob-*"))
+
+
+def test_budget_status_groups_every_budget_of_the_month(tmp_path):
+    from personal_finance.storage.sqlite_storage import BUDGET_STATUS
+
+    app = create_app({"DATABASE": tmp_path / "finance.db", "FX_RATES_PATH": None})
+    client = app.test_client()
+    acc = client.post("/accounts", json={"name": "W", "currency": "EUR"}).get_json()
+    for day, amount, kind, category in (
+        ("2025-03-02", 40, "expense", "food"),
+        ("2025-03-20", 25.5, "expense", "food"),
+        ("2025-03-05", 500, "income", "food"),
+        ("2025-04-01", 99, "expense", "food"),
+        ("2025-03-09", 12, "expense", "fun"),
+    ):
+        client.post(
+            "/transactions",
+            json={
+                "account_id": acc["id"],
+                "date": day,
+                "amount": amount,
+                "type": kind,
+                "category": category,
+            },
+        )
+    for category, limit in (("food", 100), ("fun", 10), ("rent", 800)):
+        response = client.post(
+            "/budgets",
+            json={"month": "2025-03", "category": category, "limit_amount": limit},
+        )
+        assert response.status_code == 201
+    duplicate = {"month": "2025-03", "category": "food", "limit_amount": 1}
+    assert client.post("/budgets", json=duplicate).status_code == 400
+
+    status = client.get("/budgets/status?month=2025-03").get_json()
+    assert [(b["category"], b["spent"], b["remaining"]) for b in status["budgets"]] == [
+        ("food", 65.5, 34.5),
+        ("fun", 12.0, -2.0),
+        ("rent", 0.0, 800.0),
+    ]
+    assert status["totals"] == {"limit_amount": 910.0, "spent": 77.5, "remaining": 832.5}
+
+    storage = app.extensions["storage"]
+    with storage._connect() as conn:
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN " + BUDGET_STATUS.format(schema="main"),
+            {"month": "2025-03"},
+        ).fetchall()
+    assert any("idx_transactions_month_category" in row[3] for row in plan)
+
+
+def test_generated_bucket_columns_are_added_and_indexed(tmp_path):
+    db = tmp_path / "finance.db"
+    storage = SQLiteStorage(db)
+    acc = storage.create_account("W", "EUR")
+    for day, amount in (("2024-12-30", 10), ("2025-01-01", 20), ("2025-01-06", 5)):
+        storage.create_income(acc["id"], day, amount, "salary")
+    # Turn it back into a database from before the bucket columns.
+    with storage._connect() as conn:
+        conn.execute("DROP INDEX idx_transactions_month_category")
+        conn.execute("DROP INDEX idx_income_month_source")
+        for table in ("transactions", "income"):
+            conn.execute(f"ALTER TABLE {table} DROP COLUMN month")
+            conn.execute(f"ALTER TABLE {table} DROP COLUMN day")
+        conn.execute(
+            "CREATE INDEX idx_transactions_month_category "
+            "ON transactions(substr(date, 1, 7), category_id, amount) "
+            "WHERE type = 'expense'"
+        )
+
+    storage = SQLiteStorage(db)
+    with storage._connect() as conn:
+        rows = conn.execute(
+            "SELECT date, month, day FROM income ORDER BY id"
+        ).fetchall()
+        assert [tuple(r) for r in rows] == [
+            ("2024-12-30", "2024-12", 20087),
+            ("2025-01-01", "2025-01", 20089),
+            ("2025-01-06", "2025-01", 20094),
+        ]
+        index = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE name = ?",
+            ("idx_transactions_month_category",),
+        ).fetchone()[0]
+        assert "substr" not in index
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT month, SUM(amount) FROM income "
+            "GROUP BY month ORDER BY month"
+        ).fetchall()
+    assert [row[3] for row in plan] == [
+        "SCAN income USING INDEX idx_income_month_source"
+    ]
+
+    assert storage.monthly_income() == [
+        {"month": "2024-12", "income": 10.0},
+        {"month": "2025-01", "income": 25.0},
+    ]
+    weeks = storage.cashflow("2024-12-30", "2025-01-12", group="week")
+    assert [(w["period"], w["income"]) for w in weeks] == [
+        ("2024-12-30", 30.0),
+        ("2025-01-06", 5.0),
+    ]
+
+
+def test_import_runs_in_background_chunks_and_reports_row_errors(
+    tmp_path, monkeypatch
+):
+    app = create_app(
+        {
+            "DATABASE": tmp_path / "finance.db",
+            "FX_RATES_PATH": None,
+            "IMPORT_CHUNK_ROWS": 2,
+        }
+    )
+    client = app.test_client()
+    acc = client.post("/accounts", json={"name": "W", "currency": "EUR"}).get_json()
+    body = (
+        "account_id,date,amount,type,category,note\n"
+        f"{acc['id']},2025-02-01,12.5,expense,food,lunch\n"
+        f"{acc['id']},2025-02-02,bad,expense,food,\n"
+        f"{acc['id']},2025-02-03,100,income,,refund\n"
+        "999,2025-02-04,5,expense,food,\n"
+        f"{acc['id']},2025-02-05,7,expense,fun,\n"
+    )
+    response = client.post("/imports", data=body, content_type="text/csv")
+    assert response.status_code == 202
+    job = response.get_json()
+    assert response.headers["Location"] == f"/imports/{job['id']}"
+    assert job["total_rows"] == 5
+
+    app.extensions["imports"].shutdown()  # waits for the job
+    job = client.get(f"/imports/{job['id']}").get_json()
+    assert job["status"] == "done"
+    assert (job["rows_read"], job["rows_imported"], job["rows_failed"]) == (5, 3, 2)
+    assert job["progress"] == 1.0
+    assert job["errors"] == [
+        {"line": 3, "error": "amount must be a number"},
+        {"line": 5, "error": "Account 999 does not exist"},
+    ]
+    rows = client.get("/transactions").get_json()
+    assert [(r["date"], r["amount"], r["category"]) for r in rows] == [
+        ("2025-02-01", -12.5, "food"),
+        ("2025-02-03", 100.0, ""),
+        ("2025-02-05", -7.0, "fun"),
+    ]
+    assert not list(tmp_path.glob("*-import-*.csv"))
+    # The process's lease went with its last job.
+    assert not list(tmp_path.glob("import-owner-*.lock"))
+
+    # A queued job that is cancelled never starts.
+    storage = app.extensions["storage"]
+    queued = storage.create_import_job("finance-import-x.csv", 10, 1)
+    assert client.delete(f"/imports/{queued['id']}").get_json()["status"] == (
+        "cancelled"
+    )
+    assert not storage.start_import_job(queued["id"])
+    assert client.get("/imports/12345").status_code == 400
+
+    import io
+
+    from personal_finance.storage.imports import ImportQueue
+    from personal_finance.storage.sqlite_storage import DatabaseBusyError
+
+    def busy(*args, **kwargs):
+        raise DatabaseBusyError("database is locked")
+
+    monkeypatch.setattr(storage, "create_import_job", busy)
+    with pytest.raises(DatabaseBusyError):
+        ImportQueue().submit(storage, io.BytesIO(body.encode()))
+    assert not list(tmp_path.glob("*-import-*.csv"))
+    assert not list(tmp_path.glob("import-owner-*.lock"))
+
+
+def test_backup_retention_keeps_other_databases_backups(tmp_path):
+    import time
+    from pathlib import Path
+
+    # Tenants share BACKUP_DIR, and "acme-eu" starts with "acme".
+    backups = tmp_path / "bk"
+    acme = SQLiteStorage(tmp_path / "acme" / "acme.db")
+    acme_eu = SQLiteStorage(tmp_path / "acme-eu" / "acme-eu.db")
+    files = []
+    for storage in (acme_eu, acme_eu, acme, acme):
+        time.sleep(0.002)  # backups are named to the millisecond
+        files.append(Path(storage.backup(backups, keep=1)["file"]))
+    assert sorted(backups.iterdir()) == sorted([files[1], files[3]])
+
+
+def test_recover_fails_only_jobs_whose_owner_exited(tmp_path):
+    import subprocess
+    import sys
+    from pathlib import Path
+
+    from personal_finance.storage import imports
+
+    storage = SQLiteStorage(tmp_path / "finance.db")
+    holder = (
+        "import sys; from pathlib import Path; "
+        "from personal_finance.storage import imports; "
+        "print(imports._hold_lease(Path(sys.argv[1])), flush=True); sys.stdin.read()"
+    )
+    other = subprocess.Popen(
+        [sys.executable, "-c", holder, str(tmp_path)],
+        cwd=Path(__file__).resolve().parent.parent,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    token = other.stdout.readline().strip()
+    # Every job claims PID 1, which os.kill(pid, 0) reports alive forever.
+    live = storage.create_import_job("finance-import-a.csv", 10, 1, owner=token)
+    gone = storage.create_import_job("finance-import-b.csv", 10, 1, owner="gone")
+    ours = storage.create_import_job(
+        "finance-import-c.csv", 10, 1, owner=imports._hold_lease(tmp_path)
+    )
+    queue = imports.ImportQueue(workers=1)
+    assert queue.recover(storage) == 1
+    assert storage.get_import_job(gone["id"])["status"] == "failed"
+    assert storage.get_import_job(live["id"])["status"] == "queued"
+
+    other.stdin.close()  # the process exits and its lock goes with it
+    other.wait()
+    assert queue.recover(storage) == 1
+    assert storage.get_import_job(live["id"])["status"] == "failed"
+    assert storage.get_import_job(ours["id"])["status"] == "queued"
+    leases = [p.name for p in tmp_path.glob("import-owner-*.lock")]
+    assert leases == [imports.LEASE_NAME.format(imports._token)]
+    queue.shutdown()
+
+
+def test_dedup_key_skips_or_rejects_repeated_transactions(tmp_path):
+    app = create_app(
+        {
+            "DATABASE": tmp_path / "finance.db",
+            "FX_RATES_PATH": None,
+            "IMPORT_WORKERS": 1,  # the statements are imported in order
+        }
+    )
+    client = app.test_client()
+    acc = client.post("/accounts", json={"name": "W", "currency": "EUR"}).get_json()
+    tx = {
+        "account_id": acc["id"],
+        "date": "2025-02-01",
+        "amount": 9.5,
+        "type": "expense",
+        "category": "food",
+        "note": "Corner  Shop",
+    }
+    first = client.post("/transactions", json={**tx, "on_duplicate": "skip"})
+    assert first.status_code == 201 and first.get_json()["duplicate"] is False
+    again = client.post(
+        "/transactions",
+        json={**tx, "note": "corner shop", "category": "", "on_duplicate": "skip"},
+    )
+    assert again.status_code == 200
+    assert again.get_json()["id"] == first.get_json()["id"]
+    rejected = client.post("/transactions", json={**tx, "on_duplicate": "error"})
+    assert rejected.status_code == 409
+    # Without a policy nothing is checked, as before.
+    assert client.post("/transactions", json=tx).status_code == 201
+
+    statement = "account_id,date,amount,type,note\n" + "".join(
+        f"{acc['id']},2025-03-0{day},{amount},expense,{note}\n"
+        for day, amount, note in (
+            (1, 4, "bus"),
+            (1, 4, "bus"),  # a genuine repeat within the statement
+            (2, 30, "gym"),
+        )
+    )
+    queue = app.extensions["imports"]
+    ids = []
+    for body in (statement, statement + f"{acc['id']},2025-03-03,8,expense,cafe\n"):
+        response = client.post(
+            "/imports?on_duplicate=skip", data=body, content_type="text/csv"
+        )
+        ids.append(response.get_json()["id"])
+    queue.shutdown()
+    jobs = [client.get(f"/imports/{job_id}").get_json() for job_id in ids]
+    assert [(j["rows_imported"], j["rows_skipped"]) for j in jobs] == [(3, 0), (1, 3)]
+    assert len(client.get("/transactions?from=2025-03-01").get_json()) == 4
+
+    storage = app.extensions["storage"]
+    with storage._connect() as conn:
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM transactions WHERE dedup_key = ?",
+            (b"x",),
+        ).fetchall()
+    assert "idx_transactions_dedup" in plan[0][3]
+
+
+def test_rules_categorize_on_ingest_and_backfill(tmp_path):
+    storage = SQLiteStorage(tmp_path / "finance.db")
+    acc = storage.create_account("W", "EUR")
+    old = storage.create_transaction(
+        acc["id"], "2025-01-02", 3, "expense", note="BUS 42"
+    )
+    storage.create_rule("keyword", "tesco", "groceries")
+    storage.create_rule("regex", r"uber\s*eats", "takeaway")
+    storage.create_rule("keyword", "bus", "transport", priority=5)
+    storage.create_rule("regex", r"eats", "food", priority=9)
+    with pytest.raises(ValueError):
+        storage.create_rule("regex", "(unclosed", "x")
+    assert [r["category"] for r in storage.list_rules()] == [
+        "groceries",
+        "takeaway",
+        "transport",
+        "food",
+    ]
+
+    created = [
+        storage.create_transaction(acc["id"], "2025-01-03", 9, "expense", note=note)
+        for note in ("Tesco Express", "UBER  EATS order", "tescobank", "just eats")
+    ]
+    assert [t["category"] for t in created] == ["groceries", "takeaway", "", "food"]
+    typed = storage.create_transaction(
+        acc["id"], "2025-01-04", 5, "expense", category="misc", note="tesco"
+    )
+    assert typed["category"] == "misc"  # a given category always wins
+
+    result = storage.backfill_categories(batch_size=2)
+    assert (result["rows"], result["updated"]) == (2, 1)  # the two blank rows
+    by_id = {t["id"]: t["category"] for t in storage.list_transactions()}
+    assert by_id[old["id"]] == "transport"
+    assert by_id[typed["id"]] == "misc"
+    assert storage.backfill_categories(overwrite=True)["updated"] == 1
+    assert storage.list_transactions()[-1]["category"] == "groceries"
+
+
+def test_columnar_list_format_matches_rows_and_gzips(tmp_path):
+    import gzip
+    import json
+
+    app = create_app({"DATABASE": tmp_path / "finance.db", "FX_RATES_PATH": None})
+    client = app.test_client()
+    acc = client.post("/accounts", json={"name": "W", "currency": "EUR"}).get_json()
+    for day, amount, category in (("2025-01-02", 5, "food"), ("2025-01-03", 7, "")):
+        client.post(
+            "/transactions",
+            json={
+                "account_id": acc["id"],
+                "date": day,
+                "amount": amount,
+                "type": "expense",
+                "category": category,
+                "note": "n",
+            },
+        )
+    client.post(
+        "/income",
+        json={"account_id": acc["id"], "date": "2025-01-04", "amount": 9},
+    )
+
+    for path in ("/transactions?limit=10", "/income"):
+        rows = client.get(path).get_json()
+        sep = "&" if "?" in path else "?"
+        table = client.get(f"{path}{sep}format=columns").get_json()
+        assert sorted(table["columns"]) == sorted(rows[0])
+        columns = [table["data"][c] for c in table["columns"]]
+        assert [dict(zip(table["columns"], row)) for row in zip(*columns)] == rows
+
+    response = client.get(
+        "/transactions?format=columns", headers={"Accept-Encoding": "gzip, br"}
+    )
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    table = json.loads(gzip.decompress(response.data))
+    assert table["data"]["category"] == ["food", ""]
+    assert "Content-Encoding" not in client.get("/transactions").headers
+    assert client.get("/transactions?format=csv").status_code == 400
+
+
+def test_aggregates_read_through_readonly_mmap_connections(tmp_path):
+    from personal_finance.storage.sqlite_storage import READ_MMAP_SIZE
+
+    app = create_app({"DATABASE": tmp_path / "finance.db", "FX_RATES_PATH": None})
+    storage = app.extensions["storage"]
+    acc = storage.create_account("Wallet", "EUR")["id"]
+    for day in ("2019-05-01", "2024-05-01"):
+        storage.create_transaction(acc, day, 10, "expense", "food")
+    storage.archive_year(2019)
+
+    conn = storage._connect(readonly=True)
+    assert conn.execute("PRAGMA mmap_size").fetchone()[0] == READ_MMAP_SIZE
+    with pytest.raises(sqlite3.OperationalError, match="readonly"):
+        conn.execute("DELETE FROM transactions")
+    conn.close()
+
+    with storage.snapshot():
+        totals = storage.category_totals("transactions")
+        assert len(storage.list_transactions()) == 2
+    assert totals == {"food": -20}
+    summary = app.test_client().get("/stats/summary").get_json()
+    assert summary["by_category"] == {"food": -20.0}
+    storage.create_transaction(acc, "2024-06-01", 5, "expense", "food")
+    assert storage.category_totals("transactions") == {"food": -25}
+
+
+def test_admin_maintenance_reclaims_analyzes_and_backs_up(tmp_path):
+    from pathlib import Path
+
+    from personal_finance.storage.maintenance import MaintenanceScheduler
+
+    config = {"DATABASE": tmp_path / "finance.db", "FX_RATES_PATH": None}
+    assert create_app(config).test_client().get("/admin/maintenance").status_code == 404
+    backups = tmp_path / "bk"
+    app = create_app(
+        {**config, "ADMIN_TOKEN": "s3cret", "BACKUP_DIR": backups, "BACKUP_KEEP": 1}
+    )
+    storage = app.extensions["storage"]
+    client = app.test_client()
+    admin = {"X-Admin-Token": "s3cret"}
+    assert client.get("/admin/maintenance").status_code == 403
+    assert client.post("/admin/maintenance/vacuum", headers=admin).status_code == 400
+
+    acc = storage.create_account("Wallet", "EUR")["id"]
+    with sqlite3.connect(tmp_path / "finance.db") as conn:
+        conn.executemany(
+            "INSERT INTO transactions (account_id, date, amount, type, note) "
+            "VALUES (?, '2025-01-01', 1, 'expense', ?)",
+            [(acc, "x" * 200)] * 2000,
+        )
+    storage.delete_account(acc)
+    compact = client.post("/admin/maintenance/compact", headers=admin).get_json()
+    assert compact["removed"] == 2001  # inserts superseded by their deletes
+    status = client.get("/admin/maintenance", headers=admin).get_json()
+    assert status["auto_vacuum"] == "incremental"
+    assert status["free_pages"] > 0 and not status["has_statistics"]
+    scheduler = MaintenanceScheduler(3600, backup_dir=backups)
+    assert scheduler.due(storage) == ["analyze", "reclaim", "backup"]
+
+    reclaim = client.post("/admin/maintenance/reclaim", headers=admin).get_json()
+    assert reclaim["pages_freed"] == status["free_pages"]
+    assert reclaim["free_pages"] == 0
+    analyze = client.post("/admin/maintenance/analyze", headers=admin).get_json()
+    assert analyze["indexes"] > 0
+    storage.create_account("Bank", "EUR")
+    first = client.post("/admin/maintenance/backup", headers=admin).get_json()
+    second = client.post("/admin/maintenance/backup", headers=admin).get_json()
+    assert list(backups.iterdir()) == [Path(second["file"])]
+    with sqlite3.connect(second["file"]) as copy:
+        assert copy.execute("SELECT name FROM accounts").fetchall() == [("Bank",)]
+    assert first["pages"] == second["pages"]
+    status = client.get("/admin/maintenance", headers=admin).get_json()
+    assert status["has_statistics"] and status["free_pages"] == 0
+    assert set(status["last_runs"]) == {"analyze", "reclaim", "compact", "backup"}
+    assert scheduler.due(storage) == []
+
+    old = tmp_path / "old.db"
+    sqlite3.connect(old).execute("CREATE TABLE legacy (x)").connection.close()
+    legacy = SQLiteStorage(old)
+    assert legacy.reclaim_pages()["auto_vacuum"] == "none"
+    assert legacy.vacuum()["auto_vacuum"] == "incremental"
+
+
+def test_transaction_manager_index_handles_unsorted_and_backdated_input():
+    import random
+
+    acc_mgr = AccountManager()
+    acc_mgr.add_account(Account("A1", "Wallet", "cash", "HUF"))
+    tr_mgr = TransactionManager(acc_mgr)
+    rng = random.Random(7)
+    loaded = [
+        ExpenseTransaction(
+            f"T{i}", "A1", f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            rng.randint(1, 100), "", "",
+        )
+        for i in range(500)
+    ]
+    tr_mgr.transactions = list(reversed(loaded))
+    for i in range(50):
+        day = f"{rng.choice((2023, 2025, 2027))}-{rng.randint(1, 12):02d}-01"
+        tr_mgr.create_transaction(f"B{i}", "A1", day, 5, "", "", "income")
+    tr_mgr.delete_transaction("T3")
+    tr_mgr.update_transaction("T4", date="2022-06-30")
+
+    everything = tr_mgr.transactions
+    for start, end in (("2025-03-01", "2025-06-15"), ("2022-01-01", "2027-12-31")):
+        expected = [t for t in everything if start <= t.date <= end]
+        assert tr_mgr.sum_between(start, end) == pytest.approx(
+            sum(t.amount for t in expected)
+        )
+        listed = tr_mgr.list_between(start, end, account_id="A1")
+        assert sorted(t.id for t in listed) == sorted(t.id for t in expected)
+        assert [t.date for t in listed] == sorted(t.date for t in expected)
+    # The managers import ``exceptions`` as a top-level module.
+    with pytest.raises(Exception, match="YYYY-MM-DD"):
+        tr_mgr.create_transaction("X", "A1", "18/11/2025", 1, "", "", "expense")
+    assert tr_mgr.sum_between("2000-01-01", "2099-12-31") == pytest.approx(
+        sum(t.amount for t in everything)
+    )
+
+    # Loading a file with a bad date keeps the list and indexes as they were.
+    bad = [ExpenseTransaction("Z1", "A2", "2025/01/01", 9, "", "")]
+    with pytest.raises(Exception, match="YYYY-MM-DD"):
+        tr_mgr.transactions = bad
+    assert tr_mgr.transactions is everything
+    assert tr_mgr.sum_between("2000-01-01", "2099-12-31") == pytest.approx(
+        sum(t.amount for t in everything)
+    )
+    assert len(tr_mgr.list_between("2000-01-01", "2099-12-31", "A1")) == len(
+        everything
+    )
+
+
+def test_dashboard_summarizes_only_the_current_month(tmp_path):
+    from datetime import date
+
+    app = create_app({"DATABASE": tmp_path / "finance.db", "FX_RATES_PATH": None})
+    storage = app.extensions["storage"]
+    acc = storage.create_account("Wallet", "EUR")["id"]
+    this_month = date.today().replace(day=1)
+    for day, amount in (("2020-05-04", 500), (this_month.isoformat(), 30)):
+        storage.create_transaction(acc, day, amount, "expense", "food")
+    storage.create_income(acc, "2020-05-01", 100, "salary")
+
+    data = app.test_client().get("/dashboard?limit=1").get_json()
+    assert data["summary_range"]["from"] == this_month.isoformat()
+    assert data["summary_range"]["to"].startswith(this_month.isoformat()[:8])
+    assert data["summary"]["count"] == 1
+    assert data["summary"]["by_category"] == {"food": -30.0}
+    assert [t["amount"] for t in data["transactions"]] == [-30.0]
+    assert len(data["income"]) == 1 and data["forecast"]
+
+
+def test_scheduled_compaction_advances_the_change_log_horizon(tmp_path):
+    app = create_app({"DATABASE": tmp_path / "finance.db", "FX_RATES_PATH": None})
+    storage = app.extensions["storage"]
+    scheduler = app.extensions["maintenance"]
+    acc = storage.create_account("Wallet", "EUR")["id"]
+    tx = storage.create_transaction(acc, "2025-01-02", 9, "expense", "food")
+    storage.delete_transaction(tx["id"])
+    since = storage.list_changes(since=0)["next_since"]
+    assert storage.list_changes(since=1)["changes"]
+    # Opening, in this process or another, leaves compaction to the scheduler.
+    create_app({"DATABASE": tmp_path / "finance.db", "FX_RATES_PATH": None})
+    assert storage.maintenance_status()["last_runs"] == {}
+    [result] = [r for r in scheduler.run_due(storage) if r["task"] == "compact"]
+    assert result["removed"] == 1  # the insert the delete superseded
+    assert "compact" not in scheduler.due(storage)
+
+    with sqlite3.connect(tmp_path / "finance.db") as conn:
+        conn.execute("UPDATE change_log SET changed_at = '2000-01-01'")
+        conn.execute(
+            "UPDATE maintenance_runs SET finished_at = '2000-01-01' "
+            "WHERE task = 'compact'"
+        )
+    [result] = [r for r in scheduler.run_due(storage) if r["task"] == "compact"]
+    assert result["removed"] == 1  # the delete, now past retention
+    with pytest.raises(ChangeLogExpiredError):
+        storage.list_changes(since=1)
+    assert storage.list_changes(since=since)["changes"] == []